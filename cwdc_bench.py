@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks of the cwdc index loaders and scoring steps on synthetic inputs
+
+generate writes a data directory laid out like working_dir, at colorado or
+all us counties scale, and run times each loader and scoring step against it
+in a fresh process, so results are reproducible before and after a change.
+
+    python cwdc_bench.py generate bench_co --scale co
+    python cwdc_bench.py run bench_co --out before.json
+    python cwdc_bench.py run bench_co --out after.json --compare before.json
+
+@author: Gabriel Moss
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import sys
+import cwdc_perf
+
+#counties and row counts of each synthetic input at each scale
+SCALES = {
+    'co':{'counties':64,'qcew_rows':1500,'incidents':400000,'agencies':250,'pirl_rows':200000,
+          'pirl_columns':120,'emsi_industries':1000,'emsi_occupations':800,'transitions':300,
+          'oes_rows':60000,'front_line':40,'top_jobs':200},
+    'us':{'counties':3143,'qcew_rows':1500,'incidents':6000000,'agencies':18000,'pirl_rows':4000000,
+          'pirl_columns':120,'emsi_industries':1000,'emsi_occupations':800,'transitions':300,
+          'oes_rows':400000,'front_line':40,'top_jobs':200}
+    }
+
+SOC_MAJOR = [11,13,15,17,19,21,23,25,27,29,31,33,35,37,39,41,43,45,47,49,51,53]
+NAICS_SECTOR = ['11','21','22','23','31','32','33','42','44','45','48','49','51','52','53',
+                '54','55','56','61','62','71','72','81','92']
+
+def _codes(rng, n, prefixes, digits, fmt):
+    #n distinct codes, each a prefix followed by random digits
+    out = set()
+    while len(out) < n:
+        p = prefixes[rng.integers(len(prefixes))]
+        out.add(fmt.format(p,rng.integers(10**digits)))
+    return(sorted(out))
+
+def _counties(rng, n):
+    #(state fips, state name, county fips, county name) with every colorado county first
+    import cwdc_idx
+    co = min(n,64)
+    rows = [(8,'Colorado',8000 + 2*i + 1,'Place{}'.format(i)) for i in range(co)]
+    others = [(st,s) for st, (abbr, s) in sorted(cwdc_idx.STATES.items()) if st not in (8,11,72)]
+    for j in range(n - co):
+        st, name = others[j % len(others)]
+        k = j // len(others)
+        rows.append((st,name,st*1000 + 2*k + 1,'Place{}'.format(co + j)))
+    return(rows)
+
+def generate(path, scale='co', seed=0, **sizes):
+    '''
+    write synthetic index inputs under path
+
+    Parameters
+    ----------
+    path : str
+        directory to write, laid out like working_dir.
+    scale : str, optional
+        'co' for colorado or 'us' for all us counties, see SCALES.
+    seed : int, optional
+        random seed, the same seed writes the same files.
+    **sizes
+        overrides of the SCALES entries, e.g. counties=200.
+
+    Returns
+    -------
+    None.
+
+    '''
+    size = dict(SCALES[scale],**sizes)
+    rng = np.random.default_rng(seed)
+    os.makedirs(path,exist_ok=True)
+    join = lambda *p: os.path.join(path,*p)
+
+    counties = _counties(rng,size['counties'])
+    co = [c for c in counties if c[0] == 8]
+
+    #occupation and industry code universes
+    socs = _codes(rng,size['emsi_occupations'],SOC_MAJOR,4,'{}-{:04d}')
+    naics = _codes(rng,size['emsi_industries'],NAICS_SECTOR,4,'{}{:04d}')
+    front = list(rng.choice(socs,min(size['front_line'],len(socs)),replace=False))
+
+    #front line occupations
+    with open(join('cwdc_socs.txt'),'w') as f:
+        for s in front:
+            f.write('{} Occupation {}|front line\n'.format(s,s))
+
+    #oes research staffing patterns
+    n = size['oes_rows']
+    levels = rng.choice(['sector','3-digit','4-digit'],n,p=[0.1,0.4,0.5])
+    codes = rng.choice(naics,n)
+    codes = np.where(levels == 'sector',[c[:2] for c in codes],np.where(levels == '3-digit',[c[:3]+'000' for c in codes],[c[:4]+'00' for c in codes]))
+    wage = rng.normal(45000,15000,n).round().astype(object)
+    wage[rng.random(n) < 0.05] = '*'
+    wage[rng.random(n) < 0.01] = '#'
+    pd.DataFrame({'AREA':rng.choice(sorted(set(c[0] for c in counties)),n),
+                  'OCC_CODE':np.where(rng.random(n) < 0.3,rng.choice(front,n),rng.choice(socs,n)),
+                  'I_GROUP':levels,'NAICS':codes,'A_MEDIAN':wage}).to_excel(join('oes_research_2020_allsectors.xlsx'),index=False)
+
+    #qcew annual by area files
+    qdir = join('2019.annual.by_area')
+    os.makedirs(qdir,exist_ok=True)
+    industries = ['10','44-45','31-33','48-49','71','72'] + sorted(set(c[:3] for c in naics)) + naics
+    for st, state, fips, name in counties + [(st,s,st*1000,None) for st, s in sorted(set((c[0],c[1]) for c in counties))]:
+        rows = size['qcew_rows']
+        ind = rng.choice(industries,rows)
+        title = '{} County, {}'.format(name,state) if name else '{} -- Statewide'.format(state)
+        frame = pd.DataFrame({
+            'area_fips':'{:05d}'.format(fips),'own_code':rng.choice([0,1,2,3,5],rows),'industry_code':ind,
+            'agglvl_code':rng.integers(70,79,rows),'size_code':0,'year':2019,'qtr':'A',
+            'disclosure_code':np.where(rng.random(rows) < 0.2,'N',''),'area_title':title,
+            'annual_avg_estabs_count':rng.integers(1,500,rows),'annual_avg_emplvl':rng.integers(0,20000,rows),
+            'total_annual_wages':rng.integers(0,10**9,rows),'annual_avg_wkly_wage':rng.integers(300,3000,rows),
+            'avg_annual_pay':rng.integers(15000,150000,rows),'lq_annual_avg_emplvl':rng.random(rows).round(2),
+            'oty_annual_avg_estabs_count_chg':rng.integers(-20,20,rows),'oty_annual_avg_emplvl_chg':rng.integers(-500,500,rows),
+            'oty_avg_annual_pay_pct_chg':rng.normal(2,3,rows).round(1)})
+        frame.to_csv(os.path.join(qdir,'2019.annual {:05d} {}.csv'.format(fips,title)),index=False)
+    pd.DataFrame({'area_fips':'US000','industry_code':industries}).to_csv(os.path.join(qdir,'2019.annual US000 U.S. TOTAL.csv'),index=False)
+
+    #nibrs agencies and incidents
+    cdir = join('CO-2019','CO')
+    os.makedirs(cdir,exist_ok=True)
+    names = [c[3].upper() for c in co]
+    agencies = size['agencies']
+    county = [('; '.join(rng.choice(names,rng.integers(1,4),replace=False)) if rng.random() < 0.1 else rng.choice(names))
+              if rng.random() > 0.05 else None for i in range(agencies)]
+    pd.DataFrame({'AGENCY_ID':np.arange(agencies) + 1000,'ORI':['CO{:07d}'.format(i) for i in range(agencies)],
+                  'PUB_AGENCY_NAME':['Agency {}'.format(i) for i in range(agencies)],'COUNTY_NAME':county,
+                  'STATE_ABBR':'CO'}).to_csv(os.path.join(cdir,'agencies.csv'),index=False)
+    inc = size['incidents']
+    pd.DataFrame({'DATA_YEAR':2019,'AGENCY_ID':rng.integers(1000,1000 + agencies,inc),'INCIDENT_ID':np.arange(inc),
+                  'NIBRS_MONTH_ID':rng.integers(1,10**6,inc),'INCIDENT_DATE':'2019-01-01','REPORT_DATE_FLAG':'',
+                  'INCIDENT_HOUR':rng.integers(0,24,inc),'CLEARED_EXCEPT_ID':6}).to_csv(os.path.join(cdir,'NIBRS_incident.csv'),index=False)
+
+    #pirl extract and its data dictionary
+    width = size['pirl_columns']
+    named = ['uid','state_code','county_code','credential_1_type','trained','etp_comp_1']
+    names = named + ['field_{}'.format(i) for i in range(width - len(named) - 2)] + ['record_year']
+    rows = size['pirl_rows']
+    state_fips = [c[0] for c in counties]
+    pirl = {0:np.arange(rows)}
+    cols = {'uid':rng.integers(0,rows // 2,rows),'state_code':np.where(rng.random(rows) < 0.9,'CO','WY'),
+            'county_code':rng.choice([c[2] - 8000 for c in co],rows),'credential_1_type':rng.integers(0,8,rows),
+            'trained':rng.integers(0,2,rows),'etp_comp_1':rng.integers(0,2,rows)}
+    for i, n in enumerate(names[:-1]):
+        pirl[i + 1] = cols[n] if n in cols else rng.integers(0,100,rows)
+    pd.DataFrame(pirl).to_csv(join('pirl_py19.csv'),header=False,index=False)
+    pd.DataFrame({'crec_name':names}).to_excel(join('Master Data Dictionary.xlsx'),sheet_name='Sheet2',index=False)
+
+    #emsi industry workbooks
+    idir = join('emsi_ind_co')
+    os.makedirs(idir,exist_ok=True)
+    years = ['{} Jobs'.format(y) for y in range(2015,2021)]
+    for st, state, fips, name in counties:
+        n = size['emsi_industries']
+        frame = pd.DataFrame({'NAICS':[int(c) for c in naics[:n]],'Description':['Industry {}'.format(c) for c in naics[:n]]})
+        for y in years:
+            v = rng.integers(0,5000,n).astype(object)
+            v[rng.random(n) < 0.05] = 'Insf. Data'
+            v[rng.random(n) < 0.05] = '<10'
+            frame[y] = v
+        frame['Total Diversity % of Industry'] = rng.random(n).round(3)
+        with pd.ExcelWriter(os.path.join(idir,'Industry_Table_{}.xlsx'.format(fips))) as w:
+            frame.to_excel(w,sheet_name='Industries',index=False)
+            pd.DataFrame({'Parameter':['Region','Timeframe','Datarun','Industry','Level','{:05d}'.format(fips)]}).to_excel(w,sheet_name='Parameters',index=False)
+
+    #emsi occupation tables
+    odir = join('emsi_occ_co')
+    os.makedirs(odir,exist_ok=True)
+    import cwdc_idx
+    for st, state, fips, name in counties:
+        n = len(socs)
+        frame = pd.DataFrame({'SOC':socs,'Description':['Occupation {}'.format(s) for s in socs],
+                              '2020 Resident Workers':rng.integers(0,5000,n),'Avg. Annual Openings':rng.integers(0,500,n).astype(object),
+                              'Pct. 25 Annual Earnings':rng.normal(35000,10000,n).round(),'Total Diversity % of Occupation':rng.random(n).round(3),
+                              'COL Index':rng.normal(100,10,n).round(1),'Automation Index':rng.normal(100,15,n).round(1)})
+        frame.loc[rng.random(n) < 0.03,'Avg. Annual Openings'] = 'Insf. Data'
+        frame.to_csv(os.path.join(odir,'Occupation_Table_in_{}_County_{}_{:05d}.csv'.format(name,cwdc_idx.STATES[st][0],fips)),index=False)
+
+    #brookings transitions and socxx crosswalk
+    bdir = join('WoF_CREC_data')
+    os.makedirs(bdir,exist_ok=True)
+    socxx = sorted(set(s[:6] + 'X' if rng.random() < 0.2 else s for s in socs))
+    pd.DataFrame({'socxx_code':[s if s in socxx else s[:6] + 'X' for s in socs],'soc_code':socs}).to_csv(os.path.join(bdir,'full_crosswalk_soc10_socxx.csv'),index=False)
+    k = min(size['transitions'],len(socxx) - 1)
+    wage = dict(zip(socxx,rng.normal(22,8,len(socxx)).round(2)))
+    a = np.repeat(socxx,k)
+    b = np.concatenate([rng.choice(socxx,k,replace=False) for s in socxx])
+    pd.DataFrame({'occ_a':a,'occ_b':b,'transition_share':rng.random(len(a)).round(4) / k,
+                  'h_median_a':[wage[i] for i in a],'h_median_b':[wage[i] for i in b],
+                  'a_emp':rng.integers(0,10**5,len(a)),'b_emp':rng.integers(0,10**5,len(a))}).to_csv(os.path.join(bdir,'full_transition_file_socxx.csv'),index=False)
+
+    #in demand occupations, emsi / onet crosswalk and job zones
+    n = min(size['top_jobs'],len(socs))
+    top = rng.choice(socs,n,replace=False)
+    pd.DataFrame({'SOC Code':top,'Occupation':['Occupation {}'.format(s) for s in top],
+                  'Median Hourly Salary ($)':rng.normal(25,8,n).round(2),
+                  'Median Annual Salary ($)':['{:,}'.format(int(v)) for v in rng.normal(52000,15000,n)],
+                  '2019-2029 Growth (%)':rng.normal(8,5,n).round(1),
+                  'Projected Annual Openings':['{:,}'.format(int(v)) for v in rng.integers(10,5000,n)]}).to_csv(join('All Top Jobs.csv'),index=False)
+    pd.DataFrame({'emsi_soc_5':socs,'std_onet':[s + '.00' for s in socs]}).to_csv(join('map_stdonet_emsisoc2019.csv'),index=False)
+    zdir = join('db_25_1_text')
+    os.makedirs(zdir,exist_ok=True)
+    pd.DataFrame({'O*NET-SOC Code':[s + '.00' for s in socs],'Job Zone':rng.integers(1,6,len(socs)),
+                  'Date':'07/2014','Domain Source':'Analyst'}).to_csv(os.path.join(zdir,'Job Zones.txt'),sep='\t',index=False)
+
+    #cip / soc crosswalk, one to three programs per occupation with cips as xx.xxxx strings
+    cips = _codes(rng,max(len(socs) // 2,1),list(range(1,55)),4,'{:02d}.{:04d}')
+    per = rng.integers(1,4,len(socs))
+    with pd.ExcelWriter(join('CIP2020_SOC2018_Crosswalk.xlsx')) as w:
+        pd.DataFrame({'CIP2020Code':rng.choice(cips,per.sum()),'CIP2020Title':'Program',
+                      'SOC2018Code':np.repeat(socs,per),'SOC2018Title':'Occupation'}).to_excel(w,sheet_name='SOC-CIP',index=False)
+
+    #census participation rates
+    pd.DataFrame({'UniqueID':[c[2] for c in counties],'Geographic Area Name':['{} County, {}'.format(c[3],c[1]) for c in counties],
+                  'Participation Rate (2010)':rng.uniform(0.6,0.9,len(counties)).round(3)}).to_excel(
+                      join('CO Census Participation Rates 2010.xlsx'),index=False)
+
+    with open(join('bench.json'),'w') as f:
+        json.dump({'scale':scale,'seed':seed,'sizes':size},f,indent=1)
+
+#indicators described by to_file
+INDICATORS = [
+    'hs_grad','credentialed','train_comp','bachelors','coli','absentee_rt','crime_incidents','UR',
+    'LFPR','ret_accom_ind_div_emp_per','ret_accom_ind_ind_per_chng_1',
+    'ret_accom_ind_ind_per_chng_5','rel_ind_div_emp_per','rel_ind_ind_per_chng_1',
+    'rel_ind_ind_per_chng_5','ret_accom_annual_avg_emplvl','rel_ind_annual_avg_emplvl',
+    'ret_accom_avg_annual_pay','rel_ind_avg_annual_pay','part_rate','management_div_emp_per',
+    'county_nonwhite','sector_strat','cwdc_response','hh_bpl','MHI','etp_in_demand_progs',
+    'etp_in_demand_completers','in_demand_programs','etp_opportunity_progs',
+    'etp_opportunity_completers','opporunity_programs','population','occ_openings',
+    'occ_per_25_earn','occ_div_emp_per','opportunity_occ_openings','opportunity_occ_per_25_earn',
+    'opportunity_occ_div_emp_per','lf','region_nonwhite','auto'
+    ]
+
+def _index_frames(n, seed=0):
+    #synthetic scoring inputs shaped like the outputs of index_scores
+    rng = np.random.default_rng(seed)
+    fips = np.arange(n) * 2 + 8001
+    names = ['Place{} County, Colorado'.format(i) for i in range(n)]
+    region = rng.integers(1,15,n)
+    cats = ['individual','industry','neighborhood','engagement','regional_context','education_training','regional_job_opportunities']
+
+    score = pd.DataFrame(rng.random((n,len(cats))),columns=cats,index=pd.MultiIndex.from_arrays([fips,names],names=['fips','NAME']))
+    score['combined_score'] = score.mean(axis=1)
+
+    #raw and normalized data with every indicator to_file describes
+    index = pd.MultiIndex.from_arrays([fips,names,region],names=['fips','NAME','region'])
+    raw = pd.DataFrame(rng.random((n,len(INDICATORS))),columns=INDICATORS,index=index)
+    norm = pd.DataFrame(rng.random((n,len(INDICATORS))),columns=INDICATORS,index=index)
+    return(score,raw,norm)
+
+def _setup_normalize(path):
+    score, raw, norm = _index_frames(_counties_in(path))
+    return((raw,))
+
+def _setup_normative_score(path):
+    score, raw, norm = _index_frames(_counties_in(path))
+    return((score,))
+
+def _setup_to_file(path):
+    import cwdc_idx
+
+    score, raw, norm = _index_frames(_counties_in(path))
+    simple = cwdc_idx.normative_score(score)
+    out = os.path.join(path,'bench_output','cwdc_county_summaries.xlsx')
+    os.makedirs(os.path.dirname(out),exist_ok=True)
+    with pd.ExcelWriter(out,engine='openpyxl',mode='w') as writer:
+        score.to_excel(writer,sheet_name='scores')
+    return((out,score,simple,raw,norm))
+
+def _counties_in(path):
+    with open(os.path.join(path,'bench.json')) as f:
+        return(json.load(f)['sizes']['counties'])
+
+def _working(name):
+    return(lambda path: (os.path.join(path,name,''),))
+
+def _none(path):
+    return(())
+
+#benchmark cases as (setup returning the arguments, function name in cwdc_idx)
+CASES = {
+    'get_qcew':(_none,'get_qcew'),
+    'crime_data':(_none,'crime_data'),
+    'cc_data':(_none,'cc_data'),
+    'get_emsi_ind':(_working('emsi_ind_co'),'get_emsi_ind'),
+    'get_emsi_soc':(_working('emsi_occ_co'),'get_emsi_soc'),
+    'brookings_occupations':(_none,'brookings_occupations'),
+    'related_industries':(_none,'related_industries'),
+    'normalize':(_setup_normalize,'normalize'),
+    'normative_score':(_setup_normative_score,'normative_score'),
+    'to_file':(_setup_to_file,'to_file')
+    }
+
+def _reset():
+    #forget everything remembered in memory so each repeat starts cold
+    import cwdc_idx
+    cwdc_idx.memo.results.clear()
+    cwdc_idx.crosswalks.loaded.clear()
+
+def _run_case(path, name, repeat, cache):
+    import cwdc_idx
+    import cwdc_stages
+
+    cwdc_idx.configure(path,cache)
+    setup, func = CASES[name]
+    runs = []
+    for i in range(repeat):
+        if cache == 'off':
+            _reset()
+        try:
+            args = setup(path)
+            out, rec = cwdc_stages.measure(name,getattr(cwdc_idx,func),args)
+        except Exception as e:
+            runs.append({'error':'{}: {}'.format(type(e).__name__,e)})
+            break
+        runs.append(rec)
+    return(runs)
+
+def run(path, cases=None, repeat=3, cache='off'):
+    '''
+    time each case against a generated data directory
+
+    every case runs in its own process so its peak memory and caches are its
+    own.
+
+    Parameters
+    ----------
+    path : str
+        directory written by generate.
+    cases : list, optional
+        case names, every case in CASES when None.
+    repeat : int, optional
+        timed runs of each case.
+    cache : str, optional
+        cache policy passed to cwdc_idx.configure, 'off' times cold runs and
+        'use' lets repeats after the first use the on disk caches.
+
+    Returns
+    -------
+    dict with the run's environment and every case's measurements
+
+    '''
+    out = {'path':os.path.abspath(path),'repeat':repeat,'cache':cache,
+           'python':platform.python_version(),'pandas':pd.__version__,'numpy':np.__version__,
+           'machine':platform.machine(),'cases':{}}
+    with open(os.path.join(path,'bench.json')) as f:
+        out['data'] = json.load(f)
+
+    ctx = multiprocessing.get_context('spawn')
+    for name in cases or CASES:
+        with ProcessPoolExecutor(1,mp_context=ctx) as pool:
+            runs = pool.submit(_run_case,path,name,repeat,cache).result()
+
+        ok = [r for r in runs if 'error' not in r]
+        res = {'runs':runs}
+        if ok:
+            wall = [r['wall_seconds'] for r in ok]
+            res.update({'wall_min':min(wall),'wall_median':statistics.median(wall),
+                        'cpu_median':statistics.median(r['cpu_seconds'] for r in ok),
+                        'peak_rss':max(r['peak_rss'] or 0 for r in ok),'rows_out':ok[-1]['rows_out']})
+        else:
+            res['error'] = runs[-1]['error']
+        out['cases'][name] = res
+    return(out)
+
+def history(result):
+    '''
+    history results of a run, every repeat's wall time and the peak memory of
+    each case that finished
+    '''
+    return({name:{'wall':[x['wall_seconds'] for x in r['runs'] if 'error' not in x],'peak_rss':r['peak_rss']}
+            for name, r in result['cases'].items() if 'error' not in r})
+
+def suite(result):
+    '''
+    history suite of a run, runs are only compared at the same data sizes,
+    cache policy and library versions
+    '''
+    data = result['data']
+    return('bench:{}:{}:{}:pandas {}:numpy {}'.format(data.get('scale'),json.dumps(data['sizes'],sort_keys=True),
+                                                      result['cache'],result['pandas'],result['numpy']))
+
+def summary(result, before=None):
+    '''
+    text table of a run, with the speedup over before when given
+    '''
+    head = ['case','wall min s','wall median s','cpu median s','peak MB','rows out']
+    if before is not None:
+        head += ['before s','speedup']
+
+    rows = []
+    errors = []
+    for name, r in result['cases'].items():
+        if 'error' in r:
+            row = [name,'error','','','','']
+            errors.append('{}: {}'.format(name,r['error']))
+        else:
+            row = [name,'{:.3f}'.format(r['wall_min']),'{:.3f}'.format(r['wall_median']),'{:.3f}'.format(r['cpu_median']),
+                   '{:.1f}'.format(r['peak_rss'] / 2**20),str(r['rows_out'])]
+        if before is not None:
+            b = before['cases'].get(name,{})
+            if 'wall_median' in b and 'wall_median' in r:
+                row += ['{:.3f}'.format(b['wall_median']),'{:.2f}x'.format(b['wall_median'] / r['wall_median'])]
+            else:
+                row += ['','']
+        rows.append(row)
+
+    width = [max(len(str(x)) for x in col) for col in zip(head,*rows)]
+    lines = ['  '.join(str(x).ljust(w) for x, w in zip(row,width)) for row in [head] + rows]
+    lines.insert(1,'  '.join('-'*w for w in width))
+    return('\n'.join(lines + ([''] if errors else []) + errors))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the cwdc index on synthetic inputs')
+    sub = parser.add_subparsers(dest='command',required=True)
+
+    g = sub.add_parser('generate',help='write synthetic inputs')
+    g.add_argument('path')
+    g.add_argument('--scale',default='co',choices=list(SCALES))
+    g.add_argument('--seed',type=int,default=0)
+    for k in SCALES['co']:
+        g.add_argument('--' + k.replace('_','-'),type=int,default=None)
+
+    r = sub.add_parser('run',help='time the loaders and scoring steps')
+    r.add_argument('path')
+    r.add_argument('--cases',nargs='+',default=None,choices=list(CASES))
+    r.add_argument('--repeat',type=int,default=3)
+    r.add_argument('--cache',default='off',choices=['off','use'])
+    r.add_argument('--out',default=None,help='path of the json results')
+    r.add_argument('--compare',default=None,help='json results of an earlier run to compare against')
+    r.add_argument('--history',default=None,help='sqlite file of past runs, exits with status 1 on a regression')
+    r.add_argument('--window',type=int,default=10,help='past runs in the baseline')
+    r.add_argument('--alpha',type=float,default=0.01,help='significance level of a regression')
+    r.add_argument('--min-ratio',type=float,default=1.1,help='smallest slowdown or memory growth reported')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        sizes = {k:getattr(args,k) for k in SCALES['co'] if getattr(args,k) is not None}
+        generate(args.path,args.scale,args.seed,**sizes)
+    else:
+        result = run(args.path,args.cases,args.repeat,args.cache)
+        before = None
+        if args.compare:
+            with open(args.compare) as f:
+                before = json.load(f)
+        print(summary(result,before))
+        if args.out:
+            with open(args.out,'w') as f:
+                json.dump(result,f,indent=1)
+        if args.history:
+            found = cwdc_perf.track(args.history,suite(result),history(result),
+                                    window=args.window,alpha=args.alpha,min_ratio=args.min_ratio)
+            if found:
+                print(cwdc_perf.report(found))
+                sys.exit(1)
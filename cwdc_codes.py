@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+integer keyed occupation, program and industry code crosswalks and taxonomies
+
+@author: Gabriel Moss
+"""
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import cwdc_stages
+
+class Vocab():
+    '''
+    sorted array of distinct codes, each code's id being its position
+
+    Parameters
+    ----------
+    codes : array-like
+        sorted, distinct codes.
+
+    '''
+    def __init__(self, codes):
+        self.codes = codes
+
+    @classmethod
+    def build(cls, codes):
+        return(cls(np.unique(np.asarray(codes))))
+
+    def __len__(self):
+        return(len(self.codes))
+
+    def ids(self, codes):
+        '''
+        id of each code, -1 for codes not in the vocabulary
+        '''
+        codes = np.asarray(codes)
+        if self.codes.dtype.kind == 'U':
+            codes = codes.astype(str)
+        elif codes.dtype.kind not in 'iuf':
+            codes = codes.astype(float)
+        if len(self.codes) == 0:
+            return(np.full(codes.shape,-1,dtype=np.int64))
+        pos = np.clip(np.searchsorted(self.codes,codes),0,len(self.codes)-1)
+        return(np.where(self.codes[pos] == codes,pos,-1).astype(np.int64))
+
+    def mask(self, codes):
+        '''
+        boolean array over the vocabulary flagging the given codes
+        '''
+        ids = self.ids(codes)
+        out = np.zeros(len(self.codes),dtype=bool)
+        out[ids[ids >= 0]] = True
+        return(out)
+
+class Crosswalk():
+    '''
+    many to many mapping between two code systems held as integer id pairs
+
+    pairs are stored twice, sorted by source and by target, with offsets into
+    each so both directions are answered by array slicing and masking rather
+    than merges on string codes. every array can be saved to .npy files and
+    memory mapped back.
+
+    Parameters
+    ----------
+    src : Vocab
+        source codes.
+    dst : Vocab
+        target codes.
+    fwd : tuple
+        (offsets, target ids) with pairs sorted by source id.
+    rev : tuple
+        (offsets, source ids) with pairs sorted by target id.
+
+    '''
+    FILES = ['src','dst','fwd_start','fwd_ids','rev_start','rev_ids']
+
+    def __init__(self, src, dst, fwd, rev):
+        self.src = src
+        self.dst = dst
+        self.fwd_start, self.fwd_ids = fwd
+        self.rev_start, self.rev_ids = rev
+
+    @classmethod
+    def build(cls, a, b):
+        '''
+        build a crosswalk from two equal length arrays of paired codes
+
+        pairs where either side is missing are dropped and duplicates collapsed.
+        '''
+        a = np.asarray(a)
+        b = np.asarray(b)
+        keep = ~(_missing(a) | _missing(b))
+        a, b = a[keep], b[keep]
+
+        #object arrays cannot be memory mapped, store codes as fixed width strings
+        a = a.astype(str) if a.dtype.kind == 'O' else a
+        b = b.astype(str) if b.dtype.kind == 'O' else b
+
+        src = Vocab.build(a)
+        dst = Vocab.build(b)
+        pairs = np.unique(np.stack([src.ids(a),dst.ids(b)],axis=1),axis=0).reshape(-1,2)
+
+        def index(key, val, n):
+            order = np.lexsort((val,key))
+            return(np.searchsorted(key[order],np.arange(n+1)),val[order])
+
+        return(cls(src,dst,index(pairs[:,0],pairs[:,1],len(src)),index(pairs[:,1],pairs[:,0],len(dst))))
+
+    def save(self, path):
+        '''
+        write the crosswalk to a directory of .npy files
+        '''
+        os.makedirs(path,exist_ok=True)
+        arrays = [self.src.codes,self.dst.codes,self.fwd_start,self.fwd_ids,self.rev_start,self.rev_ids]
+        for name, arr in zip(self.FILES,arrays):
+            np.save(os.path.join(path,name+'.npy'),arr)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        memory map a crosswalk written by save
+        '''
+        a = [np.load(os.path.join(path,name+'.npy'),mmap_mode='r') for name in cls.FILES]
+        return(cls(Vocab(a[0]),Vocab(a[1]),(a[2],a[3]),(a[4],a[5])))
+
+    @staticmethod
+    def _follow(start, ids, mask):
+        #every id reachable from the masked rows of a compressed index
+        n = np.diff(start)
+        return(np.unique(ids[np.repeat(mask,n)]))
+
+    def targets(self, codes):
+        '''
+        distinct target codes mapped from any of the given source codes
+        '''
+        return(self.dst.codes[self._follow(self.fwd_start,self.fwd_ids,self.src.mask(codes))])
+
+    def sources(self, codes):
+        '''
+        distinct source codes mapping to any of the given target codes
+        '''
+        return(self.src.codes[self._follow(self.rev_start,self.rev_ids,self.dst.mask(codes))])
+
+    def pairs(self, codes=None):
+        '''
+        (source, target) code arrays for every pair, or those whose source is in codes
+        '''
+        n = np.diff(self.fwd_start)
+        src = np.repeat(np.arange(len(self.src)),n)
+        dst = np.asarray(self.fwd_ids)
+        if codes is not None:
+            keep = self.src.mask(codes)[src]
+            src, dst = src[keep], dst[keep]
+        return(self.src.codes[src],self.dst.codes[dst])
+
+def _missing(arr):
+    if arr.dtype.kind == 'f':
+        return(np.isnan(arr))
+    if arr.dtype.kind == 'O':
+        return(np.array([i is None or (isinstance(i,float) and i != i) for i in arr],dtype=bool))
+    return(np.zeros(len(arr),dtype=bool))
+
+class CrosswalkStore():
+    '''
+    named crosswalks built once from their source files
+
+    each crosswalk is defined by a function returning paired code arrays and
+    the input files it reads. a crosswalk is built the first time it is asked
+    for and kept for the run; with path set it is also saved and memory mapped
+    on later runs until an input file, or the code, constants and helpers of
+    its definition, change.
+
+    Parameters
+    ----------
+    root : callable, optional
+        returns the directory input file names are relative to.
+    path : str, optional
+        directory for the saved crosswalks.
+    memo : cwdc_store.Memo, optional
+        supplies the file fingerprints.
+
+    '''
+    def __init__(self, root=None, path=None, memo=None):
+        self.root = root or (lambda: '')
+        self.path = path
+        self.memo = memo
+        self.lock = threading.RLock()
+        self.defs = {}
+        self.loaded = {}
+
+    def define(self, name, *inputs):
+        '''
+        decorator registering a function returning (source codes, target codes)
+
+        inputs are file names relative to root, or callables returning one when
+        the name depends on settings made after import.
+        '''
+        def wrap(func):
+            self.defs[name] = (inputs,func)
+            return(func)
+        return(wrap)
+
+    def _key(self, name):
+        inputs, func = self.defs[name]
+        #code, constants and called helpers of the definition, see cwdc_stages.code_digest
+        h = hashlib.sha256(cwdc_stages.code_digest(func).encode())
+        for i in inputs:
+            f = os.path.join(self.root(),i() if callable(i) else i)
+            h.update((self.memo.fingerprint(f) if self.memo is not None else json.dumps([f,os.stat(f).st_mtime_ns])).encode())
+        return(h.hexdigest()[:16])
+
+    def __getitem__(self, name):
+        with self.lock:
+            key = self._key(name)
+            if self.loaded.get(name,(None,))[0] == key:
+                return(self.loaded[name][1])
+
+            disk = None if self.path is None else os.path.join(self.path,'{}-{}'.format(name,key))
+            if disk is not None and os.path.exists(os.path.join(disk,'rev_ids.npy')):
+                xw = Crosswalk.load(disk)
+            else:
+                xw = Crosswalk.build(*self.defs[name][1]())
+                if disk is not None:
+                    xw.save(disk+'.tmp')
+                    os.replace(disk+'.tmp',disk)
+                    xw = Crosswalk.load(disk)
+
+            self.loaded[name] = (key,xw)
+            return(xw)
+
+class Taxonomy():
+    '''
+    hierarchical code system with interned codes and prefix matching
+
+    codes are normalized to a canonical string, whole digit floats such as
+    441110.0 become 441110, numbers are zero padded to width and separator
+    characters are removed, then interned to integer ids with pandas.factorize.
+    a code's level is the length of its canonical form and its ancestors are
+    its prefixes. membership and descendant tests are evaluated once per
+    distinct code and gathered back to every row, so they cost one hash pass
+    over the rows rather than a python loop comparing every row to every code.
+
+    Parameters
+    ----------
+    width : int, optional
+        zero pad numeric codes to this many digits, e.g. 6 for cip codes held
+        as integers.
+    sep : str, optional
+        separator characters removed from string codes, e.g. '-' for soc codes.
+    decimals : int, optional
+        digits after the decimal point of codes written as decimals, e.g. 4
+        for cip codes such as 01.0101. floats below 10 ** (width - decimals)
+        are such codes read as numbers, so 1.01 is 010100 rather than 101.
+
+    '''
+    def __init__(self, width=None, sep='', decimals=None):
+        self.width = width
+        self.sep = sep
+        self.decimals = decimals
+
+    def _canon(self, v):
+        if v is None or (isinstance(v,(float,np.floating)) and v != v):
+            return('')
+        if isinstance(v,(float,np.floating)) and self.decimals is not None and abs(v) < 10**(self.width - self.decimals):
+            return('{:.{}f}'.format(v,self.decimals).replace('.','').zfill(self.width))
+        if isinstance(v,(float,np.floating)) and float(v).is_integer():
+            v = int(v)
+        if isinstance(v,(int,np.integer)):
+            s = str(int(v))
+            return(s.zfill(self.width) if self.width else s)
+
+        s = str(v).strip()
+        if '.' not in self.sep and s.endswith('.0') and s[:-2].isdigit():
+            s = s[:-2]
+        for c in self.sep:
+            s = s.replace(c,'')
+        return(s)
+
+    def intern(self, codes):
+        '''
+        integer id of every code and the canonical code behind each id
+
+        Parameters
+        ----------
+        codes : array-like
+            codes in any mix of string and numeric form.
+
+        Returns
+        -------
+        array of ids, -1 for missing codes, and array of canonical codes
+
+        '''
+        ids, uniq = pd.factorize(pd.Series(codes,dtype=object))
+        vocab = np.array([self._canon(v) for v in uniq],dtype=str) if len(uniq) else np.array([],dtype=str)
+        return(ids,vocab)
+
+    def canon(self, codes):
+        '''
+        canonical form of every code
+        '''
+        ids, vocab = self.intern(codes)
+        return(np.where(ids >= 0,vocab[np.maximum(ids,0)] if len(vocab) else '',''))
+
+    def level(self, codes):
+        '''
+        hierarchy level of every code, the length of its canonical form
+        '''
+        return(np.char.str_len(self.canon(codes)))
+
+    def _gather(self, ids, vmask):
+        out = np.zeros(len(ids),dtype=bool)
+        ok = ids >= 0
+        out[ok] = vmask[ids[ok]]
+        return(out)
+
+    def isin(self, codes, values):
+        '''
+        mask of codes equal to any of values once both are made canonical
+        '''
+        ids, vocab = self.intern(codes)
+        return(self._gather(ids,np.isin(vocab,np.unique(self.canon(values)))))
+
+    def under(self, codes, ancestors):
+        '''
+        mask of codes equal to or descended from any of the ancestor codes
+        '''
+        ids, vocab = self.intern(codes)
+        vmask = np.zeros(len(vocab),dtype=bool)
+        for a in np.unique(self.canon(ancestors)):
+            if a:
+                vmask |= np.char.startswith(vocab,a)
+        return(self._gather(ids,vmask))
+
+#industry, occupation and program taxonomies
+NAICS = Taxonomy()
+SOC = Taxonomy(sep='-')
+CIP = Taxonomy(width=6,sep='.',decimals=4)
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+geographic helpers for locating etpl programs and planning etpl searches
+
+@author: Gabriel Moss
+"""
+import heapq
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+from functools import lru_cache
+
+def _read_dbf(buf):
+    '''
+    parse the records of a dbase table into a list of dicts
+
+    Parameters
+    ----------
+    buf : bytes
+        contents of a .dbf file.
+
+    Returns
+    -------
+    list of dicts keyed by field name
+
+    '''
+    nrec, hlen, rlen = struct.unpack('<IHH',buf[4:12])
+
+    #field descriptors are 32 bytes each and end with a carriage return
+    fields = []
+    pos = 32
+    while buf[pos] != 0x0D:
+        name = buf[pos:pos+11].split(b'\x00')[0].decode('latin-1')
+        fields.append((name,buf[pos+16]))
+        pos += 32
+
+    recs = []
+    for i in range(nrec):
+        rec = buf[hlen+i*rlen:hlen+(i+1)*rlen]
+        pos = 1
+        row = {}
+        for name, size in fields:
+            row[name] = rec[pos:pos+size].decode('latin-1').strip()
+            pos += size
+        recs.append(row)
+
+    return(recs)
+
+def _read_shp(buf):
+    '''
+    parse the rings of every polygon record in a shapefile
+
+    Parameters
+    ----------
+    buf : bytes
+        contents of a .shp file.
+
+    Returns
+    -------
+    list containing a list of (n, 2) lon / lat ring arrays per record
+
+    '''
+    shapes = []
+    pos = 100
+    while pos < len(buf):
+        length = struct.unpack('>I',buf[pos+4:pos+8])[0] * 2
+        rec = buf[pos+8:pos+8+length]
+        pos += 8 + length
+
+        stype = struct.unpack('<i',rec[:4])[0]
+        if stype not in (5,15,25):
+            shapes.append([])
+            continue
+
+        nparts, npoints = struct.unpack('<ii',rec[36:44])
+        parts = list(struct.unpack('<{}i'.format(nparts),rec[44:44+4*nparts])) + [npoints]
+        pts = np.frombuffer(rec,dtype='<f8',count=2*npoints,offset=44+4*nparts).reshape(-1,2)
+        shapes.append([pts[parts[i]:parts[i+1]] for i in range(nparts)])
+
+    return(shapes)
+
+def read_boundaries(path, key=None):
+    '''
+    read county polygons from a geojson file or a (zipped) shapefile
+
+    census cartographic boundary files such as cb_2019_us_county_500k.zip can be
+    used as downloaded.
+
+    Parameters
+    ----------
+    path : str
+        path to a .geojson / .json, .shp or .zip file.
+    key : str, optional
+        attribute holding the county fips code. defaults to GEOID, falling back
+        to STATEFP + COUNTYFP.
+
+    Returns
+    -------
+    list of fips codes and a matching list of ring lists
+
+    '''
+    def fips(props):
+        if key is not None:
+            return(str(props[key]))
+        if 'GEOID' in props:
+            return(str(props['GEOID']))
+        return('{}{}'.format(props['STATEFP'],props['COUNTYFP']))
+
+    if path.endswith('.json') or path.endswith('.geojson'):
+        with open(path) as f:
+            features = json.load(f)['features']
+
+        codes, shapes = [], []
+        for feat in features:
+            geom = feat['geometry']
+            polys = [geom['coordinates']] if geom['type'] == 'Polygon' else geom['coordinates']
+            codes.append(fips(feat['properties']))
+            shapes.append([np.asarray(ring,dtype=float)[:,:2] for poly in polys for ring in poly])
+        return(codes,shapes)
+
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as z:
+            names = z.namelist()
+            shp = z.read([i for i in names if i.endswith('.shp')][0])
+            dbf = z.read([i for i in names if i.endswith('.dbf')][0])
+    else:
+        with open(path,'rb') as f:
+            shp = f.read()
+        with open(os.path.splitext(path)[0]+'.dbf','rb') as f:
+            dbf = f.read()
+
+    return([fips(i) for i in _read_dbf(dbf)],_read_shp(shp))
+
+class CountyLocator():
+    '''
+    point in polygon lookup of county fips codes over a uniform grid index
+
+    every polygon is registered in each grid cell its bounding box touches, so a
+    query only tests the few counties sharing a cell with each point. the test
+    itself is an even-odd ray cast vectorized over points and edges, which also
+    handles holes and multi-part counties.
+
+    Parameters
+    ----------
+    codes : list
+        fips code of each county.
+    shapes : list
+        list of (n, 2) lon / lat ring arrays for each county.
+    cell : float, optional
+        grid cell size in degrees.
+
+    '''
+    def __init__(self, codes, shapes, cell=0.25):
+        self.codes = np.asarray(codes,dtype=object)
+        self.cell = cell
+
+        #flatten every ring into an edge table keyed by county
+        edges, bbox = [], []
+        for rings in shapes:
+            e = [np.hstack([r[:-1],r[1:]]) for r in rings if len(r) > 1]
+            e = np.vstack(e) if e else np.zeros((0,4))
+            edges.append(e)
+            bbox.append([e[:,[0,2]].min(),e[:,[1,3]].min(),e[:,[0,2]].max(),e[:,[1,3]].max()] if len(e) else [np.nan]*4)
+        self.edges = edges
+        bbox = np.asarray(bbox,dtype=float)
+        self.bbox = bbox
+
+        ok = ~np.isnan(bbox[:,0])
+        self.x0, self.y0 = np.nanmin(bbox[:,0]), np.nanmin(bbox[:,1])
+        self.nx = int((np.nanmax(bbox[:,2]) - self.x0) // cell) + 1
+        self.ny = int((np.nanmax(bbox[:,3]) - self.y0) // cell) + 1
+
+        #register each county in the cells covered by its bounding box
+        cells, feats = [], []
+        for f in np.flatnonzero(ok):
+            cx0, cy0, cx1, cy1 = self._cell(bbox[f,0],bbox[f,1]) + self._cell(bbox[f,2],bbox[f,3])
+            cx, cy = np.meshgrid(np.arange(cx0,cx1+1),np.arange(cy0,cy1+1))
+            cells.append((cy * self.nx + cx).ravel())
+            feats.append(np.full(cx.size,f))
+        cells = np.concatenate(cells)
+        feats = np.concatenate(feats)
+
+        #compressed cell -> county lists
+        order = np.argsort(cells,kind='stable')
+        self.cell_feats = feats[order]
+        self.cell_start = np.searchsorted(cells[order],np.arange(self.nx*self.ny+1))
+
+    def _cell(self, x, y):
+        return((int((x - self.x0) // self.cell),int((y - self.y0) // self.cell)))
+
+    @staticmethod
+    def _inside(px, py, edges, chunk=2**22):
+        #even-odd ray cast of every point against every edge, chunked to bound memory
+        x1, y1, x2, y2 = edges.T
+        out = np.zeros(len(px),dtype=bool)
+        step = max(1,chunk // max(1,len(edges)))
+        with np.errstate(divide='ignore',invalid='ignore'):
+            for i in range(0,len(px),step):
+                x = px[i:i+step,None]
+                y = py[i:i+step,None]
+                cross = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+                out[i:i+step] = cross.sum(axis=1) % 2 == 1
+        return(out)
+
+    def locate(self, lat, lon):
+        '''
+        fips code of the county containing each point
+
+        Parameters
+        ----------
+        lat : array-like
+            latitudes.
+        lon : array-like
+            longitudes.
+
+        Returns
+        -------
+        object array of fips codes, None where no county contains the point
+
+        '''
+        lat = np.asarray(lat,dtype=float)
+        lon = np.asarray(lon,dtype=float)
+        out = np.full(len(lat),None,dtype=object)
+
+        cx = np.floor((lon - self.x0) / self.cell)
+        cy = np.floor((lat - self.y0) / self.cell)
+        ok = (cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny)
+        pts = np.flatnonzero(ok)
+        cid = (cy[ok] * self.nx + cx[ok]).astype(np.int64)
+
+        #expand each point into (point, candidate county) pairs
+        start = self.cell_start[cid]
+        n = self.cell_start[cid+1] - start
+        pair_pt = np.repeat(pts,n)
+        pair_ft = self.cell_feats[np.arange(n.sum()) - np.repeat(np.cumsum(n) - n,n) + np.repeat(start,n)]
+
+        #test candidates one county at a time, all of its points at once
+        order = np.argsort(pair_ft,kind='stable')
+        pair_pt, pair_ft = pair_pt[order], pair_ft[order]
+        bounds = np.flatnonzero(np.diff(pair_ft)) + 1
+        for p, f in zip(np.split(pair_pt,bounds),np.split(pair_ft,bounds)):
+            if len(p) == 0:
+                continue
+            f = f[0]
+            b = self.bbox[f]
+            p = p[(lon[p] >= b[0]) & (lon[p] <= b[2]) & (lat[p] >= b[1]) & (lat[p] <= b[3])]
+            hit = p[self._inside(lon[p],lat[p],self.edges[f])]
+            out[hit] = self.codes[f]
+
+        return(out)
+
+@lru_cache(maxsize=None)
+def county_locator(path, key=None):
+    '''
+    build, once per boundary file, a CountyLocator
+
+    Parameters
+    ----------
+    path : str
+        path to the county boundary file, see read_boundaries.
+    key : str, optional
+        attribute holding the county fips code.
+
+    Returns
+    -------
+    CountyLocator
+
+    '''
+    codes, shapes = read_boundaries(path,key)
+    return(CountyLocator(codes,shapes))
+
+#mean earth radius in miles
+EARTH_MILES = 3958.8
+
+def haversine(lat1, lon1, lat2, lon2):
+    '''
+    great circle distance in miles, broadcasting over array inputs
+    '''
+    lat1, lon1, lat2, lon2 = [np.radians(np.asarray(i,dtype=float)) for i in (lat1,lon1,lat2,lon2)]
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return(2 * EARTH_MILES * np.arcsin(np.sqrt(np.clip(a,0,1))))
+
+def _grid(lat, radius):
+    #cell sizes at least radius miles wide at the highest latitude given
+    dlat = radius / 69.0
+    dlon = radius / (69.0 * max(np.cos(np.radians(np.abs(lat).max())),0.01))
+    return(dlat,dlon)
+
+def neighbours(lat, lon, radius):
+    '''
+    for every point, the indices of all points within radius miles of it
+
+    points are bucketed on a grid at least radius wide, so only the 3 x 3 block of
+    cells around each point is measured.
+
+    Parameters
+    ----------
+    lat : array-like
+        latitudes.
+    lon : array-like
+        longitudes.
+    radius : float
+        distance in miles.
+
+    Returns
+    -------
+    list of index arrays
+
+    '''
+    lat = np.asarray(lat,dtype=float)
+    lon = np.asarray(lon,dtype=float)
+
+    #degrees of latitude are ~69 miles, degrees of longitude shrink toward the poles
+    dlat, dlon = _grid(lat,radius)
+    cy = np.floor(lat / dlat).astype(np.int64)
+    cx = np.floor(lon / dlon).astype(np.int64)
+
+    cells = {}
+    for i, key in enumerate(zip(cx,cy)):
+        cells.setdefault(key,[]).append(i)
+    cells = {k:np.asarray(v) for k, v in cells.items()}
+
+    out = [None] * len(lat)
+    for (x, y), pts in cells.items():
+        near = [cells[(x+i,y+j)] for i in (-1,0,1) for j in (-1,0,1) if (x+i,y+j) in cells]
+        near = np.concatenate(near)
+        d = haversine(lat[pts,None],lon[pts,None],lat[near],lon[near])
+        for k, p in enumerate(pts):
+            out[p] = near[d[k] <= radius]
+
+    return(out)
+
+def within(lat, lon, ref_lat, ref_lon, radius):
+    '''
+    mask of the points lying within radius miles of any reference point
+
+    Parameters
+    ----------
+    lat, lon : array-like
+        coordinates of the points to test.
+    ref_lat, ref_lon : array-like
+        coordinates of the reference points.
+    radius : float
+        distance in miles.
+
+    Returns
+    -------
+    boolean array aligned with lat
+
+    '''
+    lat = np.asarray(lat,dtype=float)
+    lon = np.asarray(lon,dtype=float)
+    ref_lat = np.asarray(ref_lat,dtype=float)
+    ref_lon = np.asarray(ref_lon,dtype=float)
+    out = np.zeros(len(lat),dtype=bool)
+    if not len(lat) or not len(ref_lat):
+        return(out)
+
+    dlat, dlon = _grid(np.concatenate([lat,ref_lat]),radius)
+    cells = {}
+    for i, key in enumerate(zip(np.floor(ref_lon / dlon).astype(np.int64),np.floor(ref_lat / dlat).astype(np.int64))):
+        cells.setdefault(key,[]).append(i)
+    cells = {k:np.asarray(v) for k, v in cells.items()}
+
+    cx = np.floor(lon / dlon).astype(np.int64)
+    cy = np.floor(lat / dlat).astype(np.int64)
+    for p, (x, y) in enumerate(zip(cx,cy)):
+        near = [cells[(x+i,y+j)] for i in (-1,0,1) for j in (-1,0,1) if (x+i,y+j) in cells]
+        if near:
+            near = np.concatenate(near)
+            out[p] = (haversine(lat[p],lon[p],ref_lat[near],ref_lon[near]) <= radius).any()
+    return(out)
+
+def plan_search_centres(lat, lon, spread=10):
+    '''
+    choose a near minimal set of search centres covering every input point
+
+    every point lies within spread miles of a centre, so by the triangle
+    inequality a search of radius + spread miles around the centres reaches
+    everything a search of radius miles around every point would. results
+    beyond radius miles of every point are then dropped with within, leaving
+    exactly the results of searching around every point. centres are picked
+    from the input points by greedy set cover, which is within a log factor of
+    the optimum.
+
+    Parameters
+    ----------
+    lat : array-like
+        latitudes of the points to cover, e.g. zcta centroids.
+    lon : array-like
+        longitudes of the points to cover.
+    spread : float, optional
+        miles between a point and the centre covering it. larger values need
+        fewer but wider searches.
+
+    Returns
+    -------
+    array of indices of the points chosen as centres
+
+    '''
+    nbrs = neighbours(lat,lon,spread)
+    covered = np.zeros(len(nbrs),dtype=bool)
+
+    #lazy greedy, a stale gain is recomputed only when it reaches the top of the heap
+    heap = [(-len(n),i) for i, n in enumerate(nbrs)]
+    heapq.heapify(heap)
+
+    centres = []
+    while heap and not covered.all():
+        gain, i = heapq.heappop(heap)
+        new = int((~covered[nbrs[i]]).sum())
+        if new == 0:
+            continue
+        if new < -gain:
+            heapq.heappush(heap,(-new,i))
+            continue
+        centres.append(i)
+        covered[nbrs[i]] = True
+
+    return(np.asarray(centres,dtype=np.int64))
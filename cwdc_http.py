@@ -0,0 +1,544 @@
+# -*- coding: utf-8 -*-
+"""
+http helpers shared by every remote fetch in cwdc_idx
+
+@author: Gabriel Moss
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import requests
+from email.utils import formatdate
+from urllib.parse import urlparse
+
+#seconds a cached response from each source is served without revalidation
+DEFAULT_TTLS = {
+    'default':86400,
+    'urban':30*86400,
+    'census':30*86400,
+    'fcc':365*86400,
+    'dol':7*86400,
+    'scrape':7*86400
+    }
+
+class CacheMiss(Exception):
+    '''
+    raised when the cache is offline and holds no copy of the requested url
+    '''
+
+def _response(url, status, headers, body):
+    '''
+    build a requests response object around a cached body
+
+    Parameters
+    ----------
+    url : str
+        url the body was fetched from.
+    status : int
+        http status code of the original response.
+    headers : dict
+        headers of the original response.
+    body : bytes
+        response body.
+
+    Returns
+    -------
+    requests.Response
+
+    '''
+    r = requests.models.Response()
+    r.url = url
+    r.status_code = status
+    r.headers = requests.structures.CaseInsensitiveDict(headers)
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = body
+    r.from_cache = True
+    return(r)
+
+class ResponseCache():
+    '''
+    content addressed on disk cache of http GET responses
+
+    bodies are stored once per sha256 digest under objects/, an sqlite index maps
+    each url to its body, validators and fetch / access times. stale entries are
+    revalidated with ETag / Last-Modified, and the least recently used entries are
+    evicted once the stored bodies exceed max_bytes.
+
+    Parameters
+    ----------
+    path : str
+        directory holding the cache.
+    ttls : dict, optional
+        seconds each source stays fresh, merged over DEFAULT_TTLS. a ttl of
+        None never expires.
+    max_bytes : int, optional
+        upper bound on the total size of stored bodies.
+    offline : bool, optional
+        serve only from the cache, never touching the network.
+
+    '''
+    def __init__(self, path, ttls=None, max_bytes=4*2**30, offline=False):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.RLock()
+
+        os.makedirs(os.path.join(path,'objects'),exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(path,'index.sqlite'),check_same_thread=False)
+        self.db.execute('''create table if not exists entries (
+            key text primary key,
+            url text,
+            source text,
+            digest text,
+            size integer,
+            status integer,
+            headers text,
+            etag text,
+            last_modified text,
+            fetched real,
+            accessed real)''')
+        self.db.execute('create index if not exists entries_accessed on entries (accessed)')
+        self.db.commit()
+
+    def key(self, url, headers=None):
+        '''
+        cache key of a request, the url plus any content negotiation headers
+        '''
+        accept = (headers or {}).get('Accept','')
+        return(hashlib.sha256('{}\n{}'.format(url,accept).encode()).hexdigest())
+
+    def _object(self, digest):
+        return(os.path.join(self.path,'objects',digest[:2],digest[2:]))
+
+    def _read(self, row):
+        key, url, digest, status, headers = row[0], row[1], row[3], row[5], row[6]
+        with open(self._object(digest),'rb') as f:
+            body = f.read()
+        with self.lock:
+            self.db.execute('update entries set accessed=? where key=?',(time.time(),key))
+            self.db.commit()
+        return(_response(url,status,json.loads(headers),body))
+
+    def _write(self, key, url, source, r):
+        body = r.content
+        digest = hashlib.sha256(body).hexdigest()
+
+        #bodies are content addressed, identical payloads are stored once
+        obj = self._object(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj),exist_ok=True)
+            tmp = '{}.{}.tmp'.format(obj,threading.get_ident())
+            with open(tmp,'wb') as f:
+                f.write(body)
+            os.replace(tmp,obj)
+
+        #drop transfer headers that no longer describe the stored body
+        headers = {k:v for k,v in r.headers.items() if k.lower() not in ['content-encoding','transfer-encoding','content-length']}
+        now = time.time()
+        with self.lock:
+            self.db.execute('insert or replace into entries values (?,?,?,?,?,?,?,?,?,?,?)',(
+                key,url,source,digest,len(body),r.status_code,json.dumps(headers),
+                r.headers.get('ETag'),r.headers.get('Last-Modified'),now,now))
+            self.db.commit()
+            self.evict()
+
+    def size(self):
+        '''
+        total bytes of bodies referenced by the index
+        '''
+        with self.lock:
+            n = self.db.execute('select sum(size) from (select distinct digest, size from entries)').fetchone()[0]
+        return(n or 0)
+
+    def evict(self):
+        '''
+        remove least recently used entries until the cache fits in max_bytes
+        '''
+        with self.lock:
+            total = self.size()
+            if total <= self.max_bytes:
+                return
+
+            rows = self.db.execute('select key, digest, size from entries order by accessed').fetchall()
+            dropped = set()
+            for key, digest, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self.db.execute('delete from entries where key=?',(key,))
+
+                #only release the body once no other url points at it
+                if self.db.execute('select 1 from entries where digest=? limit 1',(digest,)).fetchone() is None:
+                    total -= size
+                    dropped.add(digest)
+            self.db.commit()
+
+            for digest in dropped:
+                try:
+                    os.remove(self._object(digest))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, url, source='default', headers=None, fetch=None):
+        '''
+        return the response for url, from disk when fresh and from the network otherwise
+
+        Parameters
+        ----------
+        url : str
+            url to request.
+        source : str, optional
+            name of the data source, used to pick the ttl.
+        headers : dict, optional
+            request headers.
+        fetch : callable, optional
+            function taking (url, headers) and returning a response, defaults to
+            the shared client.
+
+        Returns
+        -------
+        requests.Response
+
+        '''
+        fetch = fetch or _fetch
+        key = self.key(url,headers)
+
+        with self.lock:
+            row = self.db.execute('select * from entries where key=?',(key,)).fetchone()
+
+        #an entry whose body was evicted underneath it counts as a miss
+        if row is not None and not os.path.exists(self._object(row[3])):
+            row = None
+
+        if self.offline:
+            if row is None:
+                raise CacheMiss(url)
+            return(self._read(row))
+
+        ttl = self.ttls.get(source,self.ttls['default'])
+        if row is not None and (ttl is None or time.time() - row[9] < ttl):
+            return(self._read(row))
+
+        #stale entries are revalidated rather than refetched when the server allows it
+        headers = dict(headers or {})
+        if row is not None:
+            if row[7]:
+                headers['If-None-Match'] = row[7]
+            if row[8]:
+                headers['If-Modified-Since'] = row[8]
+            elif not row[7]:
+                headers['If-Modified-Since'] = formatdate(row[9],usegmt=True)
+
+        r = fetch(url,headers)
+
+        if row is not None and r.status_code == 304:
+            with self.lock:
+                self.db.execute('update entries set fetched=? where key=?',(time.time(),key))
+                self.db.commit()
+            return(self._read(row))
+
+        if r.status_code == 200:
+            self._write(key,url,source,r)
+
+        r.from_cache = False
+        return(r)
+
+    def clear(self, source=None):
+        '''
+        drop every entry, or every entry belonging to one source
+        '''
+        with self.lock:
+            if source is None:
+                digests = self.db.execute('select distinct digest from entries').fetchall()
+                self.db.execute('delete from entries')
+            else:
+                digests = self.db.execute('select distinct digest from entries where source=?',(source,)).fetchall()
+                self.db.execute('delete from entries where source=?',(source,))
+            self.db.commit()
+
+            #release bodies no remaining url points at
+            for (digest,) in digests:
+                if self.db.execute('select 1 from entries where digest=? limit 1',(digest,)).fetchone() is None:
+                    try:
+                        os.remove(self._object(digest))
+                    except FileNotFoundError:
+                        pass
+
+#cache used by get(), None until configure_cache is called
+cache = None
+
+#sustained requests per second and burst size allowed to each host, read when
+#the client first contacts the host
+rates = {
+    'default':(5,10),
+    'cxsearch.dol.gov':(4,4),
+    'geo.fcc.gov':(10,10),
+    'api.census.gov':(5,10),
+    'educationdata.urban.org':(5,10)
+    }
+
+class TokenBucket():
+    '''
+    token bucket rate limiter, refilling rate tokens per second up to burst
+    '''
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        block until a token is available and take it
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        #the token is already spoken for, sleep outside the lock until it refills
+        if wait > 0:
+            time.sleep(wait)
+
+class Client():
+    '''
+    pooled http client shared by every fetcher
+
+    connections are kept alive per host in a requests session, every request is
+    rate limited by its host's token bucket and capped in concurrency, and
+    connection errors, timeouts, 429s and 5xx responses are retried with jittered
+    exponential backoff. requests, bytes, latency, retries and errors are counted
+    per host.
+
+    Parameters
+    ----------
+    max_per_host : int, optional
+        most requests in flight to a single host.
+    retries : int, optional
+        retries after the first attempt.
+    backoff : float, optional
+        base backoff in seconds, doubled on every retry.
+    max_backoff : float, optional
+        ceiling on a single backoff.
+    timeout : tuple, optional
+        connect and read timeouts in seconds.
+
+    '''
+    RETRY_STATUS = (429,500,502,503,504)
+
+    def __init__(self, max_per_host=4, retries=5, backoff=1.0, max_backoff=60.0, timeout=(10,120)):
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=16,pool_maxsize=max(10,max_per_host))
+        self.session.mount('https://',adapter)
+        self.session.mount('http://',adapter)
+
+    def _host(self, host):
+        with self.lock:
+            if host not in self.hosts:
+                rate, burst = rates.get(host,rates['default'])
+                self.hosts[host] = {
+                    'bucket':TokenBucket(rate,burst),
+                    'slots':threading.BoundedSemaphore(self.max_per_host),
+                    'stats':{'requests':0,'bytes':0,'seconds':0.0,'retries':0,'errors':0}
+                    }
+            return(self.hosts[host])
+
+    def _wait(self, attempt, r=None):
+        #honour the server's Retry-After when it gives one in seconds
+        after = r.headers.get('Retry-After') if r is not None else None
+        if after is not None and after.isdigit():
+            delay = float(after)
+        else:
+            delay = random.uniform(0.5,1.0) * min(self.max_backoff,self.backoff * 2**attempt)
+        time.sleep(delay)
+
+    def get(self, url, headers=None):
+        '''
+        GET a url with pooling, rate limiting and retries
+
+        Parameters
+        ----------
+        url : str
+            url to request.
+        headers : dict, optional
+            request headers.
+
+        Returns
+        -------
+        requests.Response
+
+        '''
+        h = self._host(urlparse(url).netloc)
+        stats = h['stats']
+
+        for attempt in range(self.retries + 1):
+            h['bucket'].acquire()
+            start = time.perf_counter()
+            try:
+                with h['slots']:
+                    r = self.session.get(url,headers=headers,timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                with self.lock:
+                    stats['requests'] += 1
+                    stats['errors'] += 1
+                    stats['seconds'] += time.perf_counter() - start
+                if attempt == self.retries:
+                    raise
+                with self.lock:
+                    stats['retries'] += 1
+                self._wait(attempt)
+                continue
+
+            with self.lock:
+                stats['requests'] += 1
+                stats['bytes'] += len(r.content)
+                stats['seconds'] += time.perf_counter() - start
+                if r.status_code >= 400:
+                    stats['errors'] += 1
+
+            if r.status_code not in self.RETRY_STATUS or attempt == self.retries:
+                return(r)
+            with self.lock:
+                stats['retries'] += 1
+            self._wait(attempt,r)
+
+    def stats(self):
+        '''
+        per host request counters
+
+        Returns
+        -------
+        dict mapping host to requests, bytes, seconds, retries and errors
+
+        '''
+        with self.lock:
+            return({host:dict(h['stats']) for host, h in self.hosts.items()})
+
+#client used for every network request
+client = Client()
+
+def configure_client(**kwargs):
+    '''
+    replace the shared client, see Client for the accepted keyword arguments
+
+    Returns
+    -------
+    Client
+
+    '''
+    global client
+    client = Client(**kwargs)
+    return(client)
+
+#replacement base urls, e.g. {'https://api.census.gov':'http://localhost:8765/api.census.gov'}
+#used to point the fetchers at a stand in server such as cwdc_replay
+base_urls = {}
+
+#object given every response through its add(url, response) method, see
+#cwdc_replay.FixtureStore. None disables recording
+recorder = None
+
+def rewrite(url):
+    '''
+    apply the longest matching base_urls override to a url
+    '''
+    for base in sorted(base_urls,key=len,reverse=True):
+        if url.startswith(base):
+            return(base_urls[base] + url[len(base):])
+    return(url)
+
+def _fetch(url, headers=None):
+    return(client.get(url,headers=headers))
+
+def configure_cache(path, ttls=None, max_bytes=4*2**30, offline=False):
+    '''
+    point every fetch in cwdc_idx at an on disk response cache
+
+    Parameters
+    ----------
+    path : str
+        directory holding the cache.
+    ttls : dict, optional
+        seconds each source stays fresh.
+    max_bytes : int, optional
+        upper bound on the total size of cached bodies.
+    offline : bool, optional
+        serve only from the cache.
+
+    Returns
+    -------
+    ResponseCache
+
+    '''
+    global cache
+    cache = ResponseCache(path,ttls=ttls,max_bytes=max_bytes,offline=offline)
+    return(cache)
+
+#calls through get per source and how many were answered from the cache
+calls = {}
+calls_lock = threading.Lock()
+
+def get(url, source='default', headers=None):
+    '''
+    GET a url through the response cache when one is configured
+
+    the url is first rewritten by base_urls, and the response is handed to the
+    recorder when one is set.
+
+    Parameters
+    ----------
+    url : str
+        url to request.
+    source : str, optional
+        name of the data source, one of the keys of DEFAULT_TTLS.
+    headers : dict, optional
+        request headers.
+
+    Returns
+    -------
+    requests.Response
+
+    '''
+    target = rewrite(url)
+    if cache is None:
+        r = _fetch(target,headers)
+    else:
+        r = cache.get(target,source=source,headers=headers,fetch=_fetch)
+
+    with calls_lock:
+        c = calls.setdefault(source,{'calls':0,'cache_hits':0})
+        c['calls'] += 1
+        c['cache_hits'] += bool(getattr(r,'from_cache',False))
+    
+    if recorder is not None:
+        recorder.add(url,r)
+    return(r)
+
+def totals():
+    '''
+    calls through get, cache hits, network requests, bytes received, retries and
+    errors since the start of the run, summed over every source and host
+    '''
+    with calls_lock:
+        out = {'http_calls':sum(c['calls'] for c in calls.values()),
+               'http_cache_hits':sum(c['cache_hits'] for c in calls.values())}
+    hosts = client.stats().values()
+    for k in ['requests','bytes','retries','errors']:
+        out['http_'+k] = sum(h[k] for h in hosts)
+    return(out)
@@ -5,17 +5,148 @@ Created on Wed Jul  7 12:05:53 2021
 @author: Gabriel Moss
 """
 import pandas as pd
-import requests
 import math
 import ast
 import numpy as np
 import os
+import argparse
+import contextlib
+import sys
+import json
+import logging
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 from bs4 import BeautifulSoup as bs
+import openpyxl
+import cwdc_http
+import cwdc_geo
+import cwdc_store
+import cwdc_codes
+import cwdc_transitions
+import cwdc_nibrs
+import cwdc_stages
+import cwdc_perf
+import cwdc_replay
 
-def in_demand_occupations():
+#progress of long running scrapes, shown by main at info level
+log = logging.getLogger(__name__)
+
+#location of index data, set by configure
+working_dir = None
+
+#directory holding checkpoint journals of long running scrapes, None disables them
+journal_dir = None
+
+#cache policy set by configure, 'refresh' reruns REMOTE_STAGES in score
+cache_policy = 'off'
+
+#stages whose output comes from remote data rather than files under working_dir
+REMOTE_STAGES = ('ipeds','acs','etpl','regions')
+
+#occupation, cip and industry lists, computed once per run and reused across runs
+#while their input files are unchanged once memo.path is set
+memo = cwdc_store.Memo(root=lambda: working_dir)
+
+#excel workbooks are parsed once into parquet copies once tables.path is set
+tables = cwdc_store.ColumnarCache(memo=memo)
+
+#o*net database release whose text files, unzipped under working_dir, supply
+#job zones
+onet_db = 'db_25_1_text/'
+
+#code crosswalks, built once per run and memory mapped across runs once
+#crosswalks.path is set
+crosswalks = cwdc_codes.CrosswalkStore(root=lambda: working_dir,memo=memo)
+
+#outputs of every pipeline stage, reused across runs until their code, inputs
+#or upstream outputs change once artifacts.path is set
+artifacts = cwdc_stages.ArtifactStore(root=lambda: working_dir,memo=memo)
+
+@crosswalks.define('emsi_onet','map_stdonet_emsisoc2019.csv')
+def emsi_onet_crosswalk():
+    '''
+    emsi 5 digit soc codes to 6 digit onet soc codes
+
+    Returns
+    -------
+    arrays of paired emsi and onet soc codes
+
+    '''
+    emsiSocs = pd.read_csv(working_dir+'map_stdonet_emsisoc2019.csv',usecols=['emsi_soc_5','std_onet'],dtype=str)
+    return(emsiSocs['emsi_soc_5'].values,emsiSocs['std_onet'].str.split('.').str[0].values)
+
+def job_zones():
+    '''
+    job zones file of the configured o*net release, relative to working_dir
+    '''
+    return(onet_db+'Job Zones.txt')
+
+@crosswalks.define('onet_zone',job_zones)
+def onet_zone_crosswalk():
+    '''
+    6 digit onet soc codes to job zones from the o*net database
+
+    Returns
+    -------
+    arrays of paired soc codes and job zones
+
+    '''
+    zones = pd.read_csv(working_dir+job_zones(),sep='\t',usecols=['O*NET-SOC Code','Job Zone'],
+                        dtype={'O*NET-SOC Code':str,'Job Zone':'int8'})
+    return(zones['O*NET-SOC Code'].str.split('.').str[0].values,zones['Job Zone'].values)
+
+@crosswalks.define('socxx_soc','WoF_CREC_data/full_crosswalk_soc10_socxx.csv')
+def brookings_soc_crosswalk():
+    '''
+    brookings socxx occupation codes to soc codes
+
+    Returns
+    -------
+    arrays of paired socxx and soc codes
+
+    '''
+    xwalk = pd.read_csv(working_dir+'WoF_CREC_data/full_crosswalk_soc10_socxx.csv',usecols=['socxx_code','soc_code'])
+    return(xwalk['socxx_code'].values,xwalk['soc_code'].values)
+
+@crosswalks.define('soc_cip','CIP2020_SOC2018_Crosswalk.xlsx')
+def soc_cip_crosswalk():
+    '''
+    2018 soc codes to 2020 cip codes, with the cip decimal place removed
+
+    Returns
+    -------
+    arrays of paired soc and 6 digit integer cip codes
+
+    '''
+    soc_x_cip = tables.read_excel(working_dir+'CIP2020_SOC2018_Crosswalk.xlsx',sheet_name='SOC-CIP',columns=['CIP2020Code','SOC2018Code']).dropna()
+    return(soc_x_cip['SOC2018Code'].values,np.round(soc_x_cip['CIP2020Code'].astype(float) * 10000).astype(int).values)
+
+@memo.cached('cwdc_socs.txt')
+def front_line_socs():
+    '''
+    reads the cwdc front line occupation list
+
+    Returns
+    -------
+    list of front line soc codes
+
+    '''
+    cwdc_socs = pd.read_csv(working_dir+'cwdc_socs.txt',sep='|',header=None)
+    return([i.split()[0] for i in cwdc_socs[0]])
+
+@memo.cached('All Top Jobs.csv','map_stdonet_emsisoc2019.csv',job_zones)
+def in_demand_occupations(zones=(1,2,3)):
     '''
     gets in demand occupations from cdhe projections
     
+    Parameters
+    ----------
+    zones : tuple, optional
+        o*net job zones an occupation must fall in.
+
     Returns
     -------
     list containing in demand occupations
@@ -28,80 +159,65 @@ def in_demand_occupations():
     top['Median Annual Salary ($)'] = [int(i.replace(',','')) for i in top['Median Annual Salary ($)']]
     top['Projected Annual Openings'] = [int(i.replace(',','')) for i in top['Projected Annual Openings']]
 
-    #get job zone 1-3
-    url = 'https://www.onetonline.org/find/zone?z={}&g=Go'
-    
-    socs = {}
-    
-    for i in range(1,3):
-        r = requests.get(url.format(i))
-        soup = bs(r.content)
-        tab = soup.find('table')
-        rows = tab.findAll('tr')[1:]
-        for r in rows:
-            socs[r.find('td').text.split('.')[0]] = 'jz{}'.format(i)
+    #get job zone 1-3 occupations
+    socs = set(crosswalks['onet_zone'].sources(list(zones)))
 
-    #read in emsi to onet soc map
-    emsiSocs = pd.read_csv(working_dir+'map_stdonet_emsisoc2019.csv')
-    emsiSocs.drop_duplicates(inplace=True)
+    #look up the 6 digit onet codes of the top occupations in the emsi / onet crosswalk
+    emsi, onet = crosswalks['emsi_onet'].pairs(top['SOC Code'])
     
-    #merge top occupations with the emsi / onet crosswalk, use only 6 digit onet code
-    top = top.merge(emsiSocs,left_on='SOC Code',right_on='emsi_soc_5',how='left')
-    top['SOC'] = [i.split('.')[0] if str(i) != 'nan' else np.nan for i in top['std_onet']]
+    #merge top occupations with their onet codes
+    top = top.merge(pd.DataFrame({'SOC Code':emsi,'SOC':onet}),on='SOC Code',how='left')
     top = top[['SOC Code','SOC','Median Hourly Salary ($)','Median Annual Salary ($)','2019-2029 Growth (%)',
                'Projected Annual Openings']].drop_duplicates()
     
-    #iterate through the table and replace blank SOC with corresponding SOC codes
-    for index, row in top.iterrows():
-        if str(row['SOC']) == 'nan':
-            top.loc[index,'SOC'] = row['SOC Code']
+    #replace blank SOC with corresponding SOC codes
+    top['SOC'] = top['SOC'].fillna(top['SOC Code'])
     
-    #identify job zone 3 occupations
-    top['jz'] = [i in socs.keys() for i in top['SOC']]
+    #identify job zone 1-3 occupations
+    top['jz'] = top['SOC'].isin(socs)
     top = top[top['jz']].drop(['SOC Code','jz'],axis=1)
     
-    #return a list of in demand job zone 3 occupations
+    #return a list of in demand job zone 1-3 occupations
     return(list(top['SOC']))
 
-def brookings_occupations():
+@memo.cached('WoF_CREC_data/full_transition_file_socxx.csv')
+def transition_graph():
+    '''
+    brookings one step occupation transitions as a sparse graph
+
+    Returns
+    -------
+    cwdc_transitions.TransitionGraph
+
+    '''
+    return(cwdc_transitions.TransitionGraph.read_csv(working_dir+'WoF_CREC_data/full_transition_file_socxx.csv'))
+
+@memo.cached('WoF_CREC_data/full_transition_file_socxx.csv',
+             'WoF_CREC_data/full_crosswalk_soc10_socxx.csv')
+def brookings_occupations(k=2):
     '''
     use data from brookings to produce a set of attainable jobs for the front line workforce
 
+    Parameters
+    ----------
+    k : int, optional
+        most transitions on a pathway, 2 matches brookings' first and second
+        stage transition files.
+
     Returns
     -------
     list of soc codes derived from brookings model
 
     '''
-    #read in first step transition data
-    bocc1 = pd.read_csv(working_dir+'WoF_CREC_data/full_transition_file_socxx.csv')
-    
-    #keep only transitions to new occupations
-    bocc1 = bocc1[bocc1['occ_a']!=bocc1['occ_b']]
+    #occupations reachable in up to k transitions into a new occupation earning
+    #at least the same as the starting occupation
+    bocc = transition_graph().destinations(k)
     
-    #keep only transitions earning at least the same as the starting occupation
-    bocc1 = bocc1[bocc1['h_median_b']>=bocc1['h_median_a']]
-    
-    bocc1 = bocc1[['occ_a','occ_b']].rename(columns={'occ_b':'occ_c'})
-    
-    #read in and subset second stage transition data
-    bocc2 = pd.read_csv(working_dir+'WoF_CREC_data/full_transition_file_socxx_2_step.csv')
-    bocc2 = bocc2[bocc2['occ_a']!=bocc2['occ_c']]
-    bocc2 = bocc2[bocc2['h_median_c']>=bocc2['h_median_a']]
-    
-    bocc2 = bocc2[['occ_a','occ_c']]
-    
-    #append first and second stage transitions
-    bocc = bocc1.append(bocc2)
-    
-    #read in brookings to SOC crosswalk
-    xwalk = pd.read_csv(working_dir+'WoF_CREC_data/full_crosswalk_soc10_socxx.csv')
-    
-    #crosswalk brookings to SOC code
-    bocc = bocc.merge(xwalk,left_on='occ_c',right_on='socxx_code')
-    
-    #return a list of the unique first and second stage transition occupatinos that did not lose money when transitioning
-    return(list(bocc['soc_code'].unique()))
+    #crosswalk brookings to SOC code and return a list of the unique transition
+    #occupations that did not lose money when transitioning
+    return(crosswalks['socxx_soc'].targets(bocc).tolist())
 
+@memo.cached('All Top Jobs.csv','map_stdonet_emsisoc2019.csv',job_zones,'CIP2020_SOC2018_Crosswalk.xlsx')
 def in_demand_cips():
     '''
     produces a list of CIP codes based on a list of in_demand occupations
@@ -114,14 +230,14 @@ def in_demand_cips():
     #generate list of SOC codes
     socs = in_demand_occupations()
     
-    #read in cip to soc crosswalk
-    soc_x_cip = pd.read_excel(working_dir+'CIP2020_SOC2018_Crosswalk.xlsx',sheet_name='SOC-CIP')
-    
-    #generate list of CIP codes and remove decimal place
-    cips = list((soc_x_cip['CIP2020Code'][soc_x_cip['SOC2018Code'].isin(socs)].drop_duplicates() * 10000).astype(int))
+    #generate list of CIP codes from the soc to cip crosswalk
+    cips = crosswalks['soc_cip'].targets(socs).tolist()
     
     return(cips)
 
+@memo.cached('WoF_CREC_data/full_transition_file_socxx.csv',
+             'WoF_CREC_data/full_crosswalk_soc10_socxx.csv',
+             'CIP2020_SOC2018_Crosswalk.xlsx')
 def brookings_opporunity_cips():
     '''
     produces a list of CIP codes based on a list of brookings occupations
@@ -134,14 +250,12 @@ def brookings_opporunity_cips():
     #generate list of SOC codes
     socs = brookings_occupations()
     
-    #read in cip to soc crosswalk
-    soc_x_cip = pd.read_excel(working_dir+'CIP2020_SOC2018_Crosswalk.xlsx',sheet_name='SOC-CIP')
-    
-    #generate list of CIP codes and remove decimal place
-    cips = list((soc_x_cip['CIP2020Code'][soc_x_cip['SOC2018Code'].isin(socs)].drop_duplicates() * 10000).astype(int))
+    #generate list of CIP codes from the soc to cip crosswalk
+    cips = crosswalks['soc_cip'].targets(socs).tolist()
     
     return(cips)
 
+@memo.cached('cwdc_socs.txt','oes_research_2020_allsectors.xlsx')
 def related_industries():
     '''
     generates list of 6 digit industry codes where front line workers
@@ -154,14 +268,13 @@ def related_industries():
 
     '''
     #read in cwdc front line occupations
-    cwdc_socs = pd.read_csv(working_dir+'cwdc_socs.txt',sep='|',header=None)
-    cwdc_socs = [i.split()[0] for i in cwdc_socs[0]]
+    cwdc_socs = front_line_socs()
 
-    #read in oes research staffing patterns
-    oes = pd.read_excel(working_dir+'oes_research_2020_allsectors.xlsx')
+    #read in colorado oes research staffing patterns
+    oes = tables.read_excel(working_dir+'oes_research_2020_allsectors.xlsx',
+                            columns=['OCC_CODE','I_GROUP','NAICS','A_MEDIAN'],filters=[('AREA','==',8)])
     
     #clean oes data
-    oes = oes[oes['AREA'] == 8]
     oes.replace('*',np.nan,inplace=True)
     oes.replace('**',np.nan,inplace=True)    
     oes.replace('~',np.nan,inplace=True)
@@ -174,7 +287,7 @@ def related_industries():
     oes = oes[oes['I_GROUP']!='sector']
     
     #flag retail / accomodation industries
-    oes['ret_accom'] = [str(i)[:2] in ['44','45','71','72'] for i in oes['NAICS']]
+    oes['ret_accom'] = cwdc_codes.NAICS.under(oes['NAICS'],['44','45','71','72'])
     
     #calculate median earnings for retail and accomodation industry workers
     ret_accom_earn = oes[oes['ret_accom']]['A_MEDIAN'].median()
@@ -187,149 +300,197 @@ def related_industries():
     
     return(rel_ind)
     
-def ipeds(year):
+def journal(name):
     '''
-    gather ipeds data through the urban API
+    open the checkpoint journal of a long running scrape
 
     Parameters
     ----------
-    year : int
-        most recent year of available data
+    name : str
+        name of the scrape and its parameters.
 
     Returns
     -------
-    data frame containing postsecondary and primary data on completers, programs, schools, and absenteeism
+    cwdc_store.Journal to use as a context manager, or a context yielding None
+    when journal_dir is not set
+
+    '''
+    if journal_dir is None:
+        return(contextlib.nullcontext())
+    return(cwdc_store.Journal(os.path.join(journal_dir,name+'.jsonl')))
+
+def urban_api(call, fields, workers=4, journal=None):
+    '''
+    collect every page of an urban institute api query
+
+    when the api reports a total count the remaining pages are requested by page
+    number over a pool of workers, otherwise the next cursor is followed with the
+    following page prefetched while the current one is parsed. records are
+    streamed straight into column buffers.
+
+    Parameters
+    ----------
+    call : str
+        api endpoint including query parameters.
+    fields : dict
+        maps output column names to keys of the api results.
+    workers : int, optional
+        maximum number of pages requested at once.
+    journal : cwdc_store.Journal, optional
+        checkpoint of completed pages. pages already journaled are not requested
+        again and each new page is journaled once parsed.
+
+    Returns
+    -------
+    dataframe with one column per entry in fields
 
     '''
     
-    #directory end point
-    call = "https://educationdata.urban.org/api/v1/college-university/ipeds/directory/{}/?fips=8".format(year)
-    
-    m = []
-    
-    a = True
+    columns = {c:[] for c in fields}
     
-    #loop through directory responses, recording the unit id and fips code for all postsecondary ed insts in colorado
-    while a:
-        response = requests.get(call)
-        directory = response.json()
+    def take(page):
+        for c in fields:
+            columns[c].extend(page['columns'][c])
     
-        for col in directory['results']:
-            m.append({'unitid' : col['unitid'], 'fips' : col['county_fips']})
-        call = directory['next']
+    def fetch(url):
+        if journal is not None and url in journal:
+            return(journal.get(url))
         
-        a = call is not None
-    
-    #format data into a metadata dataframe
-    meta = pd.DataFrame(m)
+        #keep only the cursor and the requested fields of each page
+        data = cwdc_http.get(url,source='urban').json()
+        page = {'count':data.get('count'),
+                'next':data.get('next'),
+                'columns':{c:[rec[k] for rec in data['results']] for c, k in fields.items()}}
+        
+        if journal is not None:
+            journal.record(url,page)
+        return(page)
     
-    #identify colleges in colorado
-    unitid = [str(i) for i in meta['unitid']]
+    page = fetch(call)
+    take(page)
     
-    #end point for 6 digit CIP code completer data
-    call = "https://educationdata.urban.org/api/v1/college-university/ipeds/completions-cip-6/{}/?sex=99&race=99&majornum=1&unitid={}".format(year,','.join(unitid))
+    nxt = page['next']
+    if nxt is None:
+        return(pd.DataFrame(columns))
     
-    h = []
+    size = len(next(iter(page['columns'].values()),[]))
+    count = page['count']
     
-    a = True
-    #loop through responses, record unitid, cip code, and awards
-    while a:
-        response = requests.get(call)
-        data = response.json()
+    url = urlparse(nxt)
+    query = parse_qsl(url.query,keep_blank_values=True)
     
-        for col in data['results']:
-            h.append({'unitid' : col['unitid'],'cipcode_6digit' : col['cipcode_6digit'], 'awards' : col['awards']})
-        call = data['next']
-        
-        a = call is not None
-    
-    #format into data frame
-    df = pd.DataFrame(h)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if count and size and 'page' in dict(query):
+            #total is known, fan the remaining pages out by page number
+            pages = range(2,int(math.ceil(count / size))+1)
+            
+            def page_url(n):
+                q = [(k,v) for k, v in query if k != 'page'] + [('page',str(n))]
+                return(urlunparse(url._replace(query=urlencode(q,safe=','))))
+            
+            for page in pool.map(fetch,[page_url(n) for n in pages]):
+                take(page)
+        else:
+            #follow cursors, requesting the next page while this one is parsed
+            pending = pool.submit(fetch,nxt)
+            while pending is not None:
+                page = pending.result()
+                pending = pool.submit(fetch,page['next']) if page['next'] else None
+                take(page)
+    
+    return(pd.DataFrame(columns))
+
+def ipeds(year, workers=4, crdc_year=2015):
+    '''
+    gather ipeds data through the urban API
+
+    Parameters
+    ----------
+    year : int
+        most recent year of available data
+    workers : int, optional
+        maximum number of api pages requested at once
+    crdc_year : int, optional
+        year of civil rights data collection absenteeism data
+
+    Returns
+    -------
+    data frame containing postsecondary and primary data on completers, programs, schools, and absenteeism
+
+    '''
     
-    #merge data with metadata on unit id and drop total completers
-    cwdc_ipeds = meta.merge(df,on='unitid')
-    cwdc_ipeds = cwdc_ipeds[cwdc_ipeds['cipcode_6digit']!=99]
+    #checkpoint of fetched pages so a failed run resumes where it stopped
+    with journal('ipeds_{}'.format(year)) as jn:
     
-    #create list of in_demand cip codes
-    op_cip = in_demand_cips()
+        #directory end point
+        call = "https://educationdata.urban.org/api/v1/college-university/ipeds/directory/{}/?fips=8".format(year)
     
-    #identify in_demand cips
-    cwdc_ipeds['op_cip'] = [i in op_cip for i in cwdc_ipeds['cipcode_6digit']]
+        #record the unit id and fips code for all postsecondary ed insts in colorado
+        meta = urban_api(call,{'unitid':'unitid','fips':'county_fips'},workers,jn)
     
-    #count programs and completers by fips code
-    op_prog = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['op_cip']].groupby('fips')['cipcode_6digit'].count()).rename(columns={'cipcode_6digit':'in_demand_programs'})
-    op_comp = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['op_cip']].groupby('fips')['awards'].sum()).rename(columns={'awards':'in_demand_awards'})
-
-    #join completers and program counts
-    in_demand = op_prog.join(op_comp,how='outer')
+        #identify colleges in colorado
+        unitid = [str(i) for i in meta['unitid']]
     
-    #repeat above steps with brookings occupations
-    b_op_cip = brookings_opporunity_cips()
+        #end point for 6 digit CIP code completer data
+        call = "https://educationdata.urban.org/api/v1/college-university/ipeds/completions-cip-6/{}/?sex=99&race=99&majornum=1&unitid={}".format(year,','.join(unitid))
     
-    cwdc_ipeds['b_op_cip'] = [i in b_op_cip for i in cwdc_ipeds['cipcode_6digit']]
+        #record unitid, cip code, and awards
+        df = urban_api(call,{'unitid':'unitid','cipcode_6digit':'cipcode_6digit','awards':'awards'},workers,jn)
     
-    b_op_prog = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['b_op_cip']].groupby('fips')['cipcode_6digit'].count()).rename(columns={'cipcode_6digit':'opporunity_programs'})
-    b_op_comp = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['b_op_cip']].groupby('fips')['awards'].sum()).rename(columns={'awards':'opportunity_awards'})
-
-    b_opportunity = b_op_prog.join(b_op_comp,how='outer')
+        #merge data with metadata on unit id and drop total completers
+        cwdc_ipeds = meta.merge(df,on='unitid')
+        cwdc_ipeds = cwdc_ipeds[cwdc_ipeds['cipcode_6digit']!=99]
     
-    #count number of institutions per county
-    colleges = pd.DataFrame(cwdc_ipeds[['fips','unitid']].drop_duplicates().groupby('fips')['unitid'].count()).rename(columns={'unitid':'postsec_inst_count'})
+        #create list of in_demand cip codes
+        op_cip = in_demand_cips()
     
-    #chronic absenteeism
+        #identify in_demand cips
+        cwdc_ipeds['op_cip'] = cwdc_codes.CIP.isin(cwdc_ipeds['cipcode_6digit'],op_cip)
     
-    #primary school endpoint
-    call = "https://educationdata.urban.org/api/v1/schools/ccd/directory/{}/?fips=8".format(year)
+        #count programs and completers by fips code
+        op_prog = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['op_cip']].groupby('fips')['cipcode_6digit'].count()).rename(columns={'cipcode_6digit':'in_demand_programs'})
+        op_comp = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['op_cip']].groupby('fips')['awards'].sum()).rename(columns={'awards':'in_demand_awards'})
+
+        #join completers and program counts
+        in_demand = op_prog.join(op_comp,how='outer')
     
-    m = []
+        #repeat above steps with brookings occupations
+        b_op_cip = brookings_opporunity_cips()
     
-    a = True
+        cwdc_ipeds['b_op_cip'] = cwdc_codes.CIP.isin(cwdc_ipeds['cipcode_6digit'],b_op_cip)
     
-    #loop through dictionary, record ncessch, fips, and enrollment
-    while a:
-        response = requests.get(call)
-        directory = response.json()
+        b_op_prog = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['b_op_cip']].groupby('fips')['cipcode_6digit'].count()).rename(columns={'cipcode_6digit':'opporunity_programs'})
+        b_op_comp = pd.DataFrame(cwdc_ipeds[cwdc_ipeds['b_op_cip']].groupby('fips')['awards'].sum()).rename(columns={'awards':'opportunity_awards'})
+
+        b_opportunity = b_op_prog.join(b_op_comp,how='outer')
     
-        for col in directory['results']:
-            m.append({'ncessch' : col['ncessch'], 'fips' : col['county_code'], 'enrollment' : col['enrollment']})
-        call = directory['next']
-        
-        a = call is not None
+        #count number of institutions per county
+        colleges = pd.DataFrame(cwdc_ipeds[['fips','unitid']].drop_duplicates().groupby('fips')['unitid'].count()).rename(columns={'unitid':'postsec_inst_count'})
     
-    #format into metadata dataframe
-    meta = pd.DataFrame(m)
+        #chronic absenteeism
     
-    #absenteeism endpoint    
-    call = "https://educationdata.urban.org/api/v1/schools/crdc/chronic-absenteeism/2015/race/sex/?sex=99&race=99&fips=8"
+        #primary school endpoint
+        call = "https://educationdata.urban.org/api/v1/schools/ccd/directory/{}/?fips=8".format(year)
     
-    h = []
+        #record ncessch, fips, and enrollment
+        meta = urban_api(call,{'ncessch':'ncessch','fips':'county_code','enrollment':'enrollment'},workers,jn)
     
-    a = True
+        #absenteeism endpoint    
+        call = "https://educationdata.urban.org/api/v1/schools/crdc/chronic-absenteeism/{}/race/sex/?sex=99&race=99&fips=8".format(crdc_year)
     
-    #loop through results, record ncessch, students chronically absent
-    while a:
-        response = requests.get(call)
-        data = response.json()
-        
-        for col in data['results']:
-            h.append({'ncessch' : col['ncessch'],'students_chronically_absent' : col['students_chronically_absent']})
-        call = directory['next']
-        
-        a = call is not None
-
-    #format into data frame
-    df = pd.DataFrame(h)
+        #record ncessch, students chronically absent
+        df = urban_api(call,{'ncessch':'ncessch','students_chronically_absent':'students_chronically_absent'},workers,jn)
     
-    #merge with metadata
-    absenteeism = meta.merge(df,on='ncessch').groupby('fips')['students_chronically_absent','enrollment'].sum().reset_index()
-    absenteeism['fips'] = absenteeism['fips'].astype(int)
-    absenteeism.set_index('fips',inplace=True)
+        #merge with metadata
+        absenteeism = meta.merge(df,on='ncessch').groupby('fips')[['students_chronically_absent','enrollment']].sum().reset_index()
+        absenteeism['fips'] = absenteeism['fips'].astype(int)
+        absenteeism.set_index('fips',inplace=True)
     
-    #calculate the rate of absentee students per student enrolled
-    absenteeism['absentee_rt'] = absenteeism['students_chronically_absent'] / absenteeism['enrollment']
+        #calculate the rate of absentee students per student enrolled
+        absenteeism['absentee_rt'] = absenteeism['students_chronically_absent'] / absenteeism['enrollment']
     
-    #join college count, absenteeism, in_demand cip code and brookings cip code data together
-    out = colleges.join([absenteeism,in_demand,b_opportunity],how='outer').fillna(0)
+        #join college count, absenteeism, in_demand cip code and brookings cip code data together
+        out = colleges.join([absenteeism,in_demand,b_opportunity],how='outer').fillna(0)
     
     return(out)
 
@@ -375,7 +536,7 @@ def acs(year):
     
     #endpoint of variable dictionary
     l = "{}/variables.json".format(endpoint)
-    r = requests.get(l)
+    r = cwdc_http.get(l,source='census')
     j = r.json()
     
     #get all column names of table of interest
@@ -396,7 +557,7 @@ def acs(year):
         #request current chunk of columns from API
         grps_fmt = ','.join(list(target.keys())[l:u])
         url = '{}?get={},NAME&for=county:*&in=state:08'.format(endpoint,grps_fmt)
-        request = requests.get(url)
+        request = cwdc_http.get(url,source='census')
         
         #transform response into dataframe and join to df
         data = request.json()
@@ -493,14 +654,19 @@ def acs(year):
     
     return(df)
 
-def assign_fips(cwdc_etpl):
+def assign_fips(cwdc_etpl, boundaries=None):
     '''
-    uses fcc geoprocessing api to assign fips codes based on lat and lon
+    assigns fips codes based on lat and lon. each distinct coordinate is located
+    once against a local county boundary file, and the fcc geoprocessing api is
+    only used for coordinates the boundary file cannot place
 
     Parameters
     ----------
     cwdc_etpl : dataframe
         dataframe containing etpl data without fips codes.
+    boundaries : str, optional
+        path to a county boundary file readable by cwdc_geo.read_boundaries.
+        defaults to the census cartographic boundary file in working_dir.
 
     Returns
     -------
@@ -508,30 +674,56 @@ def assign_fips(cwdc_etpl):
 
     '''
     
-    #api endpoint
+    if boundaries is None:
+        boundaries = working_dir+'cb_2019_us_county_500k.zip'
+    
+    #many programs share a campus, so locate each coordinate only once
+    coords = cwdc_etpl[['lat','lon']].drop_duplicates().reset_index(drop=True)
+    coords['fips'] = None
+    
+    if os.path.exists(boundaries):
+        coords['fips'] = cwdc_geo.county_locator(boundaries).locate(coords['lat'],coords['lon'])
+    
+    #api endpoint for anything the boundary file could not place
     url = 'https://geo.fcc.gov/api/census/area?lat={}&lon={}&format=json'
 
-    #iterate through dataframe to assign fips code for each record
-    h = []
-    for index, row in cwdc_etpl.iterrows():
-        r = requests.get(url.format(row['lat'],row['lon']))
+    for index, row in coords[coords['fips'].isna()].iterrows():
+        r = cwdc_http.get(url.format(row['lat'],row['lon']),source='fcc')
         j = r.json()
         
-        h.append({'nid':row['nid'],'fips':j['results'][0]['county_fips']})
-    
-    etpl_fips = pd.DataFrame(h)
+        coords.loc[index,'fips'] = j['results'][0]['county_fips']
     
     #merge new fips data with old etpl data
-    cwdc_etpl = cwdc_etpl.merge(etpl_fips,on='nid')
+    cwdc_etpl = cwdc_etpl.merge(coords,on=['lat','lon'])
 
     return(cwdc_etpl)
 
-def etpl():
+def etpl(workers=8, county_shapes='cb_2019_us_county_500k.zip', state='08', radius=25, plan=True, spread=10):
     '''
     scrape the dol etpl site to collect etpl data
     CWDC may wish to instead furnish this data themselves, rather than accessing it
     through DOL.
 
+    Parameters
+    ----------
+    workers : int, optional
+        maximum number of zip code searches run at once. requests to the dol
+        host are further limited by cwdc_http.rates
+    county_shapes : str, optional
+        county boundary file under working_dir programs are located in, see
+        assign_fips
+    state : str, optional
+        two digit state fips code to collect programs for
+    radius : int, optional
+        search radius in miles
+    plan : bool, optional
+        search radius + spread miles around a near minimal set of zip codes
+        within spread miles of every zip code in the state, then drop programs
+        further than radius from every zip code. the programs kept are those
+        found by searching radius miles around every zip code.
+    spread : float, optional
+        miles between a zip code and the planned search centre covering it
+
     Returns
     -------
     dataframe containing scraped etpl data
@@ -556,125 +748,204 @@ def etpl():
         }
     
     #look through js to find list of available zip codes
-    const = requests.get('https://www.trainingproviderresults.gov/data/constants.js')
+    const = cwdc_http.get('https://www.trainingproviderresults.gov/data/constants.js',source='dol')
     
     zips = [ast.literal_eval(row.strip().strip(',')) for row in const.text.split() if 'zipCode' in row]
     
-    #identify which zip codes are within colorado
-    r = requests.get('https://api.census.gov/data/2019/acs/acs5?get=NAME,B01001_001E&for=zip%20code%20tabulation%20area:*&in=state:08')
+    #identify which zip codes are within the state
+    r = cwdc_http.get('https://api.census.gov/data/2019/acs/acs5?get=NAME,B01001_001E&for=zip%20code%20tabulation%20area:*&in=state:{}'.format(state),source='census')
     co_z = pd.DataFrame(r.json()[1:],columns=r.json()[0])
     
-    zips = [i for i in zips if i['zipCode'] in list(co_z['zip code tabulation area'])]
+    co_z = set(co_z['zip code tabulation area'])
+    zips = [i for i in zips if i['zipCode'] in co_z]
+    
+    #overlapping circles in dense areas return the same programs, so only search
+    #enough zip codes to cover the state, widening each search by the spread
+    zip_lat = [float(i['latitude']) for i in zips]
+    zip_lon = [float(i['longitude']) for i in zips]
+    reach = radius
+    if plan:
+        centres = cwdc_geo.plan_search_centres(zip_lat,zip_lon,spread)
+        log.info('searching %d of %d zip codes',len(centres),len(zips))
+        zips = [zips[i] for i in centres]
+        reach = radius + spread
     
     #dol search api used by site to serve data
-    url = 'https://cxsearch.dol.gov/etp/etp_scorecard_programs/_msearch?source=%7B%7D%0A%7B%22from%22:{},%22size%22:{},%22query%22:%7B%22bool%22:%7B%22must%22:%5B%7B%22bool%22:%7B%22must%22:%5B%7B%22bool%22:%7B%22should%22:%5B%7B%22wildcard%22:%7B%22field_search_api_aggregation_1%22:%22**%22%7D%7D%5D%7D%7D,%7B%22geo_distance%22:%7B%22distance%22:%2225mi%22,%22location%22:%7B%22lat%22:{},%22lon%22:{}%7D%7D%7D,%7B%22terms%22:%7B%22field_program_format%22:%5B%22This+program+provides+online+instruction,+e-learning,+or+distance+learning+only.%22,%22This+program+provides+in-person+instruction+only.%22,%22This+is+a+hybrid+or+blended+program+providing+both+in-person+and+online+instruction.%22%5D%7D%7D%5D%7D%7D%5D%7D%7D,%22sort%22:%7B%22_geo_distance%22:%7B%22location%22:%7B%22lat%22:{},%22lon%22:{}%7D,%22order%22:%22asc%22,%22unit%22:%22mi%22%7D%7D%7D%0A&source_content_type=application%2Fjson'
+    url = 'https://cxsearch.dol.gov/etp/etp_scorecard_programs/_msearch?source=%7B%7D%0A%7B%22from%22:{},%22size%22:{},%22query%22:%7B%22bool%22:%7B%22must%22:%5B%7B%22bool%22:%7B%22must%22:%5B%7B%22bool%22:%7B%22should%22:%5B%7B%22wildcard%22:%7B%22field_search_api_aggregation_1%22:%22**%22%7D%7D%5D%7D%7D,%7B%22geo_distance%22:%7B%22distance%22:%22{}mi%22,%22location%22:%7B%22lat%22:{},%22lon%22:{}%7D%7D%7D,%7B%22terms%22:%7B%22field_program_format%22:%5B%22This+program+provides+online+instruction,+e-learning,+or+distance+learning+only.%22,%22This+program+provides+in-person+instruction+only.%22,%22This+is+a+hybrid+or+blended+program+providing+both+in-person+and+online+instruction.%22%5D%7D%7D%5D%7D%7D%5D%7D%7D,%22sort%22:%7B%22_geo_distance%22:%7B%22location%22:%7B%22lat%22:{},%22lon%22:{}%7D,%22order%22:%22asc%22,%22unit%22:%22mi%22%7D%7D%7D%0A&source_content_type=application%2Fjson'
     
-    data = []
+    def page(low, size, z):
+        r = cwdc_http.get(url.format(low,size,reach,z['latitude'],z['longitude'],z['latitude'],z['longitude']),source='dol',headers=headers)
+        return(r.json()['responses'][0]['hits'])
     
-    #loop through zips using the search api to collect data
-    for z in zips:
-        low = 0
-        inc = 1
-        
-        r = requests.get(url.format(low,inc,z['latitude'],z['longitude'],z['latitude'],z['longitude']),headers=headers)
-        j = r.json()
+    def search(z):
+        #the first page reports the total, later pages are only needed past 10000 hits
+        j = page(0,10000,z)
         
-        cap = j['responses'][0]['hits']['total']
+        cap = j['total']
+        hits = j['hits']
         
-        inc = 10000
+        for low in range(10000,cap,10000):
+            hits += page(low,min(10000,cap-low),z)['hits']
         
-        while low <= cap:
-            inc = min(inc,cap-low)
+        return(z,cap,hits)
+    
+    programs = {}
+    
+    #replay zip codes finished by an earlier, interrupted run
+    with journal('etpl_{}_{}'.format(state,reach)) as jn:
+        if jn is not None:
+            for key, payload in jn.records():
+                programs.update((p['nid'],p) for p in payload)
+            zips = [z for z in zips if z['zipCode'] not in jn]
+    
+        #search zips concurrently, keeping the first copy of each program as results arrive
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for f in as_completed([pool.submit(search,z) for z in zips]):
+                z, cap, hits = f.result()
             
-            r = requests.get(url.format(low,inc,z['latitude'],z['longitude'],z['latitude'],z['longitude']),headers=headers)
-            j = r.json()
-        
-            for hit in j['responses'][0]['hits']['hits']:
-                data.append(hit['_source'])
-        
-            low += 10000
-        
-        print('{} finished, {} programs'.format(z['zipCode'], cap))
+                new = []
+                for hit in hits:
+                    src = hit['_source']
+                    if src['nid'] not in programs:
+                        programs[src['nid']] = src
+                        new.append(src)
+            
+                #journal only programs not already seen so each is stored once
+                if jn is not None:
+                    jn.record(z['zipCode'],new)
+            
+                log.info('%s finished, %d programs',z['zipCode'],cap)
         
-    df = pd.DataFrame(data)
+        df = pd.DataFrame(list(programs.values()))
+    
+        #split lat and lon
+        df['lat'] = [i['lat'] for i in df['location']]
+        df['lon'] = [i['lon'] for i in df['location']]
+        df.drop('location',axis=1,inplace=True)
     
-    #split lat and lon
-    df['lat'] = [i['lat'] for i in df['location']]
-    df['lon'] = [i['lon'] for i in df['location']]
-    df.drop('location',axis=1,inplace=True)
-    df.drop_duplicates(inplace=True)
+        #keep programs a search around some zip code would have returned
+        if plan:
+            df = df[cwdc_geo.within(df['lat'],df['lon'],zip_lat,zip_lon,radius)]
     
-    #assign fips codes
-    df = assign_fips(df)
+        #assign fips codes
+        df = assign_fips(df,working_dir+county_shapes)
     
-    #clean completer data
-    df['field_c_total_completed'].replace(-1,0,inplace=True)
+        #clean completer data
+        df['field_c_total_completed'] = df['field_c_total_completed'].replace(-1,0)
     
-    #create list of in_demand occupations
-    socs = in_demand_occupations()    
+        #create list of in_demand occupations
+        socs = in_demand_occupations()    
     
-    #count etp by fips code
-    prov = pd.DataFrame(df[['fips','field_etp']].drop_duplicates().groupby('fips')['field_etp'].count()).rename(columns={'field_etp':'etp_count'})
+        #count etp by fips code
+        prov = pd.DataFrame(df[['fips','field_etp']].drop_duplicates().groupby('fips')['field_etp'].count()).rename(columns={'field_etp':'etp_count'})
     
-    #count program and completers by fips code for in_demand related programs
-    op_prog = pd.DataFrame(df[df['field_program_soc_occ_1'].str[:-2].isin(socs)].groupby('fips')['nid'].count()).rename(columns={'nid':'etp_in_demand_progs'})
-    op_comp = pd.DataFrame(df[df['field_program_soc_occ_1'].str[:-2].isin(socs)].groupby('fips')['field_c_total_completed'].sum()).rename(columns={'field_c_total_completed':'etp_in_demand_completers'})
+        #occupation code of each program
+        soc = df['field_program_soc_occ_1'].str[:-2]
+        op = cwdc_codes.SOC.isin(soc,socs)
     
-    #repeat for brookings occupations
-    b_socs = brookings_occupations()    
+        #count program and completers by fips code for in_demand related programs
+        op_prog = pd.DataFrame(df[op].groupby('fips')['nid'].count()).rename(columns={'nid':'etp_in_demand_progs'})
+        op_comp = pd.DataFrame(df[op].groupby('fips')['field_c_total_completed'].sum()).rename(columns={'field_c_total_completed':'etp_in_demand_completers'})
+    
+        #repeat for brookings occupations
+        b_socs = brookings_occupations()    
+        b_op = cwdc_codes.SOC.isin(soc,b_socs)
         
-    b_op_prog = pd.DataFrame(df[df['field_program_soc_occ_1'].str[:-2].isin(b_socs)].groupby('fips')['nid'].count()).rename(columns={'nid':'etp_opportunity_progs'})
-    b_op_comp = pd.DataFrame(df[df['field_program_soc_occ_1'].str[:-2].isin(b_socs)].groupby('fips')['field_c_total_completed'].sum()).rename(columns={'field_c_total_completed':'etp_opportunity_completers'})
+        b_op_prog = pd.DataFrame(df[b_op].groupby('fips')['nid'].count()).rename(columns={'nid':'etp_opportunity_progs'})
+        b_op_comp = pd.DataFrame(df[b_op].groupby('fips')['field_c_total_completed'].sum()).rename(columns={'field_c_total_completed':'etp_opportunity_completers'})
     
-    #join crosstabs together
-    out = prov.join([op_prog,op_comp,b_op_prog,b_op_comp]).reset_index().fillna(0)
+        #join crosstabs together
+        out = prov.join([op_prog,op_comp,b_op_prog,b_op_comp]).reset_index().fillna(0)
     
-    #drop counties outside the state
-    out = out[out['fips'].str.startswith('08')]
+        #drop counties outside the state
+        out = out[out['fips'].str.startswith(state)]
     
-    out['fips'] = out['fips'].astype(int)
-    out.set_index('fips',inplace=True)
+        out['fips'] = out['fips'].astype(int)
+        out.set_index('fips',inplace=True)
         
     return(out)
 
-def cc_data():
+#pirl fields used by cc_data and the dtypes they are read with
+PIRL_COLUMNS = {
+    'uid':'Int64',
+    'state_code':'category',
+    'county_code':'Int16',
+    'credential_1_type':'Int8',
+    'trained':'Int8',
+    'etp_comp_1':'Int8'
+    }
+
+def read_pirl(path, dictionary, columns=PIRL_COLUMNS, chunksize=10**6):
+    '''
+    stream selected fields of a headerless pirl extract
+
+    fields are found by position from the data dictionary, whose rows name the
+    extract's columns after the leading row number, so only those columns are
+    parsed.
+
+    Parameters
+    ----------
+    path : str
+        path to the pirl csv.
+    dictionary : dataframe
+        data dictionary with a crec_name column, in column order.
+    columns : dict, optional
+        field name to dtype.
+    chunksize : int, optional
+        rows read at a time.
+
+    Returns
+    -------
+    iterator of dataframes with the named columns
+
+    '''
+    names = list(dictionary['crec_name'])
+    pos = {names.index(c) + 1:c for c in columns}
+    for chunk in pd.read_csv(path,header=None,usecols=list(pos),dtype={i:columns[c] for i, c in pos.items()},
+                             chunksize=chunksize):
+        yield(chunk.rename(columns=pos)[list(columns)])
+
+def cc_data(years=(19,), chunksize=10**6):
     '''
     extract wioa completer data from connecting colorado
 
+    Parameters
+    ----------
+    years : tuple, optional
+        two digit program years, read from pirl_py{year}.csv. participants are
+        pooled across years.
+    chunksize : int, optional
+        pirl rows read at a time.
+
     Returns
     -------
     dataframe containing completer and credential data
 
     '''
     
-    #read in data for desired program year
-    py19 = pd.read_csv(working_dir+'pirl_py19.csv',header=None)
-    
-    #placeholder column to correct for data dictionary discrepency
-    py19['record_year'] = 19
-    data = py19.drop(0,axis=1)
-    
     #read in metadata for column names
-    meta = pd.read_excel(working_dir+'Master Data Dictionary.xlsx',sheet_name='Sheet2').reset_index()
-    meta['index']+=1
-    
-    #assign column names
-    data.columns = list(meta['crec_name'])
-    
-    #restrict to just colordo residents
-    data = data[data['state_code'] == 'CO']
-    
-    data = data[['uid','county_code','credential_1_type','trained','etp_comp_1']]
-    data['fips'] = 8000 + data['county_code']
+    meta = tables.read_excel(working_dir+'Master Data Dictionary.xlsx',sheet_name='Sheet2')
+    
+    #stream each program year, keeping distinct trained colorado clients by credential and completion
+    cred = []
+    train_comp = []
+    for year in years:
+        for data in read_pirl(working_dir+'pirl_py{}.csv'.format(year),meta,chunksize=chunksize):
+            #restrict to just colordo residents who received training
+            data = data[(data['state_code'] == 'CO') & (data['trained'] == 1)]
+            data = data.assign(fips=8000 + data['county_code'])
+            
+            cred.append(data[['uid','fips','credential_1_type']].dropna().drop_duplicates().astype('int64'))
+            train_comp.append(data[['uid','fips','etp_comp_1']].dropna().drop_duplicates().astype('int64'))
     
     #calculate the percentage of clients with an occupational cert/licence/credential
-    cred = pd.DataFrame(data[data['trained']==1][['uid','fips','credential_1_type']].drop_duplicates().groupby(['fips','credential_1_type'])['uid'].count()).reset_index()
+    cred = pd.concat(cred).drop_duplicates().groupby(['fips','credential_1_type'])['uid'].count().reset_index()
     cred = cred.pivot(index='fips',columns='credential_1_type',values='uid').fillna(0)
     cred['t'] = cred[[i for i in cred if i in range(4,7)]].sum(axis=1)
     cred['credentialed'] = cred['t'] / cred.sum(axis=1)
     
     #calculate the percentage of clients who successfully complete training
-    train_comp = pd.DataFrame(data[['uid','fips','etp_comp_1']][data['trained']==1].drop_duplicates().groupby(['fips','etp_comp_1'])['uid'].count()).reset_index()
+    train_comp = pd.concat(train_comp).drop_duplicates().groupby(['fips','etp_comp_1'])['uid'].count().reset_index()
     train_comp = train_comp.pivot(index='fips',columns='etp_comp_1',values='uid').fillna(0)
     train_comp['train_comp'] = train_comp[1] / train_comp.sum(axis=1)
 
@@ -683,9 +954,102 @@ def cc_data():
 
     return(out)
 
-def get_qcew():
+#qcew columns used by the index and the dtypes they are read with
+QCEW_COLUMNS = {
+    'area_fips':'category',
+    'industry_code':'category',
+    'annual_avg_estabs_count':'float64',
+    'annual_avg_emplvl':'float64',
+    'avg_annual_pay':'float64',
+    'oty_annual_avg_estabs_count_chg':'float64'
+    }
+
+def _qcew_sources(path):
+    #yields (name, opener) of every csv under a by area directory, a zip of either layout or a
+    #single file. a zip is opened once and closed when the generator finishes or is closed
+    if os.path.isdir(path):
+        for f in sorted(os.listdir(path)):
+            if f.endswith('.csv'):
+                yield(f,lambda f=f: open(os.path.join(path,f),'rb'))
+    elif path.endswith('.zip'):
+        with zipfile.ZipFile(path) as z:
+            for n in sorted(n for n in z.namelist() if n.endswith('.csv')):
+                yield(os.path.basename(n),lambda n=n: z.open(n))
+    else:
+        yield(os.path.basename(path),lambda: open(path,'rb'))
+
+def _county_area(fips, states):
+    #county areas of the given states, leaving out statewide totals, msas and the national total
+    fips = pd.Series(np.asarray(fips,dtype=str)).str
+    return((fips[:2].isin(states) & (fips.len() == 5) & ~fips.endswith('000') & fips.isdigit()).to_numpy())
+
+def _category_mask(col, vmask):
+    #expand a mask over a categorical column's categories to its rows
+    codes = col.cat.codes.to_numpy()
+    out = np.zeros(len(codes),dtype=bool)
+    ok = codes >= 0
+    out[ok] = np.asarray(vmask,dtype=bool)[codes[ok]]
+    return(out)
+
+def read_qcew(path, states=('08',), industries=None, chunksize=10**6):
+    '''
+    county rows of qcew annual averages, streamed from the by area files or the
+    national singlefile
+
+    only the columns in QCEW_COLUMNS are read. by area files of other areas are
+    skipped by name, and every chunk read is filtered to the requested states'
+    counties and industries before the rows kept are concatenated once.
+
+    Parameters
+    ----------
+    path : str
+        directory of by area csv files, a zip of by area files or of the
+        singlefile, or the singlefile csv.
+    states : tuple, optional
+        state fips codes to keep.
+    industries : list, optional
+        naics codes to keep, compared in canonical form, every industry when None.
+    chunksize : int, optional
+        rows read at a time.
+
+    Returns
+    -------
+    dataframe of QCEW_COLUMNS with integer fips in place of area_fips
+
+    '''
+    states = ['{:02d}'.format(int(x)) for x in states]
+    out = []
+    with contextlib.closing(_qcew_sources(path)) as sources:
+        for name, opener in sources:
+            #by area files are named for their area, e.g. 2019.annual 08001 Adams County, Colorado.csv
+            area = re.match(r'\d{4}\.annual (\w{5}) ',name)
+            if area and not _county_area([area.group(1)],states)[0]:
+                continue
+
+            with opener() as f:
+                for chunk in pd.read_csv(f,usecols=list(QCEW_COLUMNS),dtype=QCEW_COLUMNS,chunksize=chunksize):
+                    keep = _category_mask(chunk['area_fips'],_county_area(chunk['area_fips'].cat.categories,states))
+                    if industries is not None:
+                        keep &= _category_mask(chunk['industry_code'],cwdc_codes.NAICS.isin(chunk['industry_code'].cat.categories,industries))
+                    if keep.any():
+                        chunk = chunk[keep]
+                        out.append(chunk.assign(area_fips=chunk['area_fips'].astype(str).astype(int),
+                                                industry_code=chunk['industry_code'].astype(str)))
+
+    if not out:
+        return(pd.DataFrame(columns=list(QCEW_COLUMNS)).rename(columns={'area_fips':'fips'}))
+    return(pd.concat(out,ignore_index=True).rename(columns={'area_fips':'fips'}))
+
+def get_qcew(path='2019.annual.by_area/', states=('08',)):
     '''
-    parse qcew annual by area file to colate industry data at the county level
+    colate qcew annual industry data at the county level
+
+    Parameters
+    ----------
+    path : str, optional
+        by area directory or singlefile under working_dir, see read_qcew.
+    states : tuple, optional
+        state fips codes of the counties scored.
 
     Returns
     -------
@@ -696,35 +1060,10 @@ def get_qcew():
     #get related industries
     rel_ind = related_industries()
     
-    #the qcew data is broken out into individual files for each state and each county
-    #loop through the directory to pull only those files containing state and national data
-    
-    #create an output dataframe to append data to
-    qcew = pd.DataFrame()
-    
-    #directory containing qcew files
-    filepath = working_dir+'2019.annual.by_area/'
-    
-    #loop through the directory
-    for filename in os.listdir(filepath):
-        if 'Colorado' in filename:
-            #if the file is a state or national file, skip it
-            if not any(x in filename for x in ['-- Statewide','U.S. TOTAL']):
-                #read file to temporary dataframe
-                temp = pd.read_csv(filepath+filename)
-                temp = temp[temp['industry_code'].isin(rel_ind + ['44-45','71','72'])]
-                #rename columns to match database names
-                temp.rename(columns={'area_fips':'fips'},inplace=True)
-                
-                #append to output dataframe
-                qcew = qcew.append(temp[['fips','industry_code','annual_avg_estabs_count','annual_avg_emplvl','avg_annual_pay',
-                                         'oty_annual_avg_estabs_count_chg']])
-
-    #format and transform
-    qcew = qcew[[str(qcew.loc[i,'fips']).startswith('8') for i in qcew.index]]
-    qcew['fips'] = qcew['fips'].astype(int)
+    #read county rows of related, retail and accomodation industries
+    qcew = read_qcew(working_dir+path,states,rel_ind + ['44-45','71','72'])
 
-    qcew['group'] = ['ret_accom' if i in ['44-45','71','72'] else 'rel_ind' for i in qcew['industry_code']]
+    qcew['group'] = np.where(cwdc_codes.NAICS.isin(qcew['industry_code'],['44-45','71','72']),'ret_accom','rel_ind')
 
     #calculate retail and accomodation figures
     qcew_ret_accom = qcew[qcew['group']=='ret_accom'].groupby('fips').agg({
@@ -762,44 +1101,84 @@ def get_qcew():
     
     return(qcew)
 
-def crime_data():
+def crime_data(extracts=(('CO-2019/CO/','Colorado',2019),)):
     '''
     FBI crime data tabulated at the county area
 
+    Parameters
+    ----------
+    extracts : tuple, optional
+        (directory under working_dir, state name, year) of every NIBRS state
+        year extract. counties covered by several years are given their
+        average annual incidents.
+
     Returns
     -------
     dataframe containing tabulated crime data
 
     '''
     
-    #read in incident and agency data
-    inc = pd.read_csv(working_dir+'CO-2019/CO/NIBRS_incident.csv')
-    agencies = pd.read_csv(working_dir+'CO-2019/CO/agencies.csv')
-    
-    #iterate over agencies dataframe, collect agency id, name, and county
-    agc = []
-    for index, row in agencies.iterrows():
-        if str(row['COUNTY_NAME']) == 'nan':
-            continue
-        
-        cos = row['COUNTY_NAME'].split('; ')
-        for co in cos:
-            agc.append({'AGENCY_ID':row['AGENCY_ID'],'NAME':'{} County, Colorado'.format(co.lower().title())})
-
-    agc = pd.DataFrame(agc)
-    
-    #calculate crime incident multiplier for agencies that stretch across multiple counties
-    agc['crime_incidents'] = 1 / agc['NAME'].groupby(agc['AGENCY_ID']).transform('count')
-
-    #merge with incident record
-    inc = inc.merge(agc,on='AGENCY_ID')
+    #stream incident counts of every extract
+    inc = cwdc_nibrs.county_incidents([(working_dir+path,state,year) for path, state, year in extracts])
     
-    #aggregate to county level
+    #aggregate to county level, averaging over the years of each state
+    years = inc.groupby('state')['year'].transform('nunique')
+    inc['crime_incidents'] /= years
     crime = pd.DataFrame(inc.groupby('NAME')['crime_incidents'].sum()).reset_index()
 
     return(crime)
 
-def get_emsi_ind(filepath):
+def read_emsi_ind(path):
+    '''
+    read one emsi industry workbook
+
+    the workbook is opened once in read only mode for both its Industries and
+    Parameters sheets. the oldest, second most recent and most recent years
+    are found from the "YYYY Jobs" headers.
+
+    Parameters
+    ----------
+    path : str
+        path to the workbook.
+
+    Returns
+    -------
+    dataframe of NAICS, Description, fips, div_emp_per, ind_per_chng_1 and
+    ind_per_chng_5
+
+    '''
+    wb = openpyxl.load_workbook(path,read_only=True,data_only=True)
+    try:
+        rows = wb['Industries'].iter_rows(values_only=True)
+        temp = pd.DataFrame(rows,columns=next(rows))
+        
+        #identify county, the seventh row of the parameters sheet
+        params = list(wb['Parameters'].iter_rows(min_row=7,max_row=7,max_col=1,values_only=True))
+    finally:
+        wb.close()
+    fips = int(params[0][0])
+
+    #identify most recent year, oldest year, and second most recent year
+    years = {int(str(c)[:4]):c for c in temp.columns if re.fullmatch(r'\d{4} Jobs',str(c))}
+    years = [years[y] for y in sorted(years)]
+    low, mid, high = years[0], years[-2], years[-1]
+    
+    #clean data
+    temp.replace('Insf. Data',np.nan,inplace=True)
+    temp.replace('<10',0,inplace=True)
+    temp.fillna(0,inplace=True)
+    temp.rename(columns={'Total Diversity % of Industry':'div_emp_per'},inplace=True)
+    temp['fips'] = fips
+    for c in (low,mid,high):
+        temp[c] = pd.to_numeric(temp[c]).astype(float)
+    
+    #calculate percent change values
+    temp['ind_per_chng_1'] = (temp[high]-temp[mid]) / temp[mid]
+    temp['ind_per_chng_5'] = (temp[high]-temp[low]) / temp[low]
+
+    return(temp[['NAICS','Description','fips','div_emp_per','ind_per_chng_1','ind_per_chng_5']])
+
+def get_emsi_ind(filepath, workers=None):
     '''
     process emsi industry data
 
@@ -807,6 +1186,8 @@ def get_emsi_ind(filepath):
     ----------
     filepath : str
         path to folder containing emsi industry data
+    workers : int, optional
+        processes parsing workbooks at once, os.cpu_count() when None.
 
     Returns
     -------
@@ -814,40 +1195,14 @@ def get_emsi_ind(filepath):
 
     '''
     
-    #emty dataframe to receive emsi data
-    data = pd.DataFrame()
-    
-    #columns to rename
-    cols = {
-        'Total Diversity % of Industry':'div_emp_per',
-        }
-    
-    #loop through files in target folder
-    for filename in os.listdir(filepath):
-        #read in data
-        temp = pd.read_excel(filepath+filename,sheet_name='Industries')
-        
-        #identify most recent year, oldest year, and second most recent year
-        low = list(temp.columns)[2]
-        mid = list(temp.columns)[-3]
-        high = list(temp.columns)[-2]
-        
-        #identify county
-        fips = pd.read_excel(filepath+filename,sheet_name='Parameters').iloc[5,0]
-        
-        #clean data
-        temp.replace('Insf. Data',np.nan,inplace=True)
-        temp.replace('<10',0,inplace=True)
-        temp.fillna(0,inplace=True)
-        temp.rename(columns=cols,inplace=True)
-        temp['fips'] = int(fips)
-        
-        #calculate percent change values
-        temp['ind_per_chng_1'] = (temp[high]-temp[mid]) / temp[mid]
-        temp['ind_per_chng_5'] = (temp[high]-temp[low]) / temp[low]
-        
-        #append to holder dataframe
-        data = data.append(temp[['NAICS','Description','fips','div_emp_per','ind_per_chng_1','ind_per_chng_5']])
+    #parse every county workbook in the target folder
+    files = [filepath+f for f in sorted(os.listdir(filepath)) if f.endswith('.xlsx') and not f.startswith('~$')]
+    if workers == 1 or len(files) < 2:
+        data = [read_emsi_ind(f) for f in files]
+    else:
+        with ProcessPoolExecutor(min(workers or os.cpu_count(),len(files))) as pool:
+            data = list(pool.map(read_emsi_ind,files))
+    data = pd.concat(data,ignore_index=True)
         
     #clean inf and -inf
     data.replace([np.inf,-np.inf], np.nan, inplace=True)
@@ -858,12 +1213,10 @@ def get_emsi_ind(filepath):
     ret_accom_ind = ['44','45','71','72']
         
     #identify industry type
-    data['ret_accom_ind'] = [any(str(i).startswith(x) for x in ret_accom_ind) for i in data['NAICS']]
-    data['rel_ind'] = [str(i).split('.')[0] in rel_ind for i in data['NAICS']]
+    data['ret_accom_ind'] = cwdc_codes.NAICS.under(data['NAICS'],ret_accom_ind)
+    data['rel_ind'] = cwdc_codes.NAICS.isin(data['NAICS'],rel_ind)
     
-    data['ind_type'] = np.nan
-    data.loc[data['ret_accom_ind'], 'ind_type'] = 'ret_accom_ind'
-    data.loc[data['rel_ind'], 'ind_type'] = 'rel_ind'
+    data['ind_type'] = np.where(data['rel_ind'],'rel_ind',np.where(data['ret_accom_ind'],'ret_accom_ind',None))
     
     #aggregate to fips and industry level
     emsi_ind = data.groupby(['fips','ind_type']).agg({
@@ -885,7 +1238,57 @@ def get_emsi_ind(filepath):
     
     return(emsi_ind)
 
-def get_emsi_soc(filepath):
+#state fips codes and their postal abbreviations and names
+STATES = {
+    1:('AL','Alabama'),2:('AK','Alaska'),4:('AZ','Arizona'),5:('AR','Arkansas'),6:('CA','California'),
+    8:('CO','Colorado'),9:('CT','Connecticut'),10:('DE','Delaware'),11:('DC','District of Columbia'),
+    12:('FL','Florida'),13:('GA','Georgia'),15:('HI','Hawaii'),16:('ID','Idaho'),17:('IL','Illinois'),
+    18:('IN','Indiana'),19:('IA','Iowa'),20:('KS','Kansas'),21:('KY','Kentucky'),22:('LA','Louisiana'),
+    23:('ME','Maine'),24:('MD','Maryland'),25:('MA','Massachusetts'),26:('MI','Michigan'),
+    27:('MN','Minnesota'),28:('MS','Mississippi'),29:('MO','Missouri'),30:('MT','Montana'),
+    31:('NE','Nebraska'),32:('NV','Nevada'),33:('NH','New Hampshire'),34:('NJ','New Jersey'),
+    35:('NM','New Mexico'),36:('NY','New York'),37:('NC','North Carolina'),38:('ND','North Dakota'),
+    39:('OH','Ohio'),40:('OK','Oklahoma'),41:('OR','Oregon'),42:('PA','Pennsylvania'),
+    44:('RI','Rhode Island'),45:('SC','South Carolina'),46:('SD','South Dakota'),47:('TN','Tennessee'),
+    48:('TX','Texas'),49:('UT','Utah'),50:('VT','Vermont'),51:('VA','Virginia'),53:('WA','Washington'),
+    54:('WV','West Virginia'),55:('WI','Wisconsin'),56:('WY','Wyoming'),72:('PR','Puerto Rico')
+    }
+
+#emsi occupation columns used by the index and the names they are given
+EMSI_SOC_COLUMNS = {
+    'Avg. Annual Openings':'occ_openings', 
+    'Pct. 25 Annual Earnings':'occ_per_25_earn',
+    'Total Diversity % of Occupation':'occ_div_emp_per',
+    'COL Index':'coli',
+    'Automation Index':'auto'
+    }
+
+def read_emsi_soc(path):
+    '''
+    read one emsi occupation csv
+
+    only SOC, the columns in EMSI_SOC_COLUMNS and the most recent resident
+    workers column are read, suppressed values become nan.
+
+    Parameters
+    ----------
+    path : str
+        path to the csv.
+
+    Returns
+    -------
+    dataframe of SOC, res_work and the renamed EMSI_SOC_COLUMNS
+
+    '''
+    header = pd.read_csv(path,nrows=0).columns
+    res_work = max(c for c in header if re.fullmatch(r'\d{4} Resident Workers',c))
+    
+    cols = dict(EMSI_SOC_COLUMNS,**{res_work:'res_work'})
+    temp = pd.read_csv(path,usecols=['SOC'] + list(cols),na_values=['Insf. Data'],
+                       dtype=dict({'SOC':str},**{c:'float64' for c in cols}))
+    return(temp.rename(columns=cols))
+
+def get_emsi_soc(filepath, workers=8):
     '''
     process emsi occupation data
 
@@ -893,6 +1296,8 @@ def get_emsi_soc(filepath):
     ----------
     filepath : str
         path to folder containing emsi occupation data
+    workers : int, optional
+        files read at once.
 
     Returns
     -------
@@ -900,88 +1305,73 @@ def get_emsi_soc(filepath):
 
     '''
     
-    #emty dataframe to receive emsi data
-    data = pd.DataFrame()
-    
-    #columns to rename
-    cols = {
-        'Avg. Annual Openings':'occ_openings', 
-        'Pct. 25 Annual Earnings':'occ_per_25_earn',
-        'Total Diversity % of Occupation':'occ_div_emp_per',
-        'COL Index':'coli',
-        'Automation Index':'auto',
-        '2020 Resident Workers':'res_work'
-        }
-    
-    #loop through the files in the folder
-    for filename in os.listdir(filepath):
-        #read in the data and add county name based on file name
-        temp = pd.read_csv(filepath+filename)
-        temp['NAME'] = filename.split('_in_')[1].split('_CO_')[0].replace('_',' ') + ', Colorado'
-        
-        #clean data
-        temp.replace('Insf. Data',np.nan,inplace=True)
-        temp.rename(columns=cols,inplace=True)
-        
-        #append to dataframe
-        data = data.append(temp)
-
-    #read in front line occupations list
-    cwdc_socs = pd.read_csv(working_dir+'cwdc_socs.txt',sep='|',header=None)
-    cwdc_socs = [i.split()[0] for i in cwdc_socs[0]]
-    
-    #calculate automation index scores weighted by local employment levels
-    auto = data[data['SOC'].isin(cwdc_socs)]
-    auto['auto'] = (auto['auto'] * auto['res_work']) / auto['res_work'].groupby(auto['NAME']).transform('sum')
-
-    soc_11 = data[data['SOC'].str.startswith('11')]
-
-    #create in_demand and brookings occupations lists
+    #county name and fips of every file, e.g. Occupation_Table_in_Adams_County_CO_8001.csv,
+    #the state name coming from the fips and checked against the abbreviation
+    files = sorted(f for f in os.listdir(filepath) if f.endswith('.csv'))
+    counties = [re.fullmatch(r'.*_in_(.+)_([A-Z]{2})_(\d{4,5})\.csv',f) for f in files]
+    bad = [f for f, m in zip(files,counties) if m is None or STATES.get(int(m.group(3)) // 1000,('',))[0] != m.group(2)]
+    if bad:
+        raise ValueError('emsi occupation files not named ..._in_<county>_<state>_<fips>.csv: {}'.format(', '.join(bad)))
+    fips = pd.Index([int(m.group(3)) for m in counties])
+    if fips.has_duplicates:
+        raise ValueError('several emsi occupation files for fips {}'.format(', '.join(map(str,fips[fips.duplicated()].unique()))))
+    names = pd.Series([m.group(1).replace('_',' ') + ', ' + STATES[f // 1000][1] for m, f in zip(counties,fips)],index=fips)
+    
+    #read the files in the folder, keyed by the fips in their names
+    with ThreadPoolExecutor(workers) as pool:
+        data = list(pool.map(lambda f: read_emsi_soc(filepath+f),files))
+    key = np.repeat(fips.to_numpy(),[len(d) for d in data])
+    data = pd.concat(data,ignore_index=True).assign(key=key)
+
+    #flag front line, management, in demand and brookings occupations
+    cwdc_socs = front_line_socs()
     socs = in_demand_occupations()
     b_socs = brookings_occupations()
     
-    op_data = data[data['SOC'].isin(socs)]
-    b_data = data[data['SOC'].isin(b_socs)] 
-    
-    #calculate in_demand occupations statistics by county
-    emsi_soc = op_data.groupby('NAME').agg({
-        'occ_openings':'mean',
-        'occ_per_25_earn':'median',
-        'occ_div_emp_per':'mean', 
-        'coli':'mean'
-        }).reset_index()
-    
-    #calculate brookings occupations statistics by county
-    brookings_soc = b_data.groupby('NAME').agg({
+    front = data['SOC'].isin(cwdc_socs)
+    soc_11 = data['SOC'].str.startswith('11',na=False)
+    op = data['SOC'].isin(socs)
+    b = data['SOC'].isin(b_socs)
+    
+    #mask each group's values so every statistic comes from one grouped pass
+    stats = pd.DataFrame({
+        'key':data['key'],
+        'occ_openings':data['occ_openings'].where(op),
+        'occ_per_25_earn':data['occ_per_25_earn'].where(op),
+        'occ_div_emp_per':data['occ_div_emp_per'].where(op),
+        'coli':data['coli'].where(op),
+        'opportunity_occ_openings':data['occ_openings'].where(b),
+        'opportunity_occ_per_25_earn':data['occ_per_25_earn'].where(b),
+        'opportunity_occ_div_emp_per':data['occ_div_emp_per'].where(b),
+        'opportunity_coli':data['coli'].where(b),
+        'management_div_emp_per':data['occ_div_emp_per'].where(soc_11),
+        'auto':(data['auto'] * data['res_work']).where(front),
+        'res_work':data['res_work'].where(front),
+        'op':op,'b':b,'soc_11':soc_11,'front':front
+        })
+    emsi_soc = stats.groupby('key').agg({
         'occ_openings':'mean',
         'occ_per_25_earn':'median',
         'occ_div_emp_per':'mean', 
-        'coli':'mean'
-        }).reset_index().rename(columns={
-            'occ_openings':'opportunity_occ_openings',
-            'occ_per_25_earn':'opportunity_occ_per_25_earn',
-            'occ_div_emp_per':'opportunity_occ_div_emp_per', 
-            'coli':'opportunity_coli'
-            })
-    
-    #calculate employment diversity of management occupations by county
-    emsi_soc_11 = soc_11.groupby('NAME').agg({
-        'occ_div_emp_per':'mean'
-        }).reset_index().rename(columns={
-        'occ_div_emp_per':'management_div_emp_per'
+        'coli':'mean',
+        'opportunity_occ_openings':'mean',
+        'opportunity_occ_per_25_earn':'median',
+        'opportunity_occ_div_emp_per':'mean', 
+        'opportunity_coli':'mean',
+        'management_div_emp_per':'mean',
+        'auto':'sum',
+        'res_work':'sum',
+        'op':'any','b':'any','soc_11':'any','front':'any'
         })
-            
-    #calculate automation index by county
-    emsi_auto = auto.groupby('NAME').agg({
-        'auto':'sum'
-        }).reset_index()
     
-    #merge data together
-    emsi_soc = emsi_soc.merge(brookings_soc,on='NAME')
-    emsi_soc = emsi_soc.merge(emsi_soc_11,on='NAME')
-    emsi_soc = emsi_soc.merge(emsi_auto,on='NAME')
+    #automation index scores weighted by local employment levels
+    emsi_soc['auto'] /= emsi_soc['res_work']
     
-    return(emsi_soc)
+    #keep counties with every group of occupations
+    emsi_soc = emsi_soc[emsi_soc[['op','b','soc_11','front']].all(axis=1)]
+    emsi_soc.insert(0,'NAME',names[emsi_soc.index].to_numpy())
+    
+    return(emsi_soc.drop(['res_work','op','b','soc_11','front'],axis=1).reset_index(drop=True))
 
     
 def get_census():
@@ -995,7 +1385,7 @@ def get_census():
     '''
     
     #read in and rename colums from census participatin rate file
-    census = pd.read_excel(working_dir+'CO Census Participation Rates 2010.xlsx').rename(
+    census = tables.read_excel(working_dir+'CO Census Participation Rates 2010.xlsx').rename(
         columns={'UniqueID':'fips','Participation Rate (2010)':'part_rate'}).set_index('fips')
     return(census[['part_rate']])
 
@@ -1010,7 +1400,7 @@ def get_regions():
     '''
     
     #soup the html of the oedit regions page
-    r = requests.get('https://choosecolorado.com/doing-business/regions/')
+    r = cwdc_http.get('https://choosecolorado.com/doing-business/regions/',source='scrape')
     soup = bs(r.content)
     
     #identify elements containing region descriptions
@@ -1029,7 +1419,7 @@ def get_regions():
     regions = pd.DataFrame(regions)
         
     #retrieve list of colorado counties
-    r = requests.get('https://en.wikipedia.org/wiki/List_of_counties_in_Colorado')
+    r = cwdc_http.get('https://en.wikipedia.org/wiki/List_of_counties_in_Colorado',source='scrape')
     soup = bs(r.content)
 
     leeds = [i for i in soup.findAll('table')]
@@ -1104,7 +1494,7 @@ def normative_score(score):
 
         Returns
         -------
-        None.
+        series of 'high', 'average' and 'low', missing values left as they are
 
         '''
         
@@ -1112,15 +1502,14 @@ def normative_score(score):
         z = ( series - series.mean() ) / series.std()
        
         #relable series contents based on z score
-        series.loc[z >= 1] = 'high'
-        series.loc[(1 > z) & (z >= -1)] = 'average'
-        series.loc[-1 > z] = 'low'
-    
-    #make local copy of score dataframe
-    data = score.copy()
+        out = series.astype(object)
+        out.loc[z >= 1] = 'high'
+        out.loc[(1 > z) & (z >= -1)] = 'average'
+        out.loc[-1 > z] = 'low'
+        return(out)
     
-    #apply simplify method
-    data.apply(lambda col: simplify(col))
+    #apply simplify method to a copy of the score dataframe
+    data = score.apply(simplify)
     
     return(data)
 
@@ -1265,11 +1654,11 @@ def to_file(path,score,simple_score,data_raw,data_norm):
             
             sv = pd.DataFrame(simple_score.loc[co[0]]).T.reset_index()
             sv.columns = ['category','simplified_category_score']
-            sv = sv.append(pd.DataFrame([['not directly part of a score',np.nan]],columns=['category','simplified_category_score']))
+            sv = pd.concat([sv,pd.DataFrame([['not directly part of a score',np.nan]],columns=['category','simplified_category_score'])])
             
             s = pd.DataFrame(score.loc[co[0]]).T.reset_index()
             s.columns = ['category','category_score']
-            s = s.append(pd.DataFrame([['not directly part of a score',np.nan]],columns=['category','category_score']))
+            s = pd.concat([s,pd.DataFrame([['not directly part of a score',np.nan]],columns=['category','category_score'])])
             
             sv = s.merge(sv,on='category')
             
@@ -1286,18 +1675,138 @@ def to_file(path,score,simple_score,data_raw,data_norm):
 
 
 
-def score():
-    #generate input data
-    cwdc_ipeds = ipeds(2018)
-    cwdc_acs = acs(2019)
-    cwdc_etpl = etpl()
-    cc = cc_data()
-    qcew = get_qcew()
-    crime = crime_data()
-    emsi_ind = get_emsi_ind(working_dir+'emsi_ind_co/')
-    emsi_soc = get_emsi_soc(working_dir+'emsi_occ_co/')
-    census = get_census()
+def settings():
+    '''
+    module configuration, copied into worker processes by configure_worker
+
+    Returns
+    -------
+    dict of setting name to value
+
+    '''
+    return({'working_dir':working_dir,'journal_dir':journal_dir,'onet_db':onet_db,
+            'memo':memo.path,'tables':tables.path,'crosswalks':crosswalks.path})
+
+def configure_worker(state):
+    '''
+    apply settings taken from the parent process
+    '''
+    global working_dir, journal_dir, onet_db
+    working_dir = state['working_dir']
+    journal_dir = state['journal_dir']
+    onet_db = state['onet_db']
+    memo.path = state['memo']
+    tables.path = state['tables']
+    crosswalks.path = state['crosswalks']
+
+def code_lists():
+    '''
+    compute the occupation, cip and industry lists shared by the loaders once,
+    before the loaders run concurrently
+
+    Returns
+    -------
+    dict of list name to list
 
+    '''
+    return({'front_line_socs':front_line_socs(),
+            'in_demand_occupations':in_demand_occupations(),
+            'brookings_occupations':brookings_occupations(),
+            'in_demand_cips':in_demand_cips(),
+            'brookings_opporunity_cips':brookings_opporunity_cips(),
+            'related_industries':related_industries()})
+
+def stages(threads=8, processes=None, ipeds_year=2018, acs_year=2019, crdc_year=2015,
+           ipeds_workers=4, etpl_workers=8, qcew_path='2019.annual.by_area/',
+           county_shapes='cb_2019_us_county_500k.zip', crime_extracts=(('CO-2019/CO/','Colorado',2019),), pirl_years=(19,), formats=('csv','xlsx'),
+           output_dir=None, profile=None):
+    '''
+    stages of the index and their dependencies
+
+    qcew and pirl parsing run in worker processes, every other stage on threads.
+    each stage lists the files it reads so that, once artifacts.path is set, a
+    stage is only rerun when its code, arguments, files or upstream outputs
+    change. stages fetching remote data are kept until forced to rerun.
+
+    Parameters
+    ----------
+    threads : int, optional
+        network and file bound stages run at once.
+    processes : int, optional
+        parsing stages run at once, and emsi workbooks parsed at once.
+    ipeds_year, acs_year, crdc_year : int, optional
+        data years of the ipeds, acs and crdc absenteeism data.
+    ipeds_workers, etpl_workers : int, optional
+        requests made at once by the ipeds and etpl scrapes.
+    qcew_path : str, optional
+        qcew by area directory, singlefile csv or zip of either under
+        working_dir.
+    county_shapes : str, optional
+        county boundary file under working_dir etpl programs are located in.
+    crime_extracts : tuple, optional
+        (directory, state name, year) of the NIBRS extracts, see crime_data.
+    pirl_years : tuple, optional
+        two digit program years of the pirl extracts, see cc_data.
+    formats : tuple, optional
+        output file formats, any of csv, xlsx and parquet.
+    output_dir : str, optional
+        directory the outputs are written to, working_dir when None.
+    profile : str, optional
+        directory for a cProfile dump of every stage run.
+
+    Returns
+    -------
+    cwdc_stages.Pipeline
+
+    '''
+    if working_dir is None:
+        raise ValueError('working_dir is not set, call configure(data_dir) first')
+
+    p = cwdc_stages.Pipeline(threads,processes,init=configure_worker,initargs=(settings(),),store=artifacts,
+                            profile=profile,counters=cwdc_http.totals)
+
+    #code lists shared by the loaders
+    p.add('codes',code_lists,
+          inputs=['cwdc_socs.txt','All Top Jobs.csv','map_stdonet_emsisoc2019.csv',job_zones(),
+                  'WoF_CREC_data/full_transition_file_socxx.csv','WoF_CREC_data/full_crosswalk_soc10_socxx.csv',
+                  'CIP2020_SOC2018_Crosswalk.xlsx','oes_research_2020_allsectors.xlsx'],
+          uses=[front_line_socs,in_demand_occupations,transition_graph,brookings_occupations,
+                in_demand_cips,brookings_opporunity_cips,related_industries])
+
+    #input data
+    p.add('ipeds',ipeds,ipeds_year,ipeds_workers,crdc_year,after=['codes'],uses=[urban_api])
+    p.add('acs',acs,acs_year)
+    p.add('etpl',etpl,etpl_workers,county_shapes,after=['codes'],inputs=[county_shapes],uses=[assign_fips,cwdc_geo.plan_search_centres,cwdc_geo.within])
+    p.add('cc',cc_data,tuple(pirl_years),kind='cpu',
+          inputs=['pirl_py{}.csv'.format(y) for y in pirl_years] + ['Master Data Dictionary.xlsx'],uses=[read_pirl])
+    p.add('qcew',get_qcew,qcew_path,after=['codes'],kind='cpu',inputs=[qcew_path],
+          uses=[read_qcew,_qcew_sources,_county_area,_category_mask])
+    p.add('crime',crime_data,tuple(crime_extracts),inputs=[path for path, state, year in crime_extracts],
+          uses=[cwdc_nibrs.county_incidents,cwdc_nibrs.agency_counties,cwdc_nibrs.incident_counts])
+    p.add('emsi_ind',get_emsi_ind,working_dir+'emsi_ind_co/',processes,after=['codes'],inputs=[working_dir+'emsi_ind_co/'],
+          uses=[read_emsi_ind])
+    p.add('emsi_soc',get_emsi_soc,working_dir+'emsi_occ_co/',after=['codes'],inputs=[working_dir+'emsi_occ_co/'],
+          uses=[read_emsi_soc])
+    p.add('census',get_census,inputs=['CO Census Participation Rates 2010.xlsx'])
+    p.add('regions',get_regions)
+
+    #scoring
+    p.add('index',build_index,deps=['acs','ipeds','etpl','cc','qcew','crime','emsi_ind','emsi_soc','census','regions'])
+    p.add('regional',regional_scores,deps=['index'],uses=[normalize])
+    p.add('local',local_scores,deps=['index'],uses=[normalize])
+    p.add('scores',index_scores,deps=['index','regional','local'],uses=[normative_score])
+    p.add('outputs',write_outputs,output_dir or working_dir,tuple(formats),deps=['regional','scores'],uses=[to_file],cache=False)
+    return(p)
+
+def build_index(cwdc_acs, cwdc_ipeds, cwdc_etpl, cc, qcew, crime, emsi_ind, emsi_soc, census, regions):
+    '''
+    join the input data into one county dataset
+
+    Returns
+    -------
+    dataframe of index data by county
+
+    '''
     #join and merge input data together
     c_idx = cwdc_acs.join([cwdc_ipeds,cwdc_etpl,cc,qcew,emsi_ind,census],how='outer')
     c_idx.reset_index(inplace=True)
@@ -1342,10 +1851,20 @@ def score():
 
     #regional dataset
     
-    #create region list and join to index data
-    regions = get_regions()
+    #join region list to index data
     c_idx = c_idx.join(regions)
-    
+
+    return(c_idx)
+
+def regional_scores(c_idx):
+    '''
+    aggregate index data to regions and score the regional categories
+
+    Returns
+    -------
+    regional data, normalized regional data and regional category scores
+
+    '''
     #aggregate regional data
     reg_data = c_idx.groupby('region').agg({
         'hh_bpl':'mean',
@@ -1384,9 +1903,6 @@ def score():
     
     reg_data.replace([np.inf,-np.inf], np.nan, inplace=True)
     
-    #write regional data to file
-    reg_data.to_csv(working_dir+'cwdc_regional_data.csv')
-    
     #normalize regional data
     reg_norm = normalize(reg_data)
     
@@ -1423,6 +1939,17 @@ def score():
     #join regional categories together
     reg = reg.join([ed,occ],how='outer').reset_index()
 
+    return(reg_data,reg_norm,reg)
+
+def local_scores(c_idx):
+    '''
+    score the local categories of every county
+
+    Returns
+    -------
+    local data, normalized local data and local category scores
+
+    '''
     #local data input variables
     cols = [
         'hs_grad',
@@ -1503,7 +2030,22 @@ def score():
 
     #join local data
     local = indiv.join([industry,nbhd,engage])
-    
+
+    return(local_data,local_norm,local)
+
+def index_scores(c_idx, regional, county):
+    '''
+    combine local and regional scores into the index
+
+    Returns
+    -------
+    dict of output dataframes
+
+    '''
+    reg_data, reg_norm, reg = regional
+    local_data, local_norm, local = county
+    c_idx = c_idx.copy()
+
     #combine local and regional data into a final score datafrme
     local = local.join(c_idx[['NAME','region']])
     score = local.reset_index().merge(reg,on='region',how='outer').drop('region',axis=1)
@@ -1516,10 +2058,6 @@ def score():
     #generate simple scores
     simple_score = normative_score(score)    
     
-    #write score and simple score to file
-    score.to_csv(working_dir+'cwdc_index_scores.csv')
-    simple_score.to_csv(working_dir+'cwdc_index_scores_simple.csv')
-    
     #construct normalized values dataframe from both local and regional data
     local_norm = local_norm.join(c_idx[['NAME','region']])
     norm = local_norm.reset_index().merge(reg_norm.reset_index(),on='region',how='outer').drop('region',axis=1)
@@ -1529,12 +2067,8 @@ def score():
     #generate simplified normalized values
     simple_norm = normative_score(norm)
     
-    #write normalized values to file
-    norm.to_csv(working_dir+'cwdc_index_normalized_values.csv')
-    simple_norm.to_csv(working_dir+'cwdc_index_normalized_values_simple.csv')
-
     #construct statewide averages and add to index data
-    agg = pd.DataFrame(c_idx.mean()).T
+    agg = pd.DataFrame(c_idx.mean(numeric_only=True)).T
     agg['fips'] = 8999
     agg['NAME'] = 'statewide average'
     agg.set_index(['fips','NAME'],inplace=True)
@@ -1543,15 +2077,11 @@ def score():
     c_idx.rename(columns={'index':'fips'},inplace=True)
     c_idx.set_index(['fips','NAME'],inplace=True)
     
-    c_idx = c_idx.append(agg)
+    c_idx = pd.concat([c_idx,agg])
     c_idx.reset_index(inplace=True)
     c_idx.set_index(['fips','NAME','region'],inplace=True)
     
-    #write to file
-    c_idx.to_csv(working_dir+'cwdc_index_data.csv')
-    
-    
-    #write to file
+    #combine local and regional data for the summary workbook
     temp = c_idx.reset_index()[['fips','NAME','region']]
     local_data = local_data.join(temp.set_index('fips'))
     #local_norm = local_norm.join(regions)
@@ -1570,18 +2100,235 @@ def score():
         if c.endswith('_y'):
             master_norm.rename(columns={c:'region_'+c.strip('_y')},inplace=True)
 
-    with pd.ExcelWriter(working_dir + 'cwdc_county_summaries.xlsx', engine = 'openpyxl', mode = 'w') as writer:
-        score.to_excel(writer,sheet_name='scores')
-        writer.save()
+    return({'score':score,'simple_score':simple_score,'norm':norm,'simple_norm':simple_norm,
+            'data':c_idx,'master_data':master_data,'master_norm':master_norm})
+
+def write_outputs(path, formats, regional, out):
+    '''
+    write the regional data and index outputs
+
+    Parameters
+    ----------
+    path : str
+        output directory.
+    formats : tuple
+        any of csv, xlsx and parquet.
+    regional : tuple
+        output of regional_scores.
+    out : dict
+        output of index_scores.
+
+    Returns
+    -------
+    None.
+
+    '''
+    os.makedirs(path,exist_ok=True)
+    files = {'cwdc_regional_data':regional[0],
+             'cwdc_index_scores':out['score'],
+             'cwdc_index_scores_simple':out['simple_score'],
+             'cwdc_index_normalized_values':out['norm'],
+             'cwdc_index_normalized_values_simple':out['simple_norm'],
+             'cwdc_index_data':out['data']}
+
+    #write regional data, scores, normalized values and index data to file
+    for name, frame in files.items():
+        if 'csv' in formats:
+            frame.to_csv(os.path.join(path,name+'.csv'))
+        if 'parquet' in formats:
+            frame.to_parquet(os.path.join(path,name+'.parquet'))
+
+    #write the summary workbook
+    if 'xlsx' in formats:
+        with pd.ExcelWriter(os.path.join(path,'cwdc_county_summaries.xlsx'), engine = 'openpyxl', mode = 'w') as writer:
+            out['score'].to_excel(writer,sheet_name='scores')
+
+        to_file(os.path.join(path,'cwdc_county_summaries.xlsx'),
+                out['score'].copy(),
+                out['simple_score'].copy(),
+                out['master_data'].copy(),
+                out['master_norm'].copy())
+
+def configure(data_dir, cache='use', onet=None, record=None, replay=None):
+    '''
+    point the index at its input data and set up its caches
+
+    Parameters
+    ----------
+    data_dir : str
+        directory holding the input data.
+    cache : str, optional
+        'use' keeps remote responses, checkpoints, code lists, parquet copies,
+        crosswalks and stage outputs under data_dir; 'refresh' does the same
+        but revalidates every remote response and reruns REMOTE_STAGES, and
+        so every stage depending on them whose input changed; 'offline' serves remote data
+        only from the response cache; 'off' keeps nothing between runs.
+    onet : str, optional
+        o*net database text directory under data_dir, the current onet_db
+        when not given.
+    record : str, optional
+        directory every remote response is recorded to, see
+        cwdc_replay.FixtureStore.
+    replay : str, optional
+        base url of a cwdc_replay server every remote host is routed to,
+        e.g. http://127.0.0.1:8765.
+
+    Returns
+    -------
+    None.
 
-    to_file(working_dir + 'cwdc_county_summaries.xlsx',
-            score.copy(),
-            simple_score.copy(),
-            master_data.copy(),
-            master_norm.copy())    
+    '''
+    global working_dir, journal_dir, onet_db, cache_policy
+    if cache not in ['use','refresh','offline','off']:
+        raise ValueError('unknown cache policy {}'.format(cache))
+    cache_policy = cache
+
+    working_dir = os.path.join(data_dir,'')
+    if onet is not None:
+        onet_db = os.path.join(onet,'')
+
+    #record remote responses for later replay, or answer them from a replay server
+    if record is not None:
+        cwdc_http.recorder = cwdc_replay.FixtureStore(record)
+    if replay is not None:
+        cwdc_replay.point_at(replay)
+
+    if cache == 'off':
+        cwdc_http.cache = None
+        journal_dir = None
+        memo.path = tables.path = crosswalks.path = artifacts.path = None
+        return
+
+    #cache remote responses alongside the input data so reruns skip the network
+    ttls = {k:0 for k in cwdc_http.DEFAULT_TTLS} if cache == 'refresh' else None
+    cwdc_http.configure_cache(working_dir+'http_cache/',ttls=ttls,offline=cache == 'offline')
+    
+    #checkpoint long running scrapes so a failed run can resume
+    journal_dir = working_dir+'journal/'
+    
+    #persist derived code sets and stage outputs between runs
+    memo.path = working_dir+'memo/'
+    tables.path = working_dir+'columnar/'
+    crosswalks.path = working_dir+'crosswalks/'
+    artifacts.path = working_dir+'artifacts/'
+
+def score(targets=('outputs',), skip=(), rerun=(), report=None, history=None, **kwargs):
+    '''
+    build the index, by default from input data through the output files
+
+    Parameters
+    ----------
+    targets : tuple, optional
+        stages to bring up to date, see stages.
+    skip : tuple, optional
+        stages left out along with every stage depending on them.
+    rerun : tuple, optional
+        stages run even when their stored output is current. REMOTE_STAGES
+        are added when configured with cache='refresh'.
+    report : str, optional
+        path of a json report of every stage's time, memory, rows, bytes and
+        http calls. a summary table is printed either way.
+    history : str, optional
+        sqlite file of earlier runs' stage timings. this run is added to it
+        and cwdc_perf.Regression is raised, after every output is written,
+        when a stage is significantly slower than its recent runs. stages
+        share processes, so memory is not compared, see cwdc_perf.results.
+    **kwargs
+        passed to stages.
+
+    Returns
+    -------
+    dict of stage name to result for every target run
+
+    '''
+    p = stages(**kwargs)
+    dropped = p.downstream(skip)
+
+    #a refresh only revalidates responses of the stages that are run
+    if cache_policy == 'refresh':
+        rerun = tuple(rerun) + REMOTE_STAGES
+
+    start = time.perf_counter()
+    out = p.run([t for t in targets if t not in dropped],force=rerun)
+    records = [p.records[n] for n in p.order() if n in p.records]
+
+    if report is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(report)),exist_ok=True)
+        with open(report,'w') as f:
+            json.dump({'wall_seconds':time.perf_counter() - start,
+                       'stages':records,
+                       'http':{'sources':cwdc_http.calls,'hosts':cwdc_http.client.stats()}},f,indent=1)
+    print(cwdc_stages.summary(records))
+
+    if history is not None:
+        found = cwdc_perf.track(history,'pipeline:' + os.path.abspath(working_dir),cwdc_perf.results(records))
+        if found:
+            raise cwdc_perf.Regression(found)
+
+    return(out)
+
+def _nibrs_extract(arg):
+    #directory:state name:year, the directory may itself contain colons
+    try:
+        path, state, year = arg.rsplit(':',2)
+        return((os.path.join(path,''),state,int(year)))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected directory:state name:year, got {}'.format(arg))
+
+def main(argv=None):
+    '''
+    command line entry point, returns the exit status
+    '''
+    parser = argparse.ArgumentParser(description='build the cwdc economic mobility index')
+    parser.add_argument('data_dir',help='directory holding the input data')
+    parser.add_argument('--output-dir',default=None,help='directory for the outputs, data_dir by default')
+    parser.add_argument('--ipeds-year',type=int,default=2018)
+    parser.add_argument('--acs-year',type=int,default=2019)
+    parser.add_argument('--crdc-year',type=int,default=2015)
+    parser.add_argument('--stages',nargs='+',default=['outputs'],help='stages to bring up to date')
+    parser.add_argument('--skip',nargs='+',default=[],help='stages to leave out along with everything depending on them')
+    parser.add_argument('--rerun',nargs='+',default=[],help='stages to run even when their stored output is current')
+    parser.add_argument('--list',action='store_true',help='list the stages and exit')
+    parser.add_argument('--formats',nargs='+',default=['csv','xlsx'],choices=['csv','xlsx','parquet'])
+    parser.add_argument('--threads',type=int,default=8,help='network and file bound stages run at once')
+    parser.add_argument('--processes',type=int,default=None,help='parsing stages run at once')
+    parser.add_argument('--ipeds-workers',type=int,default=4)
+    parser.add_argument('--etpl-workers',type=int,default=8)
+    parser.add_argument('--pirl-years',nargs='+',type=int,default=[19],help='two digit pirl program years')
+    parser.add_argument('--county-shapes',default='cb_2019_us_county_500k.zip',help='county boundary file under data_dir')
+    parser.add_argument('--nibrs',nargs='+',type=_nibrs_extract,default=[('CO-2019/CO/','Colorado',2019)],
+                        help='nibrs extracts as directory:state name:year, directory under data_dir')
+    parser.add_argument('--qcew',default='2019.annual.by_area/',help='qcew by area directory, singlefile or zip under data_dir')
+    parser.add_argument('--onet-db',default=onet_db,help='o*net database text directory under data_dir')
+    parser.add_argument('--record',default=None,help='directory every remote response is recorded to')
+    parser.add_argument('--replay',default=None,help='base url of a cwdc_replay server answering remote requests')
+    parser.add_argument('--cache',default='use',choices=['use','refresh','offline','off'])
+    parser.add_argument('--report',default=None,help='path of a json run report')
+    parser.add_argument('--profile',default=None,help='directory for a cProfile dump of every stage')
+    parser.add_argument('--history',default=None,help='sqlite file of past runs, exits with status 1 on a regression')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO,format='%(message)s')
+
+    configure(args.data_dir,args.cache,args.onet_db,args.record,args.replay)
+    kwargs = dict(threads=args.threads,processes=args.processes,ipeds_year=args.ipeds_year,acs_year=args.acs_year,
+                  crdc_year=args.crdc_year,ipeds_workers=args.ipeds_workers,etpl_workers=args.etpl_workers,
+                  qcew_path=args.qcew,county_shapes=args.county_shapes,crime_extracts=tuple(args.nibrs),
+                  pirl_years=args.pirl_years,formats=args.formats,output_dir=args.output_dir,profile=args.profile)
+
+    if args.list:
+        p = stages(**kwargs)
+        for name in p.order():
+            s = p.stages[name]
+            print('{:<10} {:<4} {}'.format(name,s.kind,', '.join(s.requires)))
+        return(0)
+
+    #stages named to rerun are brought up to date along with the targets
+    try:
+        score(tuple(args.stages) + tuple(args.rerun),args.skip,args.rerun,args.report,args.history,**kwargs)
+    except cwdc_perf.Regression as e:
+        print(e)
+        return(1)
+    return(0)
 
 if __name__ == '__main__':
-    #location of index data
-    working_dir = 'FILE PATH TO INPUT DATA LOCATION'
-    
-    score()
\ No newline at end of file
+    sys.exit(main())
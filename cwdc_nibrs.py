@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+county incident counts from FBI NIBRS state extracts
+
+@author: Gabriel Moss
+"""
+import os
+import numpy as np
+import pandas as pd
+
+def _find(path, name):
+    #extracts name their files in upper or lower case depending on the year
+    for f in os.listdir(path):
+        if f.lower() == name.lower():
+            return(os.path.join(path,f))
+    raise FileNotFoundError(os.path.join(path,name))
+
+def agency_counties(path, state):
+    '''
+    county share of every agency in an extract
+
+    agencies spanning several counties list them separated by '; ', each
+    county is credited an equal share of the agency's incidents.
+
+    Parameters
+    ----------
+    path : str
+        extract directory holding agencies.csv.
+    state : str
+        state name used in county names, e.g. Colorado.
+
+    Returns
+    -------
+    dataframe of AGENCY_ID, NAME and share, one row per agency and county
+
+    '''
+    agencies = pd.read_csv(_find(path,'agencies.csv'),usecols=['AGENCY_ID','COUNTY_NAME'],
+                           dtype={'AGENCY_ID':'int64','COUNTY_NAME':str})
+    agencies = agencies[agencies['COUNTY_NAME'].notna()]
+
+    agc = agencies.assign(NAME=agencies['COUNTY_NAME'].str.split('; ')).explode('NAME')
+    agc['NAME'] = agc['NAME'].str.lower().str.title() + ' County, ' + state
+    agc['share'] = 1 / agc.groupby('AGENCY_ID')['NAME'].transform('count')
+    return(agc[['AGENCY_ID','NAME','share']].reset_index(drop=True))
+
+def incident_counts(path, agencies, chunksize=10**6):
+    '''
+    incidents reported by each agency, streamed from NIBRS_incident.csv
+
+    only the agency column is read. agency ids are interned against the given
+    agencies and counted with a bincount per chunk, incidents of agencies not
+    listed are dropped.
+
+    Parameters
+    ----------
+    path : str
+        extract directory holding NIBRS_incident.csv.
+    agencies : array
+        agency ids to count.
+    chunksize : int, optional
+        rows read at a time.
+
+    Returns
+    -------
+    array of incident counts aligned with agencies
+
+    '''
+    ids = pd.Index(agencies)
+    counts = np.zeros(len(ids),dtype=np.int64)
+    for chunk in pd.read_csv(_find(path,'NIBRS_incident.csv'),usecols=['AGENCY_ID'],dtype={'AGENCY_ID':'int64'},
+                             chunksize=chunksize):
+        pos = ids.get_indexer(chunk['AGENCY_ID'].to_numpy())
+        counts += np.bincount(pos[pos >= 0],minlength=len(ids))
+    return(counts)
+
+def county_incidents(extracts, chunksize=10**6):
+    '''
+    incidents by county and year across state year extracts
+
+    Parameters
+    ----------
+    extracts : list
+        (directory, state name, year) of every extract.
+    chunksize : int, optional
+        incident rows read at a time.
+
+    Returns
+    -------
+    dataframe of NAME, state, year and crime_incidents
+
+    '''
+    out = []
+    for path, state, year in extracts:
+        agc = agency_counties(path,state)
+        ids = agc['AGENCY_ID'].unique()
+        counts = incident_counts(path,ids,chunksize)
+        agc['crime_incidents'] = counts[pd.Index(ids).get_indexer(agc['AGENCY_ID'])] * agc['share']
+        out.append(agc.groupby('NAME',as_index=False)['crime_incidents'].sum().assign(state=state,year=year))
+    out = pd.concat(out,ignore_index=True)
+    return(out.groupby(['NAME','state','year'],as_index=False)['crime_incidents'].sum())
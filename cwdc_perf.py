@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+history of stage timings and peak memory across runs, with regression checks
+
+@author: Gabriel Moss
+"""
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+from scipy import stats
+
+class Regression(Exception):
+    '''
+    raised when a run is significantly slower or larger than its baseline
+    '''
+    def __init__(self, regressions):
+        self.regressions = regressions
+        super().__init__(report(regressions))
+
+def code_version(path=None):
+    '''
+    git commit of the code being run, suffixed + when the tree has local changes
+
+    Returns
+    -------
+    str, or None outside a git checkout
+
+    '''
+    path = path or os.path.dirname(os.path.abspath(__file__))
+    try:
+        head = subprocess.run(['git','rev-parse','--short','HEAD'],cwd=path,capture_output=True,text=True,check=True).stdout.strip()
+        dirty = subprocess.run(['git','status','--porcelain','--untracked-files=no'],cwd=path,capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return(None)
+    return(head + ('+' if dirty else ''))
+
+class History():
+    '''
+    sqlite store of per stage measurements, one row per stage per run
+
+    each run belongs to a suite naming what was measured, e.g. a benchmark
+    data directory or a pipeline data directory, and is compared only with
+    earlier runs of the same suite on the same host.
+
+    Parameters
+    ----------
+    path : str
+        sqlite file, created if it does not exist.
+
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+
+        self.db = sqlite3.connect(path,check_same_thread=False)
+        self.db.execute('''create table if not exists runs (
+            id integer primary key,
+            suite text,
+            host text,
+            version text,
+            started real)''')
+        self.db.execute('''create table if not exists measurements (
+            run integer,
+            stage text,
+            wall text,
+            peak_rss integer)''')
+        self.db.execute('create index if not exists runs_suite on runs (suite, host, started)')
+        self.db.commit()
+
+    def add(self, suite, results, version=None):
+        '''
+        record a run
+
+        Parameters
+        ----------
+        suite : str
+            what was measured.
+        results : dict
+            stage name to {'wall':[seconds of each repeat], 'peak_rss':bytes}.
+        version : str, optional
+            code version, see code_version.
+
+        Returns
+        -------
+        id of the run
+
+        '''
+        with self.lock:
+            cur = self.db.execute('insert into runs (suite,host,version,started) values (?,?,?,?)',
+                                  (suite,platform.node(),version,time.time()))
+            run = cur.lastrowid
+            self.db.executemany('insert into measurements values (?,?,?,?)',
+                                [(run,name,json.dumps(r['wall']),r.get('peak_rss')) for name, r in results.items()])
+            self.db.commit()
+        return(run)
+
+    def baseline(self, suite, stage, window=10, before=None):
+        '''
+        measurements of a stage over the last window runs of a suite on this host
+
+        Parameters
+        ----------
+        suite : str
+            what was measured.
+        stage : str
+            stage name.
+        window : int, optional
+            runs in the baseline.
+        before : int, optional
+            only runs recorded before this run id.
+
+        Returns
+        -------
+        list of (wall seconds of each repeat, peak rss) from oldest to newest
+
+        '''
+        with self.lock:
+            rows = self.db.execute('''select m.wall, m.peak_rss from runs r join measurements m on m.run = r.id
+                where r.suite = ? and r.host = ? and m.stage = ? and r.id < ?
+                order by r.id desc limit ?''',(suite,platform.node(),stage,before or 2**62,window)).fetchall()
+        return([(json.loads(w),p) for w, p in reversed(rows)])
+
+    def runs(self, suite=None, limit=20):
+        '''
+        the most recent runs as (id, suite, host, version, started)
+        '''
+        q = 'select id, suite, host, version, started from runs'
+        args = ()
+        if suite is not None:
+            q += ' where suite = ?'
+            args = (suite,)
+        with self.lock:
+            return(self.db.execute(q + ' order by id desc limit ?',args + (limit,)).fetchall())
+
+def _slower(new, base, alpha):
+    #p value of new being drawn from a slower distribution than base
+    if len(new) >= 3 and len(base) >= 3:
+        return(stats.mannwhitneyu(new,base,alternative='greater').pvalue)
+
+    #too few repeats for a rank test, use a robust z score of the new median
+    med = statistics.median(base)
+    mad = statistics.median(abs(b - med) for b in base) * 1.4826
+    if mad == 0:
+        return(0.0 if statistics.median(new) > med else 1.0)
+    return(float(stats.norm.sf((statistics.median(new) - med) / mad)))
+
+def check(history, suite, results, run=None, window=10, alpha=0.01, min_ratio=1.1, min_runs=3):
+    '''
+    flag stages that are significantly slower or larger than their baseline
+
+    a stage's wall times are compared with every repeat from its last window
+    runs with a one sided mann-whitney u test, or a robust z score of the
+    median when either side has fewer than three values. a stage regresses
+    when the test is significant at alpha and its median is at least
+    min_ratio times the baseline median. peak memory is compared the same way
+    over the baseline runs' peaks.
+
+    Parameters
+    ----------
+    history : History
+        past runs.
+    suite : str
+        what was measured.
+    results : dict
+        stage name to {'wall':[seconds], 'peak_rss':bytes} of the new run.
+    run : int, optional
+        id of the new run when it is already recorded, so it is left out of
+        its own baseline.
+    window : int, optional
+        runs in the baseline.
+    alpha : float, optional
+        significance level.
+    min_ratio : float, optional
+        smallest slowdown or growth reported.
+    min_runs : int, optional
+        baseline runs needed before a stage is checked.
+
+    Returns
+    -------
+    list of dicts describing each regression
+
+    '''
+    out = []
+    for name, r in results.items():
+        base = history.baseline(suite,name,window,run)
+        if len(base) < min_runs or not r['wall']:
+            continue
+
+        wall = [w for b in base for w in b[0]]
+        if wall:
+            ratio = statistics.median(r['wall']) / max(statistics.median(wall),1e-9)
+            p = _slower(r['wall'],wall,alpha)
+            if p < alpha and ratio >= min_ratio:
+                out.append({'stage':name,'metric':'wall_seconds','baseline':statistics.median(wall),
+                            'value':statistics.median(r['wall']),'ratio':ratio,'p':p})
+
+        peaks = [b[1] for b in base if b[1] is not None]
+        if r.get('peak_rss') is not None and len(peaks) >= min_runs:
+            ratio = r['peak_rss'] / max(statistics.median(peaks),1)
+            p = _slower([r['peak_rss']],peaks,alpha)
+            if p < alpha and ratio >= min_ratio:
+                out.append({'stage':name,'metric':'peak_rss','baseline':statistics.median(peaks),
+                            'value':r['peak_rss'],'ratio':ratio,'p':p})
+    return(out)
+
+def track(path, suite, results, **kwargs):
+    '''
+    record a run in the history at path and check it against its baseline
+
+    Parameters
+    ----------
+    path : str
+        history sqlite file.
+    suite : str
+        what was measured.
+    results : dict
+        stage name to {'wall':[seconds], 'peak_rss':bytes}.
+    **kwargs
+        passed to check.
+
+    Returns
+    -------
+    list of regressions, see check
+
+    '''
+    history = History(path)
+    run = history.add(suite,results,code_version())
+    return(check(history,suite,results,run,**kwargs))
+
+def results(records):
+    '''
+    history results from pipeline stage records, leaving out stages that were
+    loaded from the artifact store or failed
+
+    pipeline stages share their process with stages running alongside them and
+    before them, so a stage's peak rss is the process's rather than its own and
+    is not recorded. memory is only checked for benchmark cases, each of which
+    runs in its own process.
+    '''
+    return({r['stage']:{'wall':[r['wall_seconds']],'peak_rss':None}
+            for r in records if 'wall_seconds' in r})
+
+def report(regressions):
+    '''
+    text description of regressions
+    '''
+    lines = []
+    for r in regressions:
+        if r['metric'] == 'peak_rss':
+            lines.append('REGRESSION {}: peak memory {:.1f} MB vs baseline {:.1f} MB ({:.2f}x, p={:.3g})'.format(
+                r['stage'],r['value'] / 2**20,r['baseline'] / 2**20,r['ratio'],r['p']))
+        else:
+            lines.append('REGRESSION {}: {:.3f} s vs baseline {:.3f} s ({:.2f}x, p={:.3g})'.format(
+                r['stage'],r['value'],r['baseline'],r['ratio'],r['p']))
+    return('\n'.join(lines))
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+record / replay stand in for the remote apis used by cwdc_idx
+
+record a run with cwdc_idx --record DIR, serve the fixtures with
+
+    python cwdc_replay.py DIR --port 8765
+
+and run again with cwdc_idx --replay http://127.0.0.1:8765, which points the
+fetchers at the server with point_at, so score() can run with no network.
+
+@author: Gabriel Moss
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import requests
+import cwdc_http
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+#hosts contacted by the pipeline. www.onetonline.org is not among them, job
+#zones are read from the local o*net database (cwdc_idx.onet_db) so there is
+#nothing of it to record or replay
+HOSTS = [
+    'api.census.gov',
+    'educationdata.urban.org',
+    'geo.fcc.gov',
+    'cxsearch.dol.gov',
+    'www.trainingproviderresults.gov',
+    'choosecolorado.com',
+    'en.wikipedia.org'
+    ]
+
+class FixtureStore():
+    '''
+    directory of recorded responses keyed by url
+
+    each response is stored as a json header file and a body file named by the
+    sha256 of its normalized url.
+
+    Parameters
+    ----------
+    path : str
+        directory holding the fixtures.
+
+    '''
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path,exist_ok=True)
+
+    def key(self, url):
+        '''
+        fixture name of a url, stable under requests' url requoting
+        '''
+        return(hashlib.sha256(requests.utils.requote_uri(url).encode()).hexdigest())
+
+    def add(self, url, r):
+        '''
+        record a response
+        '''
+        name = os.path.join(self.path,self.key(url))
+        headers = {k:v for k,v in r.headers.items() if k.lower() not in ['content-encoding','transfer-encoding','content-length']}
+
+        with open(name+'.body','wb') as f:
+            f.write(r.content)
+        with open(name+'.json','w') as f:
+            json.dump({'url':url,'status':r.status_code,'headers':headers},f)
+
+    def get(self, url):
+        '''
+        recorded status, headers and body for url, or None when it was not recorded
+        '''
+        name = os.path.join(self.path,self.key(url))
+        if not os.path.exists(name+'.json'):
+            return(None)
+
+        with open(name+'.json') as f:
+            meta = json.load(f)
+        with open(name+'.body','rb') as f:
+            body = f.read()
+        return(meta['status'],meta['headers'],body)
+
+class ReplayServer():
+    '''
+    local http server answering requests from a FixtureStore
+
+    requests arrive as /<host>/<path>?<query>, the form produced by point_at, and
+    are answered with the response recorded for https://<host>/<path>?<query>.
+    unrecorded urls get a 404.
+
+    Parameters
+    ----------
+    store : FixtureStore
+        recorded responses.
+    port : int, optional
+        port to listen on, 0 picks a free port.
+    latency : float, optional
+        mean seconds added to every response, drawn uniformly from 0 to twice this.
+    failure_rate : float, optional
+        share of requests answered with a 503 instead of the fixture.
+    seed : int, optional
+        seed for the latency and failure draws.
+
+    '''
+    def __init__(self, store, port=0, latency=0.0, failure_rate=0.0, seed=None):
+        self.store = store
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'served':0,'missing':0,'failed':0}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1',port),Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = 'http://127.0.0.1:{}'.format(self.port)
+        self.thread = None
+
+    def handle(self, h):
+        with self.lock:
+            delay = self.random.uniform(0,2*self.latency) if self.latency else 0
+            fail = self.random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+
+        host, _, rest = h.path.lstrip('/').partition('/')
+        hit = None if fail else self.store.get('https://{}/{}'.format(host,rest))
+
+        if fail:
+            status, headers, body = 503, {}, b''
+            key = 'failed'
+        elif hit is None:
+            status, headers, body = 404, {}, b''
+            key = 'missing'
+        else:
+            status, headers, body = hit
+            key = 'served'
+
+        with self.lock:
+            self.counts[key] += 1
+
+        h.send_response(status)
+        for k, v in headers.items():
+            if k.lower() not in ['connection','keep-alive','date','server']:
+                h.send_header(k,v)
+        h.send_header('Content-Length',str(len(body)))
+        h.end_headers()
+        h.wfile.write(body)
+
+    def start(self):
+        '''
+        serve in a background thread
+        '''
+        self.thread = threading.Thread(target=self.httpd.serve_forever,daemon=True)
+        self.thread.start()
+        return(self)
+
+    def stop(self):
+        '''
+        shut the server down
+        '''
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def point_at(base, hosts=HOSTS):
+    '''
+    route requests for every pipeline host to a replay server
+
+    Parameters
+    ----------
+    base : str
+        base url of the replay server, e.g. http://127.0.0.1:8765.
+    hosts : list, optional
+        hosts to reroute.
+
+    Returns
+    -------
+    None.
+
+    '''
+    for host in hosts:
+        for scheme in ['https','http']:
+            cwdc_http.base_urls['{}://{}'.format(scheme,host)] = '{}/{}'.format(base.rstrip('/'),host)
+
+    #every host now shares one local address, whose pace is set by the server
+    cwdc_http.rates[urlparse(base).netloc] = (1e6,1e6)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='serve recorded cwdc index api responses')
+    parser.add_argument('fixtures',help='directory of recorded responses')
+    parser.add_argument('--port',type=int,default=8765)
+    parser.add_argument('--latency',type=float,default=0.0,help='mean seconds added to each response')
+    parser.add_argument('--failure-rate',type=float,default=0.0,help='share of requests answered with a 503')
+    parser.add_argument('--seed',type=int,default=None)
+    args = parser.parse_args()
+
+    server = ReplayServer(FixtureStore(args.fixtures),args.port,args.latency,args.failure_rate,args.seed)
+    print('replaying {} on {}'.format(args.fixtures,server.url))
+    server.httpd.serve_forever()
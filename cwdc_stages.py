@@ -0,0 +1,631 @@
+# -*- coding: utf-8 -*-
+"""
+dependency graph of pipeline stages run concurrently, with stage outputs kept
+in a content hashed artifact store and every stage run measured
+
+@author: Gabriel Moss
+"""
+import contextlib
+import cProfile
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+import types
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+class Stage():
+    '''
+    one unit of the pipeline
+
+    Parameters
+    ----------
+    name : str
+        unique stage name.
+    func : callable
+        called as func(*args, *results of deps). cpu stages run in another
+        process, so func must be a module level function.
+    args : tuple, optional
+        leading arguments.
+    deps : tuple, optional
+        stages whose results are passed to func, in order.
+    after : tuple, optional
+        stages that must finish first without their results being passed.
+    kind : str, optional
+        'io' for network or file bound stages run on threads, 'cpu' for
+        parsing heavy stages run in a process pool.
+    inputs : tuple, optional
+        files or directories the stage reads, part of its artifact key.
+    uses : tuple, optional
+        helper functions whose code is part of the artifact key along with
+        func's own. functions func and its helpers call are found by
+        code_closure, uses names any that are reached some other way.
+    cache : bool, optional
+        keep the stage's output in the artifact store, False for stages run
+        for their side effects such as writing output files.
+
+    '''
+    def __init__(self, name, func, args=(), deps=(), after=(), kind='io', inputs=(), uses=(), cache=True):
+        if kind not in ['io','cpu']:
+            raise ValueError('unknown stage kind {}'.format(kind))
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.deps = tuple(deps)
+        self.after = tuple(after)
+        self.kind = kind
+        self.inputs = tuple(inputs)
+        self.uses = tuple(uses)
+        self.cache = cache
+
+    @property
+    def requires(self):
+        return(self.deps + self.after)
+
+def _to_arrow(out):
+    #dataframes cross the process boundary as an arrow ipc stream rather than a pickle
+    if not isinstance(out,pd.DataFrame):
+        return(False,out)
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(out)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink,table.schema) as w:
+        w.write_table(table)
+    return(True,sink.getvalue().to_pybytes())
+
+def _from_arrow(packed):
+    is_table, out = packed
+    if not is_table:
+        return(out)
+    import pyarrow as pa
+    return(pa.ipc.open_stream(pa.py_buffer(out)).read_all().to_pandas())
+
+def _rows(obj):
+    if isinstance(obj,(pd.DataFrame,pd.Series)):
+        return(len(obj))
+    if isinstance(obj,tuple):
+        return(sum(_rows(i) for i in obj))
+    if isinstance(obj,list):
+        return(len(obj))
+    if isinstance(obj,dict):
+        return(sum(_rows(i) for i in obj.values()))
+    return(0)
+
+def _peak_rss():
+    #peak resident set size of this process in bytes, None where it cannot be read
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return(peak if sys.platform == 'darwin' else peak * 1024)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return(psutil.Process().memory_info().peak_wset)
+    except (ImportError, AttributeError):
+        return(None)
+
+def _bytes_read():
+    #bytes this process has read through read calls, None where it cannot be read
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return(int(line.split()[1]))
+    except OSError:
+        pass
+    try:
+        import psutil
+        return(psutil.Process().io_counters().read_bytes)
+    except (ImportError, AttributeError):
+        return(None)
+
+def measure(name, func, args, profile=None, counters=None):
+    '''
+    run func(*args) and measure it
+
+    cpu time, bytes read and the counters are process wide, so while other
+    stages run on threads alongside this one their work is counted too. run
+    with one thread for exact figures per stage. peak rss is the process's peak
+    so far. the profile covers the calling thread only.
+
+    Parameters
+    ----------
+    name : str
+        stage name, names the profile file.
+    func : callable
+        function to run.
+    args : tuple
+        its arguments.
+    profile : str, optional
+        directory for a cProfile dump of the call.
+    counters : callable, optional
+        returns a dict of cumulative counts, e.g. cwdc_http.totals, whose
+        change over the call is recorded.
+
+    Returns
+    -------
+    result of func and dict of measurements
+
+    '''
+    c0 = counters() if counters is not None else {}
+    b0 = _bytes_read()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+
+    prof = cProfile.Profile() if profile else None
+    if prof is not None:
+        prof.enable()
+    try:
+        out = func(*args)
+    finally:
+        if prof is not None:
+            prof.disable()
+            os.makedirs(profile,exist_ok=True)
+            prof.dump_stats(os.path.join(profile,name+'.prof'))
+
+    rec = {'wall_seconds':time.perf_counter() - wall,
+           'cpu_seconds':time.process_time() - cpu,
+           'peak_rss':_peak_rss(),
+           'rows_in':_rows(args),
+           'rows_out':_rows(out),
+           'bytes_read':None,
+           'pid':os.getpid()}
+    b1 = _bytes_read()
+    if b0 is not None and b1 is not None:
+        rec['bytes_read'] = b1 - b0
+    if counters is not None:
+        c1 = counters()
+        rec.update({k:c1[k] - c0.get(k,0) for k in c1})
+    return(out,rec)
+
+def _call_cpu(name, func, args, profile):
+    out, rec = measure(name,func,args,profile)
+    return(_to_arrow(out),rec)
+
+def _own(obj):
+    #whether obj is one of the index's own cwdc_ modules or defined in one. a
+    #module run as a script, e.g. python cwdc_idx.py, is named __main__
+    mod = obj.__name__ if isinstance(obj,types.ModuleType) else getattr(obj,'__module__',None)
+    return(isinstance(mod,str) and (mod.startswith('cwdc_') or mod == '__main__'))
+
+def code_closure(func):
+    '''
+    functions and classes whose code a function depends on
+
+    the names each code object refers to are looked up in its module's globals
+    and in the cwdc_ modules it imports, following functions, classes and
+    instances of classes defined in cwdc_ modules or in the script being run. upper case module constants
+    referred to along the way, such as column lists, are returned as
+    (name, value) pairs.
+
+    Returns
+    -------
+    list of functions, classes and constants, func first
+
+    '''
+    out = []
+    seen = set()
+
+    def visit(obj):
+        obj = inspect.unwrap(obj) if callable(obj) else obj
+        if isinstance(obj,(staticmethod,classmethod)):
+            obj = obj.__func__
+        if isinstance(obj,property):
+            for f in (obj.fget,obj.fset,obj.fdel):
+                if f is not None:
+                    visit(f)
+            return
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+
+        if isinstance(obj,types.FunctionType):
+            out.append(obj)
+            walk(obj.__code__,obj.__globals__)
+        elif isinstance(obj,type):
+            out.append(obj)
+            for k, v in sorted(vars(obj).items()):
+                if isinstance(v,(types.FunctionType,staticmethod,classmethod,property)):
+                    visit(v)
+        elif not isinstance(obj,types.ModuleType):
+            visit(type(obj))
+
+    def walk(code, namespace):
+        mods = [v for v in (namespace.get(n) for n in code.co_names) if isinstance(v,types.ModuleType) and _own(v)]
+        for n in code.co_names:
+            for space in [namespace] + [vars(m) for m in mods]:
+                if n not in space:
+                    continue
+                v = space[n]
+                if n.isupper() and not callable(v):
+                    if (n,id(v)) not in seen:
+                        seen.add((n,id(v)))
+                        out.append((n,v))
+                elif _own(v) and not isinstance(v,types.ModuleType):
+                    visit(v)
+        for c in code.co_consts:
+            if isinstance(c,types.CodeType):
+                walk(c,namespace)
+
+    visit(func)
+    return(out)
+
+#digests by function, the code of loaded functions does not change during a run
+_digests = {}
+
+def code_digest(func):
+    '''
+    sha256 of a function's bytecode, names and constants along with those of every
+    function, class and constant in its code_closure
+    '''
+    func = inspect.unwrap(func)
+    try:
+        return(_digests[func])
+    except (KeyError, TypeError):
+        pass
+
+    h = hashlib.sha256()
+
+    def walk(code):
+        #names cover attributes and methods, e.g. str.upper against str.lower,
+        #which compile to the same bytecode
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for c in code.co_consts:
+            if isinstance(c,types.CodeType):
+                walk(c)
+            else:
+                h.update(repr(c).encode())
+
+    for obj in code_closure(func):
+        if isinstance(obj,tuple):
+            #reprs of functions and objects held in constants carry their address
+            h.update(re.sub(r' at 0x[0-9a-fA-F]+','',repr(obj)).encode())
+        else:
+            h.update(obj.__qualname__.encode())
+            if isinstance(obj,types.FunctionType):
+                walk(obj.__code__)
+                h.update(re.sub(r' at 0x[0-9a-fA-F]+','',repr((obj.__defaults__,obj.__kwdefaults__))).encode())
+    out = h.hexdigest()
+    try:
+        _digests[func] = out
+    except TypeError:
+        pass
+    return(out)
+
+class ArtifactStore():
+    '''
+    stage outputs on disk keyed by everything that determines them
+
+    a stage's key hashes its code, arguments, input file contents and the
+    digests of the outputs of the stages it depends on. a stage whose key is
+    already stored is loaded instead of run, and because a rerun stage whose
+    output changes gets a new digest, every stage downstream of it gets a new
+    key too. a rerun that reproduces the same output leaves downstream stages
+    cached.
+
+    Parameters
+    ----------
+    root : callable, optional
+        returns the directory input file names are relative to.
+    path : str, optional
+        directory for the artifacts, None disables the store.
+    memo : cwdc_store.Memo, optional
+        supplies the file fingerprints.
+
+    '''
+    def __init__(self, root=None, path=None, memo=None):
+        self.root = root or (lambda: '')
+        self.path = path
+        self.memo = memo
+        self.lock = threading.Lock()
+
+    def _file(self, path):
+        if self.memo is not None:
+            return(self.memo.fingerprint(path))
+        st = os.stat(path)
+        return(json.dumps([path,st.st_size,st.st_mtime_ns]))
+
+    def fingerprint(self, path):
+        '''
+        content hash of a file, or of every file under a directory
+        '''
+        path = os.path.join(self.root(),path)
+        if os.path.isfile(path):
+            return(self._file(path))
+        if not os.path.isdir(path):
+            return('missing')
+
+        h = hashlib.sha256()
+        for d, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                full = os.path.join(d,f)
+                h.update(os.path.relpath(full,path).encode())
+                h.update(self._file(full).encode())
+        return(h.hexdigest())
+
+    def key(self, stage, digests):
+        '''
+        artifact key of a stage given the output digests of its dependencies
+        '''
+        h = hashlib.sha256()
+        h.update(stage.name.encode())
+        for f in (stage.func,) + stage.uses:
+            h.update(code_digest(f).encode())
+        h.update(repr(stage.args).encode())
+        for i in stage.inputs:
+            h.update(self.fingerprint(i).encode())
+        for d in digests:
+            h.update(d.encode())
+        return(h.hexdigest()[:32])
+
+    def _name(self, name, key):
+        return(os.path.join(self.path,'{}-{}'.format(name,key)))
+
+    def digest(self, name, key):
+        '''
+        digest of a stored artifact, None when the key is not stored
+        '''
+        try:
+            with open(self._name(name,key)+'.json') as f:
+                return(json.load(f)['digest'])
+        except (OSError, ValueError, KeyError):
+            return(None)
+
+    def load(self, name, key):
+        '''
+        stored output of a stage
+        '''
+        with open(self._name(name,key)+'.pkl','rb') as f:
+            return(pickle.load(f))
+
+    def save(self, name, key, value):
+        '''
+        store a stage's output, returning its digest
+        '''
+        os.makedirs(self.path,exist_ok=True)
+        body = pickle.dumps(value,protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(body).hexdigest()
+        dest = self._name(name,key)
+        tmp = '{}.{}.tmp'.format(dest,threading.get_ident())
+
+        with open(tmp,'wb') as f:
+            f.write(body)
+        os.replace(tmp,dest+'.pkl')
+        with open(tmp,'w') as f:
+            json.dump({'stage':name,'digest':digest},f)
+        os.replace(tmp,dest+'.json')
+        return(digest)
+
+class _Stored():
+    #placeholder for a stored output, loaded only when something needs it
+    def __init__(self, store, name, key):
+        self.store = store
+        self.name = name
+        self.key = key
+
+    def load(self):
+        return(self.store.load(self.name,self.key))
+
+def _value(out):
+    return(out.load() if isinstance(out,_Stored) else out)
+
+class Pipeline():
+    '''
+    stages and their dependencies, run as soon as their dependencies finish
+
+    io stages share a thread pool and cpu stages a process pool, so the run
+    takes as long as its slowest chain of dependent stages rather than the sum
+    of every stage. a cpu stage's dataframe comes back as an arrow table and is
+    rebuilt in the parent with to_pandas. with an artifact store, stages whose
+    key is already stored are loaded rather than run. every stage run is
+    measured, see measure, and the measurements of the last run are kept in
+    records.
+
+    Parameters
+    ----------
+    threads : int, optional
+        io stages run at once.
+    processes : int, optional
+        cpu stages run at once, defaults to the number of cpus.
+    init : callable, optional
+        run in each worker process before its first stage, e.g. to copy the
+        parent's configuration.
+    initargs : tuple, optional
+        arguments of init.
+    store : ArtifactStore, optional
+        store for stage outputs.
+    profile : str, optional
+        directory for a cProfile dump of every stage run.
+    counters : callable, optional
+        cumulative counts recorded per io stage, see measure.
+
+    '''
+    def __init__(self, threads=8, processes=None, init=None, initargs=(), store=None, profile=None, counters=None):
+        self.threads = threads
+        self.processes = processes
+        self.init = init
+        self.initargs = initargs
+        self.store = store
+        self.profile = profile
+        self.counters = counters
+        self.stages = {}
+        self.records = {}
+
+    def add(self, name, func, *args, deps=(), after=(), kind='io', inputs=(), uses=(), cache=True):
+        '''
+        add a stage, see Stage for the arguments
+
+        Returns
+        -------
+        Stage
+
+        '''
+        if name in self.stages:
+            raise ValueError('duplicate stage {}'.format(name))
+        self.stages[name] = Stage(name,func,args,deps,after,kind,inputs,uses,cache)
+        return(self.stages[name])
+
+    def order(self, targets=None):
+        '''
+        stage names needed for targets, every stage after its dependencies
+
+        Parameters
+        ----------
+        targets : list, optional
+            stages wanted, all stages when None.
+
+        Returns
+        -------
+        list of stage names
+
+        '''
+        out = []
+        state = {}
+
+        def visit(name, path):
+            if name not in self.stages:
+                raise KeyError('unknown stage {}'.format(name))
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'open':
+                raise ValueError('stage cycle through {}'.format(' -> '.join(path + [name])))
+            state[name] = 'open'
+            for d in self.stages[name].requires:
+                visit(d,path + [name])
+            state[name] = 'done'
+            out.append(name)
+
+        for name in (self.stages if targets is None else targets):
+            visit(name,[])
+        return(out)
+
+    def downstream(self, names):
+        '''
+        the named stages and every stage depending on them, directly or not
+        '''
+        out = set(names)
+        for name in self.order():
+            if any(d in out for d in self.stages[name].requires):
+                out.add(name)
+        return(out)
+
+    def run(self, targets=None, force=()):
+        '''
+        run the stages needed for targets
+
+        Parameters
+        ----------
+        targets : list, optional
+            stages wanted, all stages when None.
+        force : list, optional
+            stages run even when their output is stored.
+
+        Returns
+        -------
+        dict of stage name to result for every target
+
+        '''
+        todo = self.order(targets)
+        self.records = {}
+        wanted = list(todo) if targets is None else list(targets)
+        store = self.store if self.store is not None and self.store.path is not None else None
+        results = {}
+        digests = {}
+        keys = {}
+        pending = {}
+
+        with contextlib.ExitStack() as stack:
+            threads = stack.enter_context(ThreadPoolExecutor(self.threads))
+            procs = None
+            if any(self.stages[n].kind == 'cpu' for n in todo):
+                procs = stack.enter_context(ProcessPoolExecutor(self.processes,initializer=self.init,initargs=self.initargs))
+
+            def submit():
+                ready = True
+                while ready:
+                    ready = False
+                    for name in list(todo):
+                        s = self.stages[name]
+                        if not all(d in results for d in s.requires):
+                            continue
+                        todo.remove(name)
+                        ready = True
+
+                        if store is not None:
+                            keys[name] = store.key(s,[digests[d] for d in s.requires])
+                            stored = store.digest(name,keys[name]) if s.cache and name not in force else None
+                            if stored is not None:
+                                results[name] = _Stored(store,name,keys[name])
+                                digests[name] = stored
+                                self.records[name] = {'stage':name,'kind':s.kind,'cached':True}
+                                continue
+
+                        args = s.args + tuple(_value(results[d]) for d in s.deps)
+                        if s.kind == 'cpu':
+                            pending[procs.submit(_call_cpu,name,s.func,args,self.profile)] = name
+                        else:
+                            pending[threads.submit(measure,name,s.func,args,self.profile,self.counters)] = name
+
+            submit()
+            while pending:
+                done, _ = wait(pending,return_when=FIRST_COMPLETED)
+                for f in done:
+                    name = pending.pop(f)
+                    try:
+                        out = f.result()
+                    except BaseException:
+                        for p in pending:
+                            p.cancel()
+                        raise
+                    out, rec = out
+                    out = _from_arrow(out) if self.stages[name].kind == 'cpu' else out
+                    self.records[name] = dict({'stage':name,'kind':self.stages[name].kind,'cached':False},**rec)
+                    results[name] = out
+                    if store is not None:
+                        #uncached stages never match, so whatever depends on them reruns
+                        digests[name] = store.save(name,keys[name],out) if self.stages[name].cache else os.urandom(16).hex()
+                submit()
+
+        return({name:_value(results[name]) for name in wanted})
+
+def summary(records):
+    '''
+    text table of stage measurements
+
+    Parameters
+    ----------
+    records : list
+        measurement dicts as kept in Pipeline.records.
+
+    Returns
+    -------
+    str
+
+    '''
+    def mb(v):
+        return('' if v is None else '{:.1f}'.format(v / 2**20))
+
+    head = ['stage','kind','wall s','cpu s','peak MB','rows in','rows out','read MB','http','net MB']
+    rows = []
+    for r in records:
+        if r.get('cached'):
+            rows.append([r['stage'],r['kind'],'cached','','','','','','',''])
+            continue
+        rows.append([r['stage'],r['kind'],'{:.2f}'.format(r['wall_seconds']),'{:.2f}'.format(r['cpu_seconds']),
+                     mb(r['peak_rss']),str(r['rows_in']),str(r['rows_out']),mb(r['bytes_read']),
+                     str(r.get('http_calls','')),mb(r.get('http_bytes'))])
+
+    width = [max(len(str(x)) for x in col) for col in zip(head,*rows)]
+    lines = ['  '.join(str(x).ljust(w) for x, w in zip(row,width)) for row in [head] + rows]
+    lines.insert(1,'  '.join('-'*w for w in width))
+    return('\n'.join(lines))
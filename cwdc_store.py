@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+local on disk stores used to avoid repeating work between runs
+
+@author: Gabriel Moss
+"""
+import functools
+import hashlib
+import inspect
+import json
+import operator
+import os
+import pickle
+import threading
+import pandas as pd
+import cwdc_stages
+
+class Journal():
+    '''
+    append only jsonl checkpoint of completed units of work
+
+    each line holds one unit's key and payload and is flushed to disk as soon as
+    it is recorded, so a run that dies part way can be restarted, skip every
+    unit already journaled and finalize from the journal. a line cut short by a
+    crash is ignored on reopen.
+
+    used as a context manager the journal is closed however the block exits and
+    deleted only when it exits cleanly, so a failed scrape keeps its checkpoint.
+
+    Parameters
+    ----------
+    path : str
+        path of the journal file, created if it does not exist.
+
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.offsets = {}
+
+        os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+
+        #index the byte offset of every complete line, a record is only complete
+        #once its newline is written
+        if os.path.exists(path):
+            with open(path,'rb') as f:
+                pos = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        self.offsets[json.loads(line)['key']] = pos
+                    except (ValueError, KeyError):
+                        break
+                    pos += len(line)
+
+            #drop a torn final line so new records start on a clean line
+            with open(path,'r+b') as f:
+                f.truncate(pos)
+
+        self.file = open(path,'ab')
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(remove=exc_type is None)
+
+    def __contains__(self, key):
+        return(key in self.offsets)
+
+    def __len__(self):
+        return(len(self.offsets))
+
+    def get(self, key):
+        '''
+        payload recorded for key
+        '''
+        with open(self.path,'rb') as f:
+            f.seek(self.offsets[key])
+            return(json.loads(f.readline())['payload'])
+
+    def record(self, key, payload):
+        '''
+        append a completed unit and force it to disk
+        '''
+        line = (json.dumps({'key':key,'payload':payload},separators=(',',':')) + '\n').encode()
+        with self.lock:
+            self.file.seek(0,os.SEEK_END)
+            pos = self.file.tell()
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.offsets[key] = pos
+
+    def records(self):
+        '''
+        iterate over (key, payload) for every journaled unit in the order recorded
+        '''
+        with open(self.path,'rb') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                yield(rec['key'],rec['payload'])
+
+    def close(self, remove=False):
+        '''
+        close the journal, deleting it once its stage has finished
+        '''
+        self.file.close()
+        if remove:
+            os.remove(self.path)
+
+def _atomic_dump(obj, path):
+    tmp = '{}.{}.tmp'.format(path,threading.get_ident())
+    with open(tmp,'wb') as f:
+        pickle.dump(obj,f,protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp,path)
+
+class Memo():
+    '''
+    cache of derived results keyed on the content of their input files
+
+    results are held in memory for the rest of the run and, once path is set,
+    pickled to disk so later runs reuse them until an input file or the
+    function's code changes. file hashes are themselves remembered by size and
+    modification time so large inputs are only rehashed when they change.
+
+    Parameters
+    ----------
+    root : callable, optional
+        returns the directory input file names are relative to.
+    path : str, optional
+        directory for the persisted results, None keeps them in memory only.
+
+    '''
+    def __init__(self, root=None, path=None):
+        self.root = root or (lambda: '')
+        self.path = path
+        self.lock = threading.RLock()
+        self.results = {}
+        self.hashes = {}
+
+    def fingerprint(self, path):
+        '''
+        sha256 of a file's content, rehashed only when its size or mtime changes
+        '''
+        st = os.stat(path)
+        stamp = [st.st_size,st.st_mtime_ns]
+
+        with self.lock:
+            if not self.hashes and self.path is not None and os.path.exists(os.path.join(self.path,'fingerprints.json')):
+                with open(os.path.join(self.path,'fingerprints.json')) as f:
+                    self.hashes = json.load(f)
+            if path in self.hashes and self.hashes[path][0] == stamp:
+                return(self.hashes[path][1])
+
+        h = hashlib.sha256()
+        with open(path,'rb') as f:
+            for block in iter(lambda: f.read(2**20),b''):
+                h.update(block)
+
+        with self.lock:
+            self.hashes[path] = [stamp,h.hexdigest()]
+            if self.path is not None:
+                os.makedirs(self.path,exist_ok=True)
+                tmp = os.path.join(self.path,'fingerprints.json.tmp')
+                with open(tmp,'w') as f:
+                    json.dump(self.hashes,f)
+                os.replace(tmp,os.path.join(self.path,'fingerprints.json'))
+        return(h.hexdigest())
+
+    def key(self, func, inputs, args=()):
+        '''
+        hash of a function's code, arguments and input file contents
+
+        args are the call's (name, value) argument pairs.
+
+        the code hashed is that of cwdc_stages.code_digest, covering constants
+        and every helper the function calls.
+        '''
+        h = hashlib.sha256()
+        h.update(func.__qualname__.encode())
+        h.update(cwdc_stages.code_digest(func).encode())
+        h.update(repr(args).encode())
+        for i in inputs:
+            h.update(self.fingerprint(os.path.join(self.root(),i() if callable(i) else i)).encode())
+        return(h.hexdigest())
+
+    def cached(self, *inputs):
+        '''
+        decorator caching a function's result on the files it reads
+
+        Parameters
+        ----------
+        *inputs : str or callable
+            input file names, relative to root, or callables returning one when
+            the name depends on settings made after import.
+
+        '''
+        def wrap(func):
+            sig = inspect.signature(func)
+
+            @functools.wraps(func)
+            def inner(*args, **kwargs):
+                #bind to the signature so positional, keyword and default
+                #spellings of the same call share a key
+                bound = sig.bind(*args,**kwargs)
+                bound.apply_defaults()
+                key = self.key(func,inputs,tuple(bound.arguments.items()))
+                with self.lock:
+                    if key in self.results:
+                        return(self.results[key])
+
+                disk = None if self.path is None else os.path.join(self.path,'{}-{}.pkl'.format(func.__name__,key[:16]))
+                if disk is not None and os.path.exists(disk):
+                    with open(disk,'rb') as f:
+                        out = pickle.load(f)
+                else:
+                    out = func(*bound.args,**bound.kwargs)
+                    if disk is not None:
+                        os.makedirs(self.path,exist_ok=True)
+                        _atomic_dump(out,disk)
+
+                with self.lock:
+                    self.results[key] = out
+                return(out)
+            return(inner)
+        return(wrap)
+
+#pandas equivalents of the pyarrow filter operators
+OPS = {
+    '==':operator.eq,
+    '!=':operator.ne,
+    '<':operator.lt,
+    '<=':operator.le,
+    '>':operator.gt,
+    '>=':operator.ge,
+    'in':lambda a, b: a.isin(b),
+    'not in':lambda a, b: ~a.isin(b)
+    }
+
+class ColumnarCache():
+    '''
+    parquet copies of excel sheets, converted once and read with pushdown
+
+    each sheet is parsed with pandas the first time it is read and written to a
+    parquet file keyed by the workbook path, sheet and read options. the copy is
+    rebuilt when the workbook's content hash changes. later reads load only the
+    requested columns and row groups matching filters. object columns mixing
+    numbers and strings, such as suppression markers in numeric fields, are
+    stored json encoded and decoded on read so values come back unchanged.
+    with no path set reads go straight to excel. requires pyarrow.
+
+    Parameters
+    ----------
+    path : str, optional
+        directory for the parquet copies.
+    memo : Memo, optional
+        supplies the file fingerprints.
+
+    '''
+    def __init__(self, path=None, memo=None):
+        self.path = path
+        self.memo = memo or Memo()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _mixed(col):
+        kinds = set()
+        for v in col:
+            if v is None or (isinstance(v,float) and v != v):
+                continue
+            kinds.add(str if isinstance(v,str) else 'other')
+            if len(kinds) > 1:
+                return(True)
+        return(False)
+
+    def _write(self, frame, dest):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        #parquet needs unique string names, keep the originals in the metadata
+        names = list(frame.columns)
+        frame = frame.copy()
+        frame.columns = [str(i) for i in range(len(names))]
+
+        mixed = []
+        for c in frame:
+            if frame[c].dtype == object and self._mixed(frame[c]):
+                frame[c] = [json.dumps(v,default=str) for v in frame[c]]
+                mixed.append(c)
+
+        table = pa.Table.from_pandas(frame,preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[b'cwdc'] = json.dumps({'names':names,'mixed':mixed},default=str).encode()
+
+        tmp = '{}.{}.tmp'.format(dest,threading.get_ident())
+        pq.write_table(table.replace_schema_metadata(meta),tmp,row_group_size=2**16)
+        os.replace(tmp,dest)
+
+    def read_excel(self, io, sheet_name=0, columns=None, filters=None, **kwargs):
+        '''
+        read an excel sheet through its parquet copy
+
+        Parameters
+        ----------
+        io : str
+            path to the workbook.
+        sheet_name : str or int, optional
+            sheet to read.
+        columns : list, optional
+            columns to load, all when None.
+        filters : list, optional
+            (column, op, value) tuples in pyarrow's filter syntax, all of which
+            must hold for a row to be returned.
+        **kwargs
+            passed to pandas.read_excel when the sheet is converted.
+
+        Returns
+        -------
+        dataframe
+
+        '''
+        if self.path is None:
+            frame = pd.read_excel(io,sheet_name=sheet_name,**kwargs)
+            for c, op, v in filters or []:
+                frame = frame[OPS[op](frame[c],v)]
+            return(frame if columns is None else frame[columns])
+
+        import pyarrow.parquet as pq
+
+        key = hashlib.sha256(repr((os.path.abspath(io),sheet_name,sorted(kwargs.items()))).encode()).hexdigest()[:32]
+        dest = os.path.join(self.path,key+'.parquet')
+        stamp = os.path.join(self.path,key+'.json')
+        fp = self.memo.fingerprint(io)
+
+        with self.lock:
+            fresh = False
+            if os.path.exists(dest) and os.path.exists(stamp):
+                with open(stamp) as f:
+                    fresh = json.load(f)['fingerprint'] == fp
+            if not fresh:
+                os.makedirs(self.path,exist_ok=True)
+                self._write(pd.read_excel(io,sheet_name=sheet_name,**kwargs),dest)
+                with open(stamp,'w') as f:
+                    json.dump({'source':io,'sheet':sheet_name,'fingerprint':fp},f)
+
+        meta = json.loads(pq.read_schema(dest).metadata[b'cwdc'])
+        names = meta['names']
+        lookup = {}
+        for i, n in enumerate(names):
+            lookup.setdefault(n if not isinstance(n,list) else tuple(n),str(i))
+
+        cols = None if columns is None else [lookup[c] for c in columns]
+        flt = None
+        if filters:
+            flt = [(lookup[c],op,[json.dumps(i) for i in v] if op == 'in' and lookup[c] in meta['mixed'] else
+                    json.dumps(v) if lookup[c] in meta['mixed'] else v) for c, op, v in filters]
+
+        frame = pq.read_table(dest,columns=cols,filters=flt).to_pandas()
+        for c in frame:
+            if c in meta['mixed']:
+                frame[c] = pd.Series([json.loads(v) for v in frame[c]],index=frame.index,dtype=object)
+        frame.columns = [names[int(c)] for c in frame]
+
+        return(frame)
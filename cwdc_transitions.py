@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+sparse occupation transition graph built from the brookings transition data
+
+@author: Gabriel Moss
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+class TransitionGraph():
+    '''
+    occupations as nodes and one step transitions as weighted edges
+
+    transition probabilities are held in a sparse matrix and median wages per
+    occupation in a vector, so k step pathways are found with k - 1 sparse
+    matrix products instead of reading precomputed multi step files.
+
+    Parameters
+    ----------
+    codes : array
+        occupation code of each node.
+    prob : scipy.sparse matrix
+        n x n matrix of transition probabilities, 1 for every observed
+        transition when the data has no probability column.
+    wage : array
+        median hourly wage of each node, nan where unknown.
+
+    '''
+    def __init__(self, codes, prob, wage):
+        self.codes = np.asarray(codes)
+        self.prob = sp.csr_matrix(prob)
+        self.wage = np.asarray(wage,dtype=np.float64)
+
+    @classmethod
+    def read_csv(cls, path, src='occ_a', dst='occ_b', src_wage='h_median_a', dst_wage='h_median_b',
+                 prob='transition_share', chunksize=10**6):
+        '''
+        build the graph from a one step transition file
+
+        only the five needed columns are read, in chunks, with occupation codes
+        as categories and numbers as float32.
+
+        Parameters
+        ----------
+        path : str
+            path to the transition csv.
+        src, dst : str, optional
+            columns holding the starting and ending occupation.
+        src_wage, dst_wage : str, optional
+            columns holding the median hourly wage of each occupation.
+        prob : str, optional
+            column holding the transition probability, ignored when the file
+            does not have it.
+        chunksize : int, optional
+            rows read at a time.
+
+        Returns
+        -------
+        TransitionGraph
+
+        '''
+        header = pd.read_csv(path,nrows=0).columns
+        prob = prob if prob in header else None
+        cols = [src,dst,src_wage,dst_wage] + ([prob] if prob else [])
+        dtype = {src:'category',dst:'category',src_wage:'float32',dst_wage:'float32'}
+        if prob:
+            dtype[prob] = 'float32'
+
+        index = {}
+        rows, cols_, vals = [], [], []
+        wage_sum, wage_n = [], []
+
+        def ids(col):
+            #map this chunk's categories onto node ids shared by all chunks
+            cats = col.cat.categories
+            lookup = np.array([index.setdefault(c,len(index)) for c in cats],dtype=np.int64)
+            codes = col.cat.codes.values
+            return(np.where(codes >= 0,lookup[np.maximum(codes,0)] if len(lookup) else -1,-1))
+
+        for chunk in pd.read_csv(path,usecols=cols,dtype=dtype,chunksize=chunksize):
+            a = ids(chunk[src])
+            b = ids(chunk[dst])
+            ok = (a >= 0) & (b >= 0)
+            rows.append(a[ok])
+            cols_.append(b[ok])
+            vals.append(chunk[prob].values[ok] if prob else np.ones(ok.sum(),dtype=np.float32))
+
+            #accumulate wages per node to average once every chunk is read
+            n = len(index)
+            for node, w in ((a,chunk[src_wage].values),(b,chunk[dst_wage].values)):
+                good = (node >= 0) & ~np.isnan(w)
+                wage_sum.append(np.bincount(node[good],weights=w[good],minlength=n))
+                wage_n.append(np.bincount(node[good],minlength=n))
+
+        n = len(index)
+        total = np.zeros(n)
+        count = np.zeros(n)
+        for s, c in zip(wage_sum,wage_n):
+            total[:len(s)] += s
+            count[:len(c)] += c
+
+        rows = np.concatenate(rows) if rows else np.zeros(0,dtype=np.int64)
+        cols_ = np.concatenate(cols_) if cols_ else np.zeros(0,dtype=np.int64)
+        vals = np.concatenate(vals).astype(np.float64) if vals else np.zeros(0)
+
+        #duplicate pairs are averaged, self transitions are dropped
+        keep = rows != cols_
+        mat = sp.coo_matrix((vals[keep],(rows[keep],cols_[keep])),shape=(n,n)).tocsr()
+        mat.sum_duplicates()
+        dup = sp.coo_matrix((np.ones(keep.sum()),(rows[keep],cols_[keep])),shape=(n,n)).tocsr()
+        mat.data /= np.maximum(dup.data,1)
+
+        codes = np.empty(n,dtype=object)
+        for c, i in index.items():
+            codes[i] = c
+
+        with np.errstate(invalid='ignore'):
+            return(cls(codes,mat,total / count))
+
+    def adjacency(self, min_prob=0.0, monotone=False):
+        '''
+        edges allowed on a pathway
+
+        Parameters
+        ----------
+        min_prob : float, optional
+            drop transitions less likely than this.
+        monotone : bool, optional
+            drop transitions into a lower paying occupation.
+
+        Returns
+        -------
+        scipy.sparse csr matrix
+
+        '''
+        a = self.prob.tocoo()
+        keep = a.data >= min_prob
+        if monotone:
+            keep &= self.wage[a.col] >= self.wage[a.row]
+        return(sp.csr_matrix((a.data[keep],(a.row[keep],a.col[keep])),shape=a.shape))
+
+    def paths(self, k=2, sources=None, min_prob=0.0, min_path_prob=0.0, monotone=False, wage_gain=True):
+        '''
+        occupation pairs connected by a pathway of 1 to k transitions
+
+        Parameters
+        ----------
+        k : int, optional
+            most transitions on a pathway.
+        sources : list, optional
+            starting occupations, all occupations when None.
+        min_prob : float, optional
+            drop single transitions less likely than this.
+        min_path_prob : float, optional
+            drop a source and occupation pair once the summed probability of
+            the pathways between them after some step falls below this.
+        monotone : bool, optional
+            require every transition on a pathway to keep or raise wages.
+        wage_gain : bool, optional
+            require the ending occupation to pay at least the starting one.
+
+        Returns
+        -------
+        dataframe of source, target and the summed probability of the pathways
+        between them
+
+        '''
+        adj = self.adjacency(min_prob,monotone)
+
+        start = np.arange(len(self.codes))
+        if sources is not None:
+            start = np.flatnonzero(np.isin(self.codes.astype(str),np.asarray(sources).astype(str)))
+
+        step = adj[start]
+        reach = step.copy()
+        for i in range(1,k):
+            step = step @ adj
+            if min_path_prob:
+                step.data[step.data < min_path_prob] = 0
+                step.eliminate_zeros()
+            reach = reach + step
+
+        reach = reach.tocoo()
+        src = start[reach.row]
+        keep = src != reach.col
+        if wage_gain:
+            keep &= self.wage[reach.col] >= self.wage[src]
+
+        return(pd.DataFrame({'source':self.codes[src[keep]],
+                             'target':self.codes[reach.col[keep]],
+                             'prob':reach.data[keep]}))
+
+    def destinations(self, k=2, **kwargs):
+        '''
+        distinct occupations reachable under the constraints taken by paths
+        '''
+        return(self.paths(k,**kwargs)['target'].unique())
@@ -0,0 +1,106 @@
+import importlib
+import inspect
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+import cwdc_stages
+import cwdc_store
+
+HELPER = '''
+LIMIT = {limit}
+
+def helper(x):
+    return(x + {step})
+
+def loader(x):
+    return(helper(x) * LIMIT)
+'''
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    #a throwaway cwdc_ module whose source the tests rewrite
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / 'cwdc_fixture_mod.py'
+
+    def load(limit=2, step=1):
+        path.write_text(HELPER.format(limit=limit,step=step))
+        sys.modules.pop('cwdc_fixture_mod',None)
+        importlib.invalidate_caches()
+        return(importlib.import_module('cwdc_fixture_mod'))
+    yield load
+    sys.modules.pop('cwdc_fixture_mod',None)
+
+def key(store, func, args=(), inputs=(), digests=()):
+    return(store.key(cwdc_stages.Stage('s',func,args,inputs=inputs),digests))
+
+def test_key_follows_called_helper(module):
+    store = cwdc_stages.ArtifactStore()
+    before = key(store,module().loader)
+    assert key(store,module(step=2).loader) != before
+    assert key(store,module().loader) == before
+
+def test_key_follows_module_constants(module):
+    store = cwdc_stages.ArtifactStore()
+    assert key(store,module(limit=2).loader) != key(store,module(limit=3).loader)
+
+def test_key_follows_args_inputs_and_upstream(tmp_path):
+    (tmp_path / 'in.csv').write_text('a\n1\n')
+    store = cwdc_stages.ArtifactStore(root=lambda: str(tmp_path),memo=cwdc_store.Memo())
+    base = key(store,len,(1,),['in.csv'],['d1'])
+
+    assert key(store,len,(2,),['in.csv'],['d1']) != base
+    assert key(store,len,(1,),['in.csv'],['d2']) != base
+    (tmp_path / 'in.csv').write_text('a\n2\n')
+    assert key(store,len,(1,),['in.csv'],['d1']) != base
+
+def test_save_load_and_early_cutoff(tmp_path):
+    store = cwdc_stages.ArtifactStore(path=str(tmp_path))
+    frame = pd.DataFrame({'a':[1,2]})
+    d1 = store.save('s','k1',frame)
+    assert store.digest('s','k1') == d1
+    pd.testing.assert_frame_equal(store.load('s','k1'),frame)
+
+    #the same output under a new key has the same digest, so downstream keys hold
+    assert store.save('s','k2',frame.copy()) == d1
+    assert store.digest('s','missing') is None
+
+def test_every_stage_helper_is_in_its_closure(tmp_path):
+    import cwdc_idx
+    cwdc_idx.configure(str(tmp_path),'off')
+    p = cwdc_idx.stages()
+    for name, s in p.stages.items():
+        closure = set()
+        for f in (s.func,) + s.uses:
+            closure.update(x for x in cwdc_stages.code_closure(f) if isinstance(x,types.FunctionType))
+        called = [getattr(cwdc_idx,n) for n in s.func.__code__.co_names
+                  if isinstance(getattr(cwdc_idx,n,None),types.FunctionType)
+                  and getattr(cwdc_idx,n).__module__.startswith('cwdc_')]
+        missing = [f.__name__ for f in called if inspect.unwrap(f) not in closure]
+        assert not missing, '{} does not cover {}'.format(name,missing)
+
+def script(source):
+    #run source as python cwdc_x.py would, its functions defined in __main__
+    mod = types.ModuleType('__main__')
+    exec(compile(source,'script.py','exec'),vars(mod))
+    return(mod)
+
+def test_closure_follows_functions_of_a_script():
+    mod = script(HELPER.format(limit=2,step=1))
+    assert mod.loader.__module__ == '__main__'
+    assert [getattr(i,'__name__',i) for i in cwdc_stages.code_closure(mod.loader)] == ['loader','helper',('LIMIT',2)]
+    assert cwdc_stages.code_digest(mod.loader) != cwdc_stages.code_digest(script(HELPER.format(limit=2,step=3)).loader)
+
+def test_closure_of_the_index_run_as_a_script():
+    with open(cwdc_stages.__file__.replace('cwdc_stages','cwdc_idx'),encoding='utf-8') as f:
+        source = f.read().split("\nif __name__ == '__main__':")[0]
+    mod = script(source)
+    names = [getattr(i,'__name__',None) for i in cwdc_stages.code_closure(mod.ipeds)]
+    assert 'in_demand_cips' in names and 'journal' in names and 'in_demand_occupations' in names
+
+def test_digest_follows_attribute_names():
+    upper = script('def f(x):\n    return(x.upper())\n').f
+    lower = script('def f(x):\n    return(x.lower())\n').f
+    assert cwdc_stages.code_digest(upper) != cwdc_stages.code_digest(lower)
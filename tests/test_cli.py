@@ -0,0 +1,57 @@
+import pytest
+
+import cwdc_http
+import cwdc_idx
+import cwdc_replay
+import cwdc_stages
+
+@pytest.fixture
+def configured(tmp_path):
+    yield str(tmp_path)
+    cwdc_idx.configure(str(tmp_path),'off')
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    #a remote and a local stage in place of the index's stages
+    calls = []
+
+    def stages(**kwargs):
+        p = cwdc_stages.Pipeline(threads=2,store=cwdc_idx.artifacts)
+        p.add('acs',lambda: calls.append('acs') or 1)
+        p.add('census',lambda: calls.append('census') or 2)
+        return(p)
+    monkeypatch.setattr(cwdc_idx,'stages',stages)
+    return(calls)
+
+def test_refresh_reruns_remote_stages(configured, pipeline):
+    cwdc_idx.configure(configured,'use')
+    cwdc_idx.score(('acs','census'))
+    cwdc_idx.score(('acs','census'))
+    assert sorted(pipeline) == ['acs','census']
+
+    cwdc_idx.configure(configured,'refresh')
+    cwdc_idx.score(('acs','census'))
+    assert sorted(pipeline) == ['acs','acs','census']
+    assert cwdc_http.cache.ttls['census'] == 0
+
+@pytest.fixture
+def unrouted(monkeypatch):
+    #configure routes and records through module globals, restored afterwards
+    monkeypatch.setattr(cwdc_http,'base_urls',{})
+    monkeypatch.setattr(cwdc_http,'rates',dict(cwdc_http.rates))
+    monkeypatch.setattr(cwdc_http,'recorder',None)
+
+def test_record_then_replay(configured, unrouted, tmp_path):
+    upstream = cwdc_replay.FixtureStore(str(tmp_path / 'upstream'))
+    upstream.add('https://api.census.gov/data?get=NAME',cwdc_http._response('https://api.census.gov/data?get=NAME',200,
+                                                                          {'Content-Type':'application/json'},b'[["NAME"]]'))
+    server = cwdc_replay.ReplayServer(upstream).start()
+    try:
+        cwdc_idx.main([configured,'--list','--cache','off','--replay',server.url,'--record',str(tmp_path / 'recorded')])
+        r = cwdc_http.get('https://api.census.gov/data?get=NAME',source='census')
+    finally:
+        server.stop()
+
+    assert r.json() == [['NAME']] and server.counts['served'] == 1
+    recorded = cwdc_replay.FixtureStore(str(tmp_path / 'recorded')).get('https://api.census.gov/data?get=NAME')
+    assert recorded[0] == 200 and recorded[2] == b'[["NAME"]]'
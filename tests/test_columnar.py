@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+import cwdc_store
+
+pytest.importorskip('pyarrow')
+
+def _workbook(path, fips=(8001,8003,8005)):
+    pd.DataFrame({'fips':list(fips),'NAME':['Adams','Alamosa','Arapahoe'][:len(fips)],
+                  'jobs':[120,'Insf. Data',95][:len(fips)]}).to_excel(path,sheet_name='Data',index=False)
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+    read = pd.read_excel
+    monkeypatch.setattr(cwdc_store.pd,'read_excel',lambda *a, **k: calls.append(a) or read(*a,**k))
+    return(calls)
+
+def test_copy_matches_excel(tmp_path, reads):
+    book = str(tmp_path / 'book.xlsx')
+    _workbook(book)
+    direct = cwdc_store.ColumnarCache().read_excel(book,'Data')
+    cached = cwdc_store.ColumnarCache(str(tmp_path / 'col')).read_excel(book,'Data')
+
+    pd.testing.assert_frame_equal(cached,direct,check_dtype=False)
+    assert cached['jobs'].tolist() == [120,'Insf. Data',95]
+
+def test_columns_and_filters_pushed_down(tmp_path, reads):
+    book = str(tmp_path / 'book.xlsx')
+    _workbook(book)
+    cache = cwdc_store.ColumnarCache(str(tmp_path / 'col'))
+
+    frame = cache.read_excel(book,'Data',columns=['NAME','jobs'],filters=[('fips','>=',8003),('jobs','!=','Insf. Data')])
+    assert list(frame.columns) == ['NAME','jobs']
+    assert frame['NAME'].tolist() == ['Arapahoe']
+    assert cache.read_excel(book,'Data',filters=[('jobs','in',[120,95])])['fips'].tolist() == [8001,8005]
+    assert len(reads) == 1
+
+def test_converted_once_until_workbook_changes(tmp_path, reads):
+    book = str(tmp_path / 'book.xlsx')
+    _workbook(book)
+    cache = cwdc_store.ColumnarCache(str(tmp_path / 'col'))
+
+    cache.read_excel(book,'Data')
+    cwdc_store.ColumnarCache(str(tmp_path / 'col')).read_excel(book,'Data')
+    assert len(reads) == 1
+
+    _workbook(book,fips=(8001,8003))
+    assert cache.read_excel(book,'Data')['fips'].tolist() == [8001,8003]
+    assert len(reads) == 2
+
+def test_read_options_keyed_separately(tmp_path, reads):
+    book = str(tmp_path / 'book.xlsx')
+    _workbook(book)
+    cache = cwdc_store.ColumnarCache(str(tmp_path / 'col'))
+
+    assert cache.read_excel(book,'Data',dtype={'fips':str})['fips'].tolist() == ['8001','8003','8005']
+    assert cache.read_excel(book,'Data')['fips'].tolist() == [8001,8003,8005]
+    assert len(reads) == 2
@@ -0,0 +1,115 @@
+import types
+
+import numpy as np
+
+import cwdc_codes
+import cwdc_store
+
+def _store(tmp_path, path=None):
+    return(cwdc_codes.CrosswalkStore(root=lambda: str(tmp_path),path=path,memo=cwdc_store.Memo(root=lambda: str(tmp_path))))
+
+def _define(store, calls):
+    @store.define('soc_cip','pairs.csv')
+    def soc_cip():
+        calls.append(1)
+        with open(store.root() + '/pairs.csv') as f:
+            pairs = [line.strip().split(',') for line in f]
+        return(np.array([p[0] for p in pairs],dtype=object),np.array([p[1] or None for p in pairs],dtype=object))
+
+def test_both_directions_and_missing_pairs_dropped():
+    xw = cwdc_codes.Crosswalk.build(np.array(['111','111','222','333',None],dtype=object),
+                                    np.array(['a','b','b',None,'c'],dtype=object))
+    assert xw.targets(['111']).tolist() == ['a','b']
+    assert xw.sources(['b']).tolist() == ['111','222']
+    assert xw.targets(['333','999']).tolist() == []
+    src, dst = xw.pairs(['222','111'])
+    assert sorted(zip(src.tolist(),dst.tolist())) == [('111','a'),('111','b'),('222','b')]
+
+def test_numeric_codes_and_duplicates():
+    xw = cwdc_codes.Crosswalk.build([1,1,2,2],[10.0,10.0,20.0,np.nan])
+    assert xw.targets([1,2]).tolist() == [10.0,20.0]
+    assert len(xw.pairs()[0]) == 2
+    assert cwdc_codes.Vocab.build([3,1,2]).ids([2,5]).tolist() == [1,-1]
+
+def test_saved_crosswalk_memory_mapped(tmp_path):
+    xw = cwdc_codes.Crosswalk.build(['111','222'],['a','b'])
+    xw.save(str(tmp_path / 'xw'))
+    back = cwdc_codes.Crosswalk.load(str(tmp_path / 'xw'))
+    assert isinstance(back.fwd_ids,np.memmap)
+    assert back.targets(['222']).tolist() == ['b']
+
+def test_built_once_then_loaded_from_disk(tmp_path):
+    (tmp_path / 'pairs.csv').write_text('111,a\n111,b\n222,\n')
+    calls = []
+    store = _store(tmp_path,str(tmp_path / 'xw'))
+    _define(store,calls)
+
+    first = store['soc_cip']
+    assert store['soc_cip'] is first
+    assert first.targets(['111','222']).tolist() == ['a','b']
+
+    again = _store(tmp_path,str(tmp_path / 'xw'))
+    _define(again,calls)
+    assert again['soc_cip'].targets(['111']).tolist() == ['a','b']
+    assert len(calls) == 1
+
+def test_rebuilt_when_input_changes(tmp_path):
+    (tmp_path / 'pairs.csv').write_text('111,a\n')
+    calls = []
+    store = _store(tmp_path,str(tmp_path / 'xw'))
+    _define(store,calls)
+
+    assert store['soc_cip'].targets(['111']).tolist() == ['a']
+    (tmp_path / 'pairs.csv').write_text('111,b\n222,c\n')
+    assert store['soc_cip'].targets(['111']).tolist() == ['b']
+    assert len(calls) == 2
+
+def test_callable_input_resolved_when_keyed(tmp_path):
+    for d, text in [('v1','1'),('v2','22')]:
+        (tmp_path / d).mkdir()
+        (tmp_path / d / 'z.txt').write_text(text)
+    release = ['v1/']
+    store = _store(tmp_path)
+
+    @store.define('z',lambda: release[0] + 'z.txt')
+    def z():
+        return(np.array(['1']),np.array(['1']))
+
+    before = store._key('z')
+    release[0] = 'v2/'
+    assert store._key('z') != before
+
+DEFINITION = '''
+import numpy as np
+import cwdc_codes
+import cwdc_store
+
+store = cwdc_codes.CrosswalkStore(root=lambda: ROOT,path=ROOT + '/xw',memo=cwdc_store.Memo(root=lambda: ROOT))
+calls = []
+
+def column(name):
+    return(name.{case}())
+
+@store.define('pairs','pairs.csv')
+def pairs():
+    calls.append(1)
+    return(np.array([column('{column}')]),np.array(['1']))
+'''
+
+def test_rebuilt_when_definition_constants_or_helpers_change(tmp_path):
+    (tmp_path / 'pairs.csv').write_text('x')
+
+    def define(column='soc', case='upper'):
+        mod = types.ModuleType('__main__')
+        mod.ROOT = str(tmp_path)
+        exec(DEFINITION.format(column=column,case=case),vars(mod))
+        return(mod)
+
+    mod = define()
+    assert mod.store['pairs'].src.codes.tolist() == ['SOC']
+    mod = define()
+    assert mod.store['pairs'].src.codes.tolist() == ['SOC'] and mod.calls == []
+    mod = define(column='cip')
+    assert mod.store['pairs'].src.codes.tolist() == ['CIP'] and mod.calls == [1]
+    mod = define(column='cip',case='lower')
+    assert mod.store['pairs'].src.codes.tolist() == ['cip'] and mod.calls == [1]
@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+import pytest
+
+import cwdc_geo
+
+@pytest.fixture
+def zips():
+    #zcta like centroids, dense around two cities and sparse elsewhere
+    rng = np.random.default_rng(3)
+    lat = np.concatenate([rng.normal(39.7,0.15,150),rng.normal(38.8,0.1,80),rng.uniform(37,41,120)])
+    lon = np.concatenate([rng.normal(-105.0,0.15,150),rng.normal(-104.8,0.1,80),rng.uniform(-109,-102,120)])
+    return(lat,lon)
+
+@pytest.fixture
+def programs():
+    rng = np.random.default_rng(4)
+    return(rng.uniform(36.5,41.5,4000),rng.uniform(-109.5,-101.5,4000))
+
+def search(lat, lon, plat, plon, radius):
+    #ids of the programs a radius search around each centre returns
+    found = set()
+    for a, b in zip(lat,lon):
+        found.update(np.flatnonzero(cwdc_geo.haversine(a,b,plat,plon) <= radius))
+    return(found)
+
+@pytest.mark.parametrize('spread',[5,10,20])
+def test_every_point_is_covered(zips, spread):
+    lat, lon = zips
+    centres = cwdc_geo.plan_search_centres(lat,lon,spread)
+    d = cwdc_geo.haversine(lat[:,None],lon[:,None],lat[centres],lon[centres])
+    assert (d.min(axis=1) <= spread).all()
+    assert len(centres) < len(lat)
+
+@pytest.mark.parametrize('spread',[5,10,20])
+def test_planned_search_finds_the_same_programs(zips, programs, spread):
+    lat, lon = zips
+    plat, plon = programs
+    radius = 25
+    every = search(lat,lon,plat,plon,radius)
+
+    centres = cwdc_geo.plan_search_centres(lat,lon,spread)
+    found = np.asarray(sorted(search(lat[centres],lon[centres],plat,plon,radius + spread)))
+    kept = set(found[cwdc_geo.within(plat[found],plon[found],lat,lon,radius)])
+    assert kept == every
+
+def test_neighbours_match_brute_force(zips):
+    lat, lon = zips
+    d = cwdc_geo.haversine(lat[:,None],lon[:,None],lat,lon)
+    for i, n in enumerate(cwdc_geo.neighbours(lat,lon,12)):
+        assert set(n) == set(np.flatnonzero(d[i] <= 12))
+
+def test_within_empty_inputs():
+    assert cwdc_geo.within([],[],[39],[-105],5).shape == (0,)
+    assert not cwdc_geo.within([39],[-105],[],[],5).any()
+
+def square(x0, y0, x1, y1):
+    return(np.array([[x0,y0],[x1,y0],[x1,y1],[x0,y1],[x0,y0]],dtype=float))
+
+@pytest.fixture
+def locator():
+    #a donut county around an enclave, a two part county and a neighbour
+    #sharing the donut's eastern edge
+    shapes = [
+        [square(0,0,3,3),square(1,1,2,2)[::-1]],
+        [square(1.2,1.2,1.8,1.8)],
+        [square(3,0,4,3),square(5,0,6,1)],
+        []
+        ]
+    return(cwdc_geo.CountyLocator(['08001','08003','08005','08007'],shapes,cell=0.5))
+
+def test_holes_and_multi_part_counties(locator):
+    lon = [0.5,1.5,1.1,3.5,5.5,4.5]
+    lat = [0.5,1.5,1.1,2.5,0.5,0.5]
+    assert locator.locate(lat,lon).tolist() == ['08001','08003',None,'08005','08005',None]
+
+def test_shared_edges_belong_to_exactly_one_county(locator):
+    #points on the edge shared by the donut and its eastern neighbour
+    lat = np.linspace(0.1,2.9,15)
+    out = locator.locate(lat,np.full(15,3.0))
+    assert all(i in ('08001','08005') for i in out)
+    assert len(set(out)) == 1
+
+def test_points_off_the_grid_or_missing(locator):
+    out = locator.locate([-1,10,np.nan,0.5],[0.5,0.5,0.5,np.nan])
+    assert out.tolist() == [None,None,None,None]
+    assert locator.locate([],[]).tolist() == []
+
+def test_read_geojson_multipolygon(tmp_path):
+    features = [
+        {'type':'Feature','properties':{'GEOID':'08001'},
+         'geometry':{'type':'MultiPolygon','coordinates':[[square(0,0,1,1).tolist()],[square(2,0,3,1).tolist()]]}},
+        {'type':'Feature','properties':{'STATEFP':'08','COUNTYFP':'003'},
+         'geometry':{'type':'Polygon','coordinates':[square(1,0,2,1).tolist()]}}
+        ]
+    path = tmp_path / 'counties.geojson'
+    path.write_text(json.dumps({'type':'FeatureCollection','features':features}))
+
+    codes, shapes = cwdc_geo.read_boundaries(str(path))
+    assert codes == ['08001','08003']
+    assert cwdc_geo.CountyLocator(codes,shapes).locate([0.5,0.5,0.5],[0.5,1.5,2.5]).tolist() == ['08001','08003','08001']
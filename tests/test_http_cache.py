@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+import cwdc_http
+
+class Server():
+    #stand in for the network, serving fixed bodies and honouring If-None-Match
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.calls = []
+
+    def __call__(self, url, headers):
+        self.calls.append((url,dict(headers)))
+        body = self.bodies[url]
+        etag = '"{}"'.format(len(body))
+        if headers.get('If-None-Match') == etag:
+            return(cwdc_http._response(url,304,{'ETag':etag},b''))
+        return(cwdc_http._response(url,200,{'ETag':etag,'Content-Type':'text/plain'},body))
+
+def test_miss_then_hit(tmp_path):
+    server = Server({'http://a/1':b'one'})
+    cache = cwdc_http.ResponseCache(str(tmp_path))
+
+    first = cache.get('http://a/1',fetch=server)
+    second = cache.get('http://a/1',fetch=server)
+    assert not first.from_cache and second.from_cache
+    assert second.content == b'one' and second.status_code == 200
+    assert len(server.calls) == 1
+
+def test_stale_entry_revalidated(tmp_path):
+    server = Server({'http://a/1':b'one'})
+    cache = cwdc_http.ResponseCache(str(tmp_path),ttls={'default':0})
+
+    cache.get('http://a/1',fetch=server)
+    r = cache.get('http://a/1',fetch=server)
+    assert r.from_cache and r.content == b'one'
+    assert server.calls[1][1]['If-None-Match'] == '"3"'
+
+def test_accept_header_is_part_of_the_key(tmp_path):
+    server = Server({'http://a/1':b'one'})
+    cache = cwdc_http.ResponseCache(str(tmp_path))
+
+    cache.get('http://a/1',fetch=server)
+    assert not cache.get('http://a/1',headers={'Accept':'application/json'},fetch=server).from_cache
+    assert len(server.calls) == 2
+
+def test_offline_serves_cache_or_raises(tmp_path):
+    server = Server({'http://a/1':b'one'})
+    cwdc_http.ResponseCache(str(tmp_path)).get('http://a/1',fetch=server)
+
+    offline = cwdc_http.ResponseCache(str(tmp_path),offline=True)
+    assert offline.get('http://a/1',fetch=server).content == b'one'
+    with pytest.raises(cwdc_http.CacheMiss):
+        offline.get('http://a/2',fetch=server)
+    assert len(server.calls) == 1
+
+def test_least_recently_used_evicted(tmp_path):
+    server = Server({'http://a/{}'.format(i):bytes([i]) * 10 for i in range(3)})
+    cache = cwdc_http.ResponseCache(str(tmp_path),max_bytes=25)
+
+    cache.get('http://a/0',fetch=server)
+    time.sleep(0.01)
+    cache.get('http://a/1',fetch=server)
+    time.sleep(0.01)
+    cache.get('http://a/0',fetch=server)
+    time.sleep(0.01)
+    cache.get('http://a/2',fetch=server)
+
+    assert cache.size() <= 25
+    assert cache.get('http://a/0',fetch=server).from_cache
+    assert cache.get('http://a/2',fetch=server).from_cache
+    assert len(server.calls) == 3
+    assert not cache.get('http://a/1',fetch=server).from_cache
+
+def test_shared_body_stored_once_and_kept_until_unreferenced(tmp_path):
+    server = Server({'http://a/1':b'same','http://a/2':b'same'})
+    cache = cwdc_http.ResponseCache(str(tmp_path))
+
+    cache.get('http://a/1',fetch=server)
+    cache.get('http://a/2',fetch=server)
+    objects = [f for d, _, fs in os.walk(tmp_path / 'objects') for f in fs]
+    assert len(objects) == 1 and cache.size() == 4
+
+    cache.clear()
+    assert cache.size() == 0
+    assert not [f for d, _, fs in os.walk(tmp_path / 'objects') for f in fs]
+
+def test_clear_one_source_keeps_shared_bodies(tmp_path):
+    server = Server({'http://a/1':b'same','http://b/1':b'same'})
+    cache = cwdc_http.ResponseCache(str(tmp_path))
+
+    cache.get('http://a/1',source='census',fetch=server)
+    cache.get('http://b/1',source='dol',fetch=server)
+    cache.clear('census')
+    assert cache.get('http://b/1',source='dol',fetch=server).from_cache
+    assert not cache.get('http://a/1',source='census',fetch=server).from_cache
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import cwdc_idx
+import cwdc_store
+
+def test_records_survive_reopen(tmp_path):
+    path = str(tmp_path / 'j' / 'scrape.jsonl')
+    jn = cwdc_store.Journal(path)
+    jn.record('80202',[{'nid':1}])
+    jn.record('80203',[])
+    jn.close()
+
+    jn = cwdc_store.Journal(path)
+    assert '80202' in jn and '80204' not in jn and len(jn) == 2
+    assert jn.get('80202') == [{'nid':1}]
+    assert list(jn.records()) == [('80202',[{'nid':1}]),('80203',[])]
+
+def test_torn_line_dropped_and_appends_resume(tmp_path):
+    path = tmp_path / 'scrape.jsonl'
+    jn = cwdc_store.Journal(str(path))
+    jn.record('a',1)
+    jn.close()
+    with open(path,'ab') as f:
+        f.write(b'{"key":"b","pay')
+
+    jn = cwdc_store.Journal(str(path))
+    assert len(jn) == 1 and 'b' not in jn
+    jn.record('c',3)
+    jn.close()
+    assert list(cwdc_store.Journal(str(path)).records()) == [('a',1),('c',3)]
+
+def test_complete_record_missing_its_newline_is_dropped(tmp_path):
+    path = tmp_path / 'scrape.jsonl'
+    with open(path,'wb') as f:
+        f.write(b'{"key":"a","payload":1}\n{"key":"b","payload":2}')
+
+    jn = cwdc_store.Journal(str(path))
+    assert 'b' not in jn
+    jn.record('c',3)
+    jn.close()
+    assert list(cwdc_store.Journal(str(path)).records()) == [('a',1),('c',3)]
+
+def test_concurrent_records(tmp_path):
+    jn = cwdc_store.Journal(str(tmp_path / 'scrape.jsonl'))
+    threads = [threading.Thread(target=lambda i=i: [jn.record('{}-{}'.format(i,k),k) for k in range(50)]) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(jn) == 200
+    assert all(jn.get('{}-{}'.format(i,k)) == k for i in range(4) for k in range(50))
+    jn.close(remove=True)
+    assert not (tmp_path / 'scrape.jsonl').exists()
+
+def test_context_removes_only_on_clean_exit(tmp_path):
+    path = tmp_path / 'scrape.jsonl'
+    with pytest.raises(RuntimeError):
+        with cwdc_store.Journal(str(path)) as jn:
+            jn.record('a',1)
+            raise RuntimeError('scrape failed')
+    assert jn.file.closed and path.exists()
+
+    with cwdc_store.Journal(str(path)) as jn:
+        assert list(jn.records()) == [('a',1)]
+        jn.record('b',2)
+    assert jn.file.closed and not path.exists()
+
+def test_disabled_journal_yields_none(monkeypatch):
+    monkeypatch.setattr(cwdc_idx,'journal_dir',None)
+    with cwdc_idx.journal('etpl_08_25') as jn:
+        assert jn is None
@@ -0,0 +1,200 @@
+import pathlib
+import zipfile
+
+import pandas as pd
+import pytest
+
+import cwdc_idx
+import cwdc_nibrs
+
+def _emsi_occupations(path, county, state, fips, rows):
+    frame = pd.DataFrame(rows,columns=['SOC','2019 Resident Workers','2020 Resident Workers','Avg. Annual Openings',
+                                       'Pct. 25 Annual Earnings','Total Diversity % of Occupation','COL Index','Automation Index'])
+    frame.insert(1,'Description','occupation')
+    frame.to_csv(path / 'Occupation_Table_in_{}_{}_{}.csv'.format(county,state,fips),index=False)
+
+@pytest.fixture
+def emsi_soc(tmp_path, monkeypatch):
+    monkeypatch.setattr(cwdc_idx,'front_line_socs',lambda: ['41-2031','43-4051'])
+    monkeypatch.setattr(cwdc_idx,'in_demand_occupations',lambda: ['15-1252','29-1141'])
+    monkeypatch.setattr(cwdc_idx,'brookings_occupations',lambda: ['29-1141','43-4051'])
+    d = tmp_path / 'emsi_occ'
+    d.mkdir()
+    _emsi_occupations(d,'Adams_County','CO','8001',[
+        ('11-1021',5,10,30,60000,0.2,101,80),
+        ('15-1252',5,100,50,70000,0.4,101,60),
+        ('29-1141',5,200,'Insf. Data',50000,0.6,101,40),
+        ('41-2031',5,300,40,20000,0.3,101,90),
+        ('43-4051',5,100,20,25000,0.5,101,70)])
+    _emsi_occupations(d,'Laramie_County','WY','56021',[
+        ('11-9013',1,10,5,40000,0.1,95,70),
+        ('15-1252',1,20,8,65000,0.2,95,50),
+        ('29-1141',1,30,9,48000,0.3,95,30),
+        ('41-2031',1,40,7,18000,0.2,95,85),
+        ('43-4051',1,60,6,22000,0.4,95,65)])
+    return(str(d) + '/')
+
+def test_emsi_soc_by_county(emsi_soc):
+    out = cwdc_idx.get_emsi_soc(emsi_soc).set_index('NAME')
+    assert sorted(out.index) == ['Adams County, Colorado','Laramie County, Wyoming']
+    assert list(out.columns) == ['occ_openings','occ_per_25_earn','occ_div_emp_per','coli','opportunity_occ_openings',
+                                 'opportunity_occ_per_25_earn','opportunity_occ_div_emp_per','opportunity_coli',
+                                 'management_div_emp_per','auto']
+
+    adams = out.loc['Adams County, Colorado']
+    #suppressed openings are left out of the mean
+    assert adams['occ_openings'] == 50
+    assert adams['occ_per_25_earn'] == 60000
+    assert adams['opportunity_occ_openings'] == 20
+    assert adams['opportunity_occ_div_emp_per'] == pytest.approx(0.55)
+    assert adams['management_div_emp_per'] == pytest.approx(0.2)
+    #front line automation weighted by the latest resident workers
+    assert adams['auto'] == pytest.approx((90 * 300 + 70 * 100) / 400)
+    assert out.loc['Laramie County, Wyoming','auto'] == pytest.approx((85 * 40 + 65 * 60) / 100)
+
+def test_emsi_soc_rejects_unparsed_file_names(emsi_soc):
+    open(emsi_soc + 'Occupation_Table_in_Adams_County.csv','w').close()
+    with pytest.raises(ValueError,match='Adams_County.csv'):
+        cwdc_idx.get_emsi_soc(emsi_soc)
+
+def test_emsi_soc_rejects_state_not_matching_fips(emsi_soc):
+    _emsi_occupations(pathlib.Path(emsi_soc),'Weld_County','WY','8123',[('15-1252',1,1,1,1,1,1,1)])
+    with pytest.raises(ValueError,match='Weld_County_WY_8123'):
+        cwdc_idx.get_emsi_soc(emsi_soc)
+
+QCEW_HEADER = ['area_fips','own_code','industry_code','year','annual_avg_estabs_count','annual_avg_emplvl',
+               'avg_annual_pay','oty_annual_avg_estabs_count_chg']
+
+QCEW_AREAS = {
+    '2019.annual 08000 Colorado -- Statewide.csv':[('08000',5,'10',2019,900,9000,60000,9)],
+    '2019.annual 08001 Adams County, Colorado.csv':[('08001',5,'10',2019,90,900,50000,1),
+                                                    ('08001',5,'44-45',2019,20,200,30000,2),
+                                                    ('08001',5,'5112',2019,5,50,90000,-1)],
+    '2019.annual 08005 Arapahoe County, Colorado.csv':[('08005',5,'44-45',2019,30,300,32000,3),
+                                                       ('08005',5,'72',2019,40,400,22000,0)],
+    '2019.annual 56021 Laramie County, Wyoming.csv':[('56021',5,'72',2019,10,100,20000,1)],
+    '2019.annual US000 U.S. TOTAL.csv':[('US000',5,'10',2019,9000,90000,62000,90)]
+    }
+
+@pytest.fixture
+def qcew_by_area(tmp_path):
+    d = tmp_path / '2019.annual.by_area'
+    d.mkdir()
+    for name, rows in QCEW_AREAS.items():
+        pd.DataFrame(rows,columns=QCEW_HEADER).to_csv(d / name,index=False)
+    return(d)
+
+def _qcew_expected():
+    #what the by area loop read: colorado county rows of the requested industries
+    rows = [r for name, rows in QCEW_AREAS.items() for r in rows if r[0].startswith('08') and r[0] != '08000']
+    out = pd.DataFrame(rows,columns=QCEW_HEADER)
+    out = out[out['industry_code'].isin(['44-45','72'])].rename(columns={'area_fips':'fips'})
+    out['fips'] = out['fips'].astype(int)
+    return(out[['fips','industry_code','annual_avg_estabs_count','annual_avg_emplvl','avg_annual_pay',
+                'oty_annual_avg_estabs_count_chg']].astype({c:'float64' for c in QCEW_HEADER[4:]}).reset_index(drop=True))
+
+def _qcew_sorted(frame):
+    return(frame.sort_values(['fips','industry_code']).reset_index(drop=True))
+
+def test_qcew_by_area_directory(qcew_by_area):
+    out = cwdc_idx.read_qcew(str(qcew_by_area),industries=['44-45','72'])
+    pd.testing.assert_frame_equal(_qcew_sorted(out),_qcew_expected())
+
+def test_qcew_zip_opened_once(qcew_by_area, tmp_path, monkeypatch):
+    path = tmp_path / 'by_area.zip'
+    with zipfile.ZipFile(path,'w') as z:
+        for f in sorted(qcew_by_area.iterdir()):
+            z.write(f,'2019.annual.by_area/' + f.name)
+    opened = []
+    class ZipFile(zipfile.ZipFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args,**kwargs)
+            opened.append(self)
+    monkeypatch.setattr(zipfile,'ZipFile',ZipFile)
+    out = cwdc_idx.read_qcew(str(path),industries=['44-45','72'],chunksize=1)
+    pd.testing.assert_frame_equal(_qcew_sorted(out),_qcew_expected())
+    assert len(opened) == 1
+    assert opened[0].fp is None
+
+def test_qcew_singlefile(qcew_by_area, tmp_path):
+    path = tmp_path / '2019.annual.singlefile.csv'
+    pd.concat([pd.read_csv(f,dtype=str) for f in sorted(qcew_by_area.iterdir())]).to_csv(path,index=False)
+    out = cwdc_idx.read_qcew(str(path),states=('08','56'))
+    assert list(out.columns) == ['fips','industry_code','annual_avg_estabs_count','annual_avg_emplvl','avg_annual_pay',
+                                 'oty_annual_avg_estabs_count_chg']
+    assert sorted(set(out['fips'])) == [8001,8005,56021]
+    assert len(out) == 6
+    assert (out.dtypes.iloc[2:] == 'float64').all()
+
+def _nibrs_extract(path, agencies, incidents, upper=True):
+    path.mkdir(parents=True)
+    pd.DataFrame(agencies,columns=['AGENCY_ID','PUB_AGENCY_NAME','COUNTY_NAME']).to_csv(
+        path / ('agencies.csv' if upper else 'AGENCIES.csv'),index=False)
+    pd.DataFrame({'INCIDENT_ID':range(len(incidents)),'AGENCY_ID':incidents}).to_csv(
+        path / ('NIBRS_incident.csv' if upper else 'nibrs_incident.csv'),index=False)
+
+NIBRS_AGENCIES = [(1,'Denver','DENVER'),(2,'Aurora','ADAMS; ARAPAHOE'),(3,'State Patrol',None),(4,'Brighton','ADAMS')]
+
+def test_crime_data_splits_multi_county_agencies(tmp_path, monkeypatch):
+    #4 denver, 2 aurora split between adams and arapahoe, 1 state patrol and 1 unknown agency dropped
+    _nibrs_extract(tmp_path / 'CO-2019/CO',NIBRS_AGENCIES,[1,1,2,3,1,2,9,1,4])
+    monkeypatch.setattr(cwdc_idx,'working_dir',str(tmp_path) + '/')
+    out = cwdc_idx.crime_data().set_index('NAME')['crime_incidents']
+    assert out.to_dict() == {'Adams County, Colorado':2.0,'Arapahoe County, Colorado':1.0,'Denver County, Colorado':4.0}
+
+    chunked = cwdc_nibrs.county_incidents([(str(tmp_path / 'CO-2019/CO'),'Colorado',2019)],chunksize=2)
+    assert chunked.set_index('NAME')['crime_incidents'].to_dict() == out.to_dict()
+
+def test_crime_data_averages_years(tmp_path, monkeypatch):
+    _nibrs_extract(tmp_path / 'CO-2018/CO',NIBRS_AGENCIES,[1,1,4,4],upper=False)
+    _nibrs_extract(tmp_path / 'CO-2019/CO',NIBRS_AGENCIES,[1,1,1,1,2,2])
+    _nibrs_extract(tmp_path / 'WY-2019/WY',[(5,'Cheyenne','LARAMIE')],[5,5,5])
+    monkeypatch.setattr(cwdc_idx,'working_dir',str(tmp_path) + '/')
+    out = cwdc_idx.crime_data((('CO-2018/CO/','Colorado',2018),('CO-2019/CO/','Colorado',2019),
+                               ('WY-2019/WY/','Wyoming',2019)))
+    assert list(out.columns) == ['NAME','crime_incidents']
+    assert out.set_index('NAME')['crime_incidents'].to_dict() == {
+        'Adams County, Colorado':1.5,'Arapahoe County, Colorado':0.5,'Denver County, Colorado':3.0,
+        'Laramie County, Wyoming':3.0}
+
+PIRL_FIELDS = ['uid','state_code','county_code','other_field','credential_1_type','trained','etp_comp_1','record_year']
+
+def _pirl(path, rows):
+    #headerless, led by a row number, with the record year the dictionary names last left out
+    pd.DataFrame([(i,) + r for i, r in enumerate(rows)]).to_csv(path,header=False,index=False)
+
+@pytest.fixture
+def pirl(tmp_path, monkeypatch):
+    pd.DataFrame({'crec_name':PIRL_FIELDS}).to_excel(tmp_path / 'Master Data Dictionary.xlsx',sheet_name='Sheet2',index=False)
+    _pirl(tmp_path / 'pirl_py19.csv',[
+        (1,'CO',1,'x',4,1,1),
+        (1,'CO',1,'x',4,1,1),
+        (2,'CO',1,'x',2,1,0),
+        (3,'CO',1,'x',5,0,1),
+        (4,'WY',1,'x',4,1,1),
+        (5,'CO',5,'x',6,1,1),
+        (6,'CO',5,'x',None,1,None)])
+    _pirl(tmp_path / 'pirl_py18.csv',[
+        (1,'CO',1,'x',4,1,1),
+        (7,'CO',5,'x',3,1,0)])
+    monkeypatch.setattr(cwdc_idx,'working_dir',str(tmp_path) + '/')
+    return(tmp_path)
+
+def test_cc_data_shares_by_county(pirl):
+    #the credential share divides by the row total including its own t column, as the index always has
+    out = cwdc_idx.cc_data(chunksize=2)
+    assert list(out.columns) == ['credentialed','train_comp']
+    assert out.to_dict('index') == {8001:{'credentialed':1 / 3,'train_comp':0.5},
+                                    8005:{'credentialed':0.5,'train_comp':1.0}}
+
+def test_cc_data_pools_years(pirl):
+    out = cwdc_idx.cc_data((18,19))
+    assert out.to_dict('index') == {8001:{'credentialed':1 / 3,'train_comp':0.5},
+                                    8005:{'credentialed':1 / 3,'train_comp':0.5}}
+
+def test_read_pirl_selects_fields_by_dictionary(pirl):
+    meta = pd.DataFrame({'crec_name':PIRL_FIELDS})
+    out = pd.concat(cwdc_idx.read_pirl(str(pirl / 'pirl_py19.csv'),meta,chunksize=3))
+    assert list(out.columns) == list(cwdc_idx.PIRL_COLUMNS)
+    assert out['uid'].tolist() == [1,1,2,3,4,5,6]
+    assert out['county_code'].dtype == 'Int16' and out['etp_comp_1'].isna().sum() == 1
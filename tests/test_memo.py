@@ -0,0 +1,138 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+import cwdc_store
+
+SOURCE = '''
+import cwdc_store
+
+memo = cwdc_store.Memo()
+calls = []
+
+def helper(x):
+    return(x + {step})
+
+@memo.cached('in.txt')
+def derived(x):
+    calls.append(x)
+    with open(memo.root() + 'in.txt') as f:
+        return([helper(x),f.read(),{codes}])
+'''
+
+@pytest.fixture
+def load(tmp_path, monkeypatch):
+    #a throwaway cwdc_ module whose memoized function the tests rewrite
+    monkeypatch.syspath_prepend(str(tmp_path))
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'in.txt').write_text('a')
+
+    def load(step=1, codes=['44','45']):
+        (tmp_path / 'cwdc_memo_mod.py').write_text(SOURCE.format(step=step,codes=codes))
+        sys.modules.pop('cwdc_memo_mod',None)
+        importlib.invalidate_caches()
+        mod = importlib.import_module('cwdc_memo_mod')
+        mod.memo.root = lambda: str(data) + '/'
+        mod.memo.path = str(tmp_path / 'memo')
+        return(mod)
+    yield load
+    sys.modules.pop('cwdc_memo_mod',None)
+
+def test_hit_in_memory_and_on_disk(load):
+    mod = load()
+    assert mod.derived(1) == [2,'a',['44','45']]
+    assert mod.derived(1) == [2,'a',['44','45']]
+    assert mod.calls == [1]
+
+    #a fresh process reads the persisted result
+    mod = load()
+    assert mod.derived(1) == [2,'a',['44','45']]
+    assert mod.calls == []
+
+def test_arguments_are_keyed(load):
+    mod = load()
+    mod.derived(1)
+    mod.derived(2)
+    assert mod.calls == [1,2]
+
+def test_input_change_invalidates(load, tmp_path):
+    mod = load()
+    mod.derived(1)
+    (tmp_path / 'data' / 'in.txt').write_text('bb')
+    assert mod.derived(1) == [2,'bb',['44','45']]
+    assert mod.calls == [1,1]
+
+def test_constant_change_invalidates(load):
+    load().derived(1)
+    mod = load(codes=['71','72'])
+    assert mod.derived(1) == [2,'a',['71','72']]
+    assert mod.calls == [1]
+
+def test_helper_change_invalidates(load):
+    load().derived(1)
+    mod = load(step=5)
+    assert mod.derived(1) == [6,'a',['44','45']]
+    assert mod.calls == [1]
+
+def test_fingerprint_follows_content(tmp_path):
+    memo = cwdc_store.Memo(path=str(tmp_path / 'memo'))
+    f = tmp_path / 'x.txt'
+    f.write_text('one')
+    first = memo.fingerprint(str(f))
+    assert memo.fingerprint(str(f)) == first
+    f.write_text('two')
+    assert memo.fingerprint(str(f)) != first
+
+def test_callable_input_resolved_at_call(tmp_path):
+    for d, text in [('v1','1'),('v2','22')]:
+        (tmp_path / d).mkdir()
+        (tmp_path / d / 'z.txt').write_text(text)
+    release = ['v1/']
+    memo = cwdc_store.Memo(root=lambda: str(tmp_path),path=str(tmp_path / 'memo'))
+    calls = []
+
+    @memo.cached(lambda: release[0] + 'z.txt')
+    def zones():
+        calls.append(1)
+        return(open(str(tmp_path / release[0] / 'z.txt')).read())
+
+    assert zones() == '1'
+    release[0] = 'v2/'
+    assert zones() == '22'
+    assert len(calls) == 2
+
+def test_keyword_and_default_arguments(tmp_path):
+    memo = cwdc_store.Memo(root=lambda: str(tmp_path))
+    calls = []
+
+    @memo.cached()
+    def zones(low=1, high=3):
+        calls.append((low,high))
+        return(list(range(low,high + 1)))
+
+    assert zones() == zones(1) == zones(low=1,high=3) == [1,2,3]
+    assert zones(high=2) == [1,2]
+    assert calls == [(1,3),(1,2)]
+    with pytest.raises(TypeError):
+        zones(zone=2)
+
+def test_helper_of_a_script_invalidates(tmp_path):
+    #python cwdc_idx.py defines its functions in __main__
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'in.txt').write_text('a')
+
+    def script(step):
+        mod = types.ModuleType('__main__')
+        exec(SOURCE.format(step=step,codes=[]),vars(mod))
+        mod.memo.root = lambda: str(data) + '/'
+        mod.memo.path = str(tmp_path / 'memo')
+        return(mod)
+
+    script(1).derived(1)
+    mod = script(5)
+    assert mod.derived(1) == [6,'a',[]]
+    assert mod.calls == [1]
@@ -0,0 +1,40 @@
+import pytest
+
+import cwdc_perf
+
+def runs(history, suite, walls, peak=100):
+    for w in walls:
+        history.add(suite,{'stage':{'wall':w,'peak_rss':peak}})
+
+def test_slower_stage_flagged(tmp_path):
+    history = cwdc_perf.History(str(tmp_path / 'h.sqlite'))
+    runs(history,'s',[[1.0,1.02,0.98]] * 5)
+    new = {'stage':{'wall':[1.5,1.52,1.49],'peak_rss':100}}
+    found = cwdc_perf.check(history,'s',new)
+    assert [(r['stage'],r['metric']) for r in found] == [('stage','wall_seconds')]
+    assert found[0]['ratio'] == pytest.approx(1.5,rel=0.02)
+    assert 'REGRESSION stage' in cwdc_perf.report(found)
+
+def test_noise_small_slowdowns_and_short_baselines_pass(tmp_path):
+    history = cwdc_perf.History(str(tmp_path / 'h.sqlite'))
+    runs(history,'s',[[1.0,1.02,0.98]] * 5)
+    assert cwdc_perf.check(history,'s',{'stage':{'wall':[1.01,0.99,1.0],'peak_rss':100}}) == []
+    assert cwdc_perf.check(history,'s',{'stage':{'wall':[1.05,1.06,1.05],'peak_rss':100}}) == []
+    assert cwdc_perf.check(history,'other',{'stage':{'wall':[9.0],'peak_rss':100}}) == []
+
+def test_memory_growth_flagged(tmp_path):
+    history = cwdc_perf.History(str(tmp_path / 'h.sqlite'))
+    runs(history,'s',[[1.0]] * 5,peak=100 * 2**20)
+    found = cwdc_perf.check(history,'s',{'stage':{'wall':[1.0],'peak_rss':200 * 2**20}})
+    assert [r['metric'] for r in found] == ['peak_rss']
+
+def test_track_leaves_the_new_run_out_of_its_baseline(tmp_path):
+    path = str(tmp_path / 'h.sqlite')
+    for i in range(5):
+        assert cwdc_perf.track(path,'s',{'stage':{'wall':[1.0,1.0,1.0],'peak_rss':None}}) == []
+    assert cwdc_perf.track(path,'s',{'stage':{'wall':[2.0,2.0,2.0],'peak_rss':None}})
+    assert len(cwdc_perf.History(path).runs('s')) == 6
+
+def test_pipeline_results_carry_no_memory():
+    records = [{'stage':'qcew','wall_seconds':2.0,'peak_rss':10**9},{'stage':'acs','cached':True}]
+    assert cwdc_perf.results(records) == {'qcew':{'wall':[2.0],'peak_rss':None}}
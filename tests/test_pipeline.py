@@ -0,0 +1,77 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import cwdc_stages
+
+def pipeline(store=None):
+    p = cwdc_stages.Pipeline(threads=4,processes=1,store=store)
+    p.add('codes',lambda: [1,2,3])
+    p.add('a',lambda codes: sum(codes),deps=['codes'])
+    p.add('b',lambda k, codes: k * len(codes),10,deps=['codes'])
+    p.add('c',lambda a, b: a + b,deps=['a','b'])
+    p.add('d',lambda: 'side',after=['a'])
+    return(p)
+
+def test_order_puts_dependencies_first():
+    order = pipeline().order()
+    assert sorted(order) == ['a','b','c','codes','d']
+    assert all(order.index(r) < order.index(n) for n in order for r in pipeline().stages[n].requires)
+    assert pipeline().order(['b']) == ['codes','b']
+
+def test_cycles_unknown_and_duplicate_stages_rejected():
+    p = pipeline()
+    p.add('x',len,deps=['y'])
+    p.add('y',len,deps=['x'])
+    with pytest.raises(ValueError,match='x -> y -> x'):
+        p.order(['x'])
+    with pytest.raises(KeyError):
+        p.order(['z'])
+    with pytest.raises(ValueError):
+        p.add('a',len)
+
+def test_downstream():
+    assert pipeline().downstream(['a']) == {'a','c','d'}
+
+def test_run_passes_dependency_outputs():
+    p = pipeline()
+    assert p.run(['c','d']) == {'c':36,'d':'side'}
+    assert set(p.records) == {'codes','a','b','c','d'}
+    assert all(not r['cached'] and r['wall_seconds'] >= 0 for r in p.records.values())
+
+def test_independent_stages_run_together():
+    #both stages only finish if they are running at the same time
+    barrier = threading.Barrier(2,timeout=10)
+    p = cwdc_stages.Pipeline(threads=2)
+    p.add('x',lambda: barrier.wait() is not None)
+    p.add('y',lambda: barrier.wait() is not None)
+    assert p.run() == {'x':True,'y':True}
+
+def test_failure_propagates():
+    p = pipeline()
+    p.add('bad',lambda a: 1 / 0,deps=['a'])
+    with pytest.raises(ZeroDivisionError):
+        p.run(['bad'])
+
+def test_cpu_stage_returns_dataframe():
+    p = cwdc_stages.Pipeline(threads=1,processes=1)
+    p.add('frame',pd.DataFrame,{'a':[1,2]},kind='cpu')
+    pd.testing.assert_frame_equal(p.run()['frame'],pd.DataFrame({'a':[1,2]}))
+
+def test_stored_stages_loaded_forced_and_uncached(tmp_path):
+    store = cwdc_stages.ArtifactStore(path=str(tmp_path))
+    assert pipeline(store).run(['c']) == {'c':36}
+
+    p = pipeline(store)
+    assert p.run(['c']) == {'c':36}
+    assert all(r['cached'] for r in p.records.values())
+
+    p = pipeline(store)
+    p.run(['c'],force=['a'])
+    assert not p.records['a']['cached'] and p.records['c']['cached']
+
+    p = pipeline(store)
+    p.stages['b'].cache = False
+    p.run(['c'])
+    assert not p.records['b']['cached'] and not p.records['c']['cached'] and p.records['a']['cached']
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+import cwdc_codes
+
+def test_under_matches_self_and_descendants():
+    codes = ['44','441','441110','4411','45','4541','',None,'4']
+    mask = cwdc_codes.NAICS.under(codes,['441'])
+    assert mask.tolist() == [False,True,True,True,False,False,False,False,False]
+
+def test_under_several_ancestors_and_mixed_forms():
+    codes = np.array([441110.0,'441110','452',452210,'31-33',np.nan],dtype=object)
+    assert cwdc_codes.NAICS.under(codes,['4411',45.0]).tolist() == [True,True,True,True,False,False]
+
+def test_under_ignores_missing_ancestors():
+    assert not cwdc_codes.NAICS.under(['11','21'],['',None,np.nan]).any()
+    assert cwdc_codes.NAICS.under([],['11']).tolist() == []
+
+def test_soc_separators_removed():
+    codes = ['11-1011','11-1021','13-2011','111011']
+    assert cwdc_codes.SOC.under(codes,['11-10']).tolist() == [True,True,False,True]
+    assert cwdc_codes.SOC.isin(codes,['111011']).tolist() == [True,False,False,True]
+
+def test_cip_padded_and_dotless():
+    codes = np.array([10101,'01.0101','11.0101',110101.0,'11.01'],dtype=object)
+    assert cwdc_codes.CIP.canon(codes).tolist() == ['010101','010101','110101','110101','1101']
+    assert cwdc_codes.CIP.under(codes,['01']).tolist() == [True,True,False,False,False]
+    assert cwdc_codes.CIP.under(codes,['11.01']).tolist() == [False,False,True,True,True]
+
+def test_cip_floats_read_from_dotted_codes():
+    codes = np.array([1.0101,1.01,11.0101,52.2,110101.0,np.nan],dtype=object)
+    assert cwdc_codes.CIP.canon(codes).tolist() == ['010101','010100','110101','522000','110101','']
+    assert cwdc_codes.CIP.isin(pd.Series([1.0101,11.01]),['01.0101','11.0100']).tolist() == [True,True]
+    assert cwdc_codes.CIP.under(np.array([1.0101,13.0101]),['01']).tolist() == [True,False]
+
+def test_level_is_length_of_canonical_code():
+    assert cwdc_codes.NAICS.level(['44','441110',None]).tolist() == [2,6,0]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cwdc_transitions
+
+ROWS = [
+    #occ_a, occ_b, h_median_a, h_median_b, transition_share
+    ('A','B',10,20,0.5),
+    ('A','B',10,20,0.3),
+    ('A','C',10,8,0.2),
+    ('B','D',20,30,0.5),
+    ('C','D',8,30,0.1),
+    ('B','B',20,20,0.9),
+    ('D','A',30,10,0.05)
+    ]
+
+@pytest.fixture(params=[10**6,2])
+def graph(request, tmp_path):
+    path = tmp_path / 'transitions.csv'
+    pd.DataFrame(ROWS,columns=['occ_a','occ_b','h_median_a','h_median_b','transition_share']).to_csv(path,index=False)
+    return(cwdc_transitions.TransitionGraph.read_csv(str(path),chunksize=request.param))
+
+def _edges(frame):
+    return({(s,t):round(p,6) for s, t, p in frame.itertuples(index=False)})
+
+def test_duplicates_averaged_and_self_transitions_dropped(graph):
+    ids = {c:i for i, c in enumerate(graph.codes)}
+    assert graph.prob[ids['A'],ids['B']] == pytest.approx(0.4)
+    assert graph.prob[ids['B'],ids['B']] == 0
+    assert graph.wage[ids['D']] == 30
+
+def test_one_step_paths(graph):
+    assert _edges(graph.paths(1,wage_gain=False)) == {('A','B'):0.4,('A','C'):0.2,('B','D'):0.5,('C','D'):0.1,('D','A'):0.05}
+    assert _edges(graph.paths(1)) == {('A','B'):0.4,('B','D'):0.5,('C','D'):0.1}
+
+def test_two_step_paths_sum_every_route(graph):
+    paths = _edges(graph.paths(2,sources=['A']))
+    assert paths == {('A','B'):0.4,('A','D'):round(0.4 * 0.5 + 0.2 * 0.1,6)}
+
+def test_monotone_and_minimum_probabilities(graph):
+    assert _edges(graph.paths(2,sources=['A'],monotone=True)) == {('A','B'):0.4,('A','D'):0.2}
+    assert _edges(graph.paths(2,sources=['A'],min_prob=0.3)) == {('A','B'):0.4,('A','D'):0.2}
+    assert _edges(graph.paths(2,sources=['A'],min_path_prob=0.1)) == {('A','B'):0.4,('A','D'):0.22}
+    assert _edges(graph.paths(2,sources=['A'],min_path_prob=0.3)) == {('A','B'):0.4}
+    assert sorted(graph.destinations(2,sources=['A'],monotone=True)) == ['B','D']
+
+def test_without_probabilities_every_transition_counts_once(tmp_path):
+    path = tmp_path / 'transitions.csv'
+    pd.DataFrame([r[:4] for r in ROWS],columns=['occ_a','occ_b','h_median_a','h_median_b']).to_csv(path,index=False)
+    graph = cwdc_transitions.TransitionGraph.read_csv(str(path))
+    assert _edges(graph.paths(2,sources=['A'],wage_gain=False)) == {('A','B'):1.0,('A','C'):1.0,('A','D'):2.0}
+    assert np.isnan(graph.wage).sum() == 0